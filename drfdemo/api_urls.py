@@ -0,0 +1,34 @@
+"""The API on its own, for workers that serve nothing else (ApiWorker)
+
+drfdemo.urls adds the admin, the browsable API's login and the Swagger
+docs to these.
+"""
+from django.urls import path, re_path, include, reverse_lazy
+from django.views.generic.base import RedirectView
+from rest_framework.routers import DefaultRouter
+from rest_framework.authtoken import views
+
+from vetclinic.profiling import MetricsView
+from vetclinic.urls import urlpatterns as vetclinic_patterns
+from .readiness import healthz, readyz
+from .users.views import UserViewSet, UserCreateViewSet
+
+router = DefaultRouter()
+router.register(r'users', UserViewSet)
+router.register(r'users', UserCreateViewSet)
+
+urlpatterns = [
+    path('api/v1/core/', include(router.urls)),
+    path('api/v1/vetclinic/', include(vetclinic_patterns)),
+    path('api-token-auth/', views.obtain_auth_token),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    path('healthz', healthz, name='healthz'),
+    path('readyz', readyz, name='readyz'),
+
+    # the 'api-root' from django rest-frameworks default router
+    # http://www.django-rest-framework.org/api-guide/routers/#defaultrouter
+    re_path(
+        r'^$',
+        RedirectView.as_view(url=reverse_lazy('api-root'), permanent=False),
+    ),
+]
@@ -0,0 +1,20 @@
+"""
+ASGI config for drfdemo.
+It exposes the ASGI callable as a module-level variable named ``application``
+for any ASGI 3 server, e.g. ``uvicorn drfdemo.asgi:application``. See
+asgi_handler.py for how requests get to Django.
+"""
+import os
+import time
+
+started = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "drfdemo.config")
+os.environ.setdefault("DJANGO_CONFIGURATION", "Production")
+
+from configurations.wsgi import get_wsgi_application  # noqa
+from drfdemo.asgi_handler import ASGIHandler  # noqa
+application = ASGIHandler(get_wsgi_application())
+
+# wait for the database and warm up; /readyz reports how that went
+from drfdemo import readiness  # noqa
+readiness.startup(started)
@@ -0,0 +1,199 @@
+"""Serve the Django application over ASGI
+
+Django 2.0 has no async views or async ORM, so the views themselves still
+run synchronously. What this buys over sync gunicorn workers is that
+connections are cheap: the event loop holds every open connection and
+hands requests to bounded thread pools sized to what Postgres can take.
+
+* reads of the paths in VETCLINIC_ASGI_READ_PATHS (GET/HEAD/OPTIONS) go to
+  a pool of VETCLINIC_ASGI_READ_THREADS threads
+* everything else, writes included, goes to a separate pool of
+  VETCLINIC_ASGI_WRITE_THREADS, so slow writes can't starve reads
+
+A request runs start to finish on one thread (Django's database
+connections are per thread). Response chunks are handed to the event loop
+through a small buffer, so the thread is free once Django is done even if
+the client is slow, and big streaming responses don't pile up in memory.
+"""
+
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+READ_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+# what a queue message can be, besides a chunk of the body
+START, END, ERROR = 'start', 'end', 'error'
+
+
+def build_environ(scope, body):
+    """The WSGI environ for an ASGI HTTP ``scope`` and its request ``body``"""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        # WSGI paths are bytes smuggled through latin-1
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_LENGTH':
+            continue
+        if name != 'CONTENT_TYPE':
+            name = f'HTTP_{name}'
+        if name in environ:
+            value = f'{environ[name]},{value}'
+        environ[name] = value
+    return environ
+
+
+class ASGIHandler:
+    """ASGI 3 application wrapping a WSGI one"""
+
+    def __init__(self, wsgi_application, read_paths=None, read_threads=None,
+                 write_threads=None, buffered_chunks=None):
+        self.wsgi_application = wsgi_application
+        self.read_paths = tuple(
+            settings.VETCLINIC_ASGI_READ_PATHS
+            if read_paths is None else read_paths
+        )
+        self.read_executor = ThreadPoolExecutor(
+            read_threads or settings.VETCLINIC_ASGI_READ_THREADS,
+            thread_name_prefix='asgi-read',
+        )
+        self.write_executor = ThreadPoolExecutor(
+            write_threads or settings.VETCLINIC_ASGI_WRITE_THREADS,
+            thread_name_prefix='asgi-write',
+        )
+        self.buffered_chunks = (
+            buffered_chunks or settings.VETCLINIC_ASGI_BUFFERED_CHUNKS)
+
+    def executor_for(self, scope):
+        is_read = scope['method'] in READ_METHODS
+        if is_read and scope['path'].startswith(self.read_paths):
+            return self.read_executor
+        return self.write_executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f'Cannot handle {scope["type"]!r} connections')
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue(maxsize=self.buffered_chunks)
+        job = loop.run_in_executor(
+            self.executor_for(scope), self.run_wsgi,
+            loop, queue, build_environ(scope, body),
+        )
+        try:
+            await self.relay(queue, send)
+        finally:
+            # if relaying stopped early (the client went away), keep the
+            # buffer empty so the thread can run to the end
+            while not job.done():
+                while not queue.empty():
+                    queue.get_nowait()
+                await asyncio.wait([job], timeout=0.01)
+
+    async def read_body(self, receive):
+        """The whole request body, or ``None`` if the client went away"""
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    async def relay(self, queue, send):
+        while True:
+            kind, value = await queue.get()
+            if kind == START:
+                status, headers = value
+                await send({
+                    'type': 'http.response.start',
+                    'status': status,
+                    'headers': headers,
+                })
+            elif kind == END:
+                await send({'type': 'http.response.body', 'body': b''})
+                return
+            elif kind == ERROR:
+                raise value
+            elif value:
+                await send({
+                    'type': 'http.response.body', 'body': value,
+                    'more_body': True,
+                })
+
+    def run_wsgi(self, loop, queue, environ):
+        """Run the WSGI application on this thread, feeding ``queue``"""
+
+        def put(kind, value=None):
+            asyncio.run_coroutine_threadsafe(
+                queue.put((kind, value)), loop).result()
+
+        response_start = []
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response_start:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response_start[:] = [
+                int(status.split(' ', 1)[0]),
+                [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                 for name, value in headers],
+            ]
+
+        try:
+            result = self.wsgi_application(environ, start_response)
+            try:
+                started = False
+                for chunk in result:
+                    if not started:
+                        put(START, tuple(response_start))
+                        started = True
+                    put('chunk', chunk)
+                if not started:
+                    put(START, tuple(response_start))
+            finally:
+                # fires request_finished, which tidies up this thread's
+                # database connection
+                if hasattr(result, 'close'):
+                    result.close()
+        except Exception as exc:
+            put(ERROR, exc)
+        else:
+            put(END)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.read_executor.shutdown(wait=True)
+                self.write_executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
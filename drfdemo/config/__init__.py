@@ -1,2 +1,2 @@
 from .local import Local  # noqa
-from .production import Production  # noqa
+from .production import ApiWorker, Production  # noqa
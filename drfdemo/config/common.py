@@ -3,7 +3,15 @@ from os.path import join
 from distutils.util import strtobool
 import dj_database_url
 from configurations import Configuration
+from django.core.exceptions import ImproperlyConfigured
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POSTGRES_ENGINES = (
+    'django.db.backends.postgresql', 'django.db.backends.postgresql_psycopg2',
+)
+# Cache backends that keep entries in the process that stored them
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+)
 
 
 class Common(Configuration):
@@ -15,7 +23,7 @@ class Common(Configuration):
         'django.contrib.sessions',
         'django.contrib.messages',
         'django.contrib.staticfiles',
-
+        'django.contrib.postgres',   # trigram lookups for name search
 
         # Third party apps
         'rest_framework',            # utilities for rest apis
@@ -31,6 +39,10 @@ class Common(Configuration):
 
     # https://docs.djangoproject.com/en/2.0/topics/http/middleware/
     MIDDLEWARE = (
+        # first, so its timings cover the rest of the stack
+        'vetclinic.profiling.ProfilingMiddleware',
+        # before anything that writes (sessions), so it sees those writes
+        'drfdemo.replicas.ReplicaRoutingMiddleware',
         'django.middleware.security.SecurityMiddleware',
         'django.contrib.sessions.middleware.SessionMiddleware',
         'django.middleware.common.CommonMiddleware',
@@ -59,6 +71,28 @@ class Common(Configuration):
             conn_max_age=int(os.getenv('POSTGRES_CONN_MAX_AGE', 600))
         )
     }
+    # Read replicas, as comma-separated database URLs, and the share of
+    # reads each one gets (1 each unless set). They become the replica1,
+    # replica2, ... databases; see drfdemo/replicas.py.
+    DATABASE_REPLICA_URLS = os.getenv('DATABASE_REPLICA_URLS', '')
+    DATABASE_REPLICA_WEIGHTS = os.getenv('DATABASE_REPLICA_WEIGHTS', '')
+    DATABASE_ROUTERS = ['drfdemo.replicas.ReplicaRouter']
+    # 'pgbouncer' when the database URLs point at pgbouncer in transaction
+    # pooling mode, which rules out server-side cursors; see
+    # drfdemo/postgresql
+    POSTGRES_POOL_MODE = os.getenv('POSTGRES_POOL_MODE', '')
+    # Check a persistent connection with SELECT 1 before each request's
+    # first query, and reconnect if that fails (see drfdemo/postgresql)
+    POSTGRES_HEALTH_CHECKS = strtobool(os.getenv('POSTGRES_HEALTH_CHECKS', 'yes'))
+
+    # Startup (see drfdemo/readiness.py): seconds to wait for the database
+    # (the variable wait_for_postgres.py used), backing off from the first
+    # delay up to the longest; and whether each worker warms up before it
+    # reports ready
+    STARTUP_TIMEOUT = float(os.getenv('POSTGRES_CHECK_TIMEOUT', 30))
+    STARTUP_BACKOFF_INITIAL = float(os.getenv('STARTUP_BACKOFF_INITIAL', 0.1))
+    STARTUP_BACKOFF_MAX = float(os.getenv('STARTUP_BACKOFF_MAX', 5))
+    STARTUP_WARM_UP = strtobool(os.getenv('STARTUP_WARM_UP', 'yes'))
 
     # General
     APPEND_SLASH = False
@@ -69,6 +103,8 @@ class Common(Configuration):
     USE_I18N = False
     USE_L10N = True
     USE_TZ = True
+    # the browsable API's login, which /docs links to
+    LOGIN_URL = 'rest_framework:login'
     LOGIN_REDIRECT_URL = '/'
 
     # Static files (CSS, JavaScript, Images)
@@ -178,26 +214,192 @@ class Common(Configuration):
                 'handlers': ['console'],
                 'level': 'INFO'
             },
+            # possible N+1s spotted by the profiling middleware
+            'vetclinic.profiling': {
+                'handlers': ['console'],
+                'level': 'WARNING',
+                'propagate': False,
+            },
+            # one key=value line per filter planning decision
+            'vetclinic.planning': {
+                'handlers': ['console'],
+                'level': os.getenv('VETCLINIC_FILTER_PLAN_LOG_LEVEL', 'INFO'),
+                'propagate': False,
+            },
         }
     }
 
+    # Rows per INSERT/UPDATE statement for bulk writes through the API
+    VETCLINIC_BULK_BATCH_SIZE = int(os.getenv('VETCLINIC_BULK_BATCH_SIZE', 1000))
+
+    # Serve animal and client lists through the compact read path
+    VETCLINIC_COMPACT_LISTS = strtobool(os.getenv('VETCLINIC_COMPACT_LISTS', 'no'))
+    # Serve the animal list from the denormalized AnimalSummary table, with
+    # related objects as names (see vetclinic.summaries)
+    VETCLINIC_ANIMAL_SUMMARY_LISTS = strtobool(os.getenv('VETCLINIC_ANIMAL_SUMMARY_LISTS', 'no'))
+
+    # Regex filters that can't use the trigram indexes are refused on tables
+    # with more rows than this
+    VETCLINIC_REGEX_SCAN_LIMIT = int(os.getenv('VETCLINIC_REGEX_SCAN_LIMIT', 10000))
+
+    # Guardrails for filter query strings; see vetclinic/planning.py
+    VETCLINIC_FILTER_MAX_DEPTH = int(os.getenv('VETCLINIC_FILTER_MAX_DEPTH', 2))
+    VETCLINIC_FILTER_MAX_IN_SIZE = int(os.getenv('VETCLINIC_FILTER_MAX_IN_SIZE', 1000))
+    VETCLINIC_FILTER_IN_REWRITE_SIZE = int(os.getenv('VETCLINIC_FILTER_IN_REWRITE_SIZE', 100))
+    VETCLINIC_FILTER_MAX_COST = float(os.getenv('VETCLINIC_FILTER_MAX_COST', 100))
+    VETCLINIC_FILTER_THROTTLE_COST = float(os.getenv('VETCLINIC_FILTER_THROTTLE_COST', 40))
+    VETCLINIC_EXPENSIVE_FILTER_RATE = os.getenv('VETCLINIC_EXPENSIVE_FILTER_RATE', '30/min')
+    # Off unless set; costs one EXPLAIN per filtered request on Postgres
+    VETCLINIC_FILTER_MAX_PLANNER_COST = (
+        float(os.environ['VETCLINIC_FILTER_MAX_PLANNER_COST'])
+        if os.getenv('VETCLINIC_FILTER_MAX_PLANNER_COST') else None
+    )
+
+    # Every appointment is assumed to take this long
+    VETCLINIC_APPOINTMENT_MINUTES = int(os.getenv('VETCLINIC_APPOINTMENT_MINUTES', 30))
+
+    # Fraction of requests to profile (see vetclinic/profiling.py), and how
+    # many runs of one statement in a request count as an N+1. Production
+    # doesn't profile unless the cache is shared, which /metrics adds every
+    # worker's numbers up in.
+    VETCLINIC_PROFILING_SAMPLE_RATE = float(os.getenv('VETCLINIC_PROFILING_SAMPLE_RATE', 0.01))
+    VETCLINIC_PROFILING_DUPLICATE_THRESHOLD = int(
+        os.getenv('VETCLINIC_PROFILING_DUPLICATE_THRESHOLD', 5))
+    # Seconds each worker keeps its numbers to itself before adding them to
+    # the totals /metrics shows
+    VETCLINIC_METRICS_FLUSH_INTERVAL = float(os.getenv('VETCLINIC_METRICS_FLUSH_INTERVAL', 10))
+
+    # ASGI serving (drfdemo/asgi.py): threads for reads of these paths, and
+    # for everything else. Keep the total within the database's connection
+    # budget.
+    VETCLINIC_ASGI_READ_PATHS = (
+        '/api/v1/vetclinic/animals/',
+        '/api/v1/vetclinic/clients/',
+        '/api/v1/vetclinic/species/',
+    )
+    VETCLINIC_ASGI_READ_THREADS = int(os.getenv('VETCLINIC_ASGI_READ_THREADS', 16))
+    VETCLINIC_ASGI_WRITE_THREADS = int(os.getenv('VETCLINIC_ASGI_WRITE_THREADS', 4))
+    # Response chunks buffered per request between a thread and the client
+    VETCLINIC_ASGI_BUFFERED_CHUNKS = int(os.getenv('VETCLINIC_ASGI_BUFFERED_CHUNKS', 16))
+
+    # Replica routing (drfdemo/replicas.py): {database alias: weight}, filled
+    # in from DATABASE_REPLICA_URLS, and the requests and apps that use them
+    VETCLINIC_READ_REPLICAS = {}
+    VETCLINIC_REPLICA_PATHS = ('/api/v1/vetclinic/', '/api/v1/core/users/')
+    VETCLINIC_REPLICA_APPS = ('vetclinic', 'users')
+    # Replicas more than this many seconds behind the primary aren't read
+    # from; each one's lag is checked at most this often
+    VETCLINIC_REPLICA_MAX_LAG = float(os.getenv('VETCLINIC_REPLICA_MAX_LAG', 5))
+    VETCLINIC_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('VETCLINIC_REPLICA_LAG_CHECK_INTERVAL', 2))
+    # Seconds a client reads from the primary after writing; keep it above
+    # the two settings above combined
+    VETCLINIC_REPLICA_STICKY_SECONDS = int(os.getenv('VETCLINIC_REPLICA_STICKY_SECONDS', 10))
+
+    # Seconds to keep species and breed responses; they're invalidated
+    # whenever that data changes, so this can be long. 0 turns it off, as
+    # Production does unless the cache is shared.
+    VETCLINIC_RESPONSE_CACHE_TIMEOUT = int(os.getenv('VETCLINIC_RESPONSE_CACHE_TIMEOUT', 3600))
+
+    # The OpenAPI schema /docs serves (see drfdemo/schema.py); regenerate it
+    # with manage.py generate_schema. Clients may reuse /docs?format=openapi
+    # for this many seconds.
+    VETCLINIC_OPENAPI_SCHEMA = os.getenv('VETCLINIC_OPENAPI_SCHEMA', join(BASE_DIR, 'openapi.json'))
+    VETCLINIC_SCHEMA_MAX_AGE = int(os.getenv('VETCLINIC_SCHEMA_MAX_AGE', 300))
+
     # Custom user app
     AUTH_USER_MODEL = 'users.User'
+    AUTHENTICATION_BACKENDS = [
+        'drfdemo.users.backends.CachedModelBackend',
+    ]
+    # Seconds to share each user's permission set across requests; 0 only
+    # caches for the length of a request. Production leaves it at 0 unless
+    # the cache is shared.
+    PERMISSION_CACHE_TIMEOUT = int(os.getenv('DJANGO_PERMISSION_CACHE_TIMEOUT', 300))
+    # Seconds to share which user each API token belongs to across
+    # processes; 0 turns the shared cache off. Production leaves it off
+    # unless the cache is shared.
+    TOKEN_CACHE_TIMEOUT = int(os.getenv('DJANGO_TOKEN_CACHE_TIMEOUT', 300))
+    # Tokens each process also keeps to itself, and for how many seconds.
+    # Invalidation can't reach other processes' copies, so keep this short.
+    TOKEN_CACHE_LOCAL_SIZE = int(os.getenv('DJANGO_TOKEN_CACHE_LOCAL_SIZE', 1000))
+    TOKEN_CACHE_LOCAL_TIMEOUT = int(os.getenv('DJANGO_TOKEN_CACHE_LOCAL_TIMEOUT', 10))
+
+    # Cache
+    # Point this at memcached in production (e.g.
+    # django.core.cache.backends.memcached.MemcachedCache and
+    # memcached:11211) so entries, and invalidating them, are shared between
+    # workers
+    CACHES = {
+        'default': {
+            'BACKEND': os.getenv(
+                'DJANGO_CACHE_BACKEND',
+                'django.core.cache.backends.locmem.LocMemCache',
+            ),
+            'LOCATION': os.getenv('DJANGO_CACHE_LOCATION', ''),
+        }
+    }
+    # Whether every process sees the same entries; Production only caches
+    # across requests when they do
+    SHARED_CACHE = CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHE_BACKENDS
 
     # Django Rest Framework
+    # The browsable API costs template imports at startup and a second
+    # renderer to negotiate on every request; Production turns it off
+    VETCLINIC_BROWSABLE_API = strtobool(os.getenv('VETCLINIC_BROWSABLE_API', 'yes'))
+
     REST_FRAMEWORK = {
         'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
         'PAGE_SIZE': int(os.getenv('DJANGO_PAGINATION_LIMIT', 10)),
         'DATETIME_FORMAT': '%Y-%m-%dT%H:%M:%S%z',
+        # orjson when it's installed, the stdlib otherwise
         'DEFAULT_RENDERER_CLASSES': (
-            'rest_framework.renderers.JSONRenderer',
+            'vetclinic.renderers.FastJSONRenderer',
             'rest_framework.renderers.BrowsableAPIRenderer',
         ),
+        'DEFAULT_PARSER_CLASSES': (
+            'vetclinic.parsers.FastJSONParser',
+            'rest_framework.parsers.FormParser',
+            'rest_framework.parsers.MultiPartParser',
+        ),
         'DEFAULT_PERMISSION_CLASSES': [
             'rest_framework.permissions.IsAuthenticated',
         ],
         'DEFAULT_AUTHENTICATION_CLASSES': (
             'rest_framework.authentication.SessionAuthentication',
-            'rest_framework.authentication.TokenAuthentication',
+            'drfdemo.users.authentication.CachedTokenAuthentication',
         )
     }
+
+    @classmethod
+    def setup(cls):
+        super().setup()
+        urls = [url.strip() for url in cls.DATABASE_REPLICA_URLS.split(',') if url.strip()]
+        weights = [int(weight) for weight in cls.DATABASE_REPLICA_WEIGHTS.split(',') if weight.strip()]
+        weights += [1] * (len(urls) - len(weights))
+        replicas = {f'replica{i}': url for i, url in enumerate(urls, start=1)}
+        cls.DATABASES = dict(cls.DATABASES, **{
+            alias: dict(
+                dj_database_url.parse(url, conn_max_age=cls.DATABASES['default'].get('CONN_MAX_AGE', 0)),
+                # tests read the primary's test database through them
+                TEST={'MIRROR': 'default'},
+            )
+            for alias, url in replicas.items()
+        })
+        cls.VETCLINIC_READ_REPLICAS = dict(cls.VETCLINIC_READ_REPLICAS, **dict(zip(replicas, weights)))
+        if cls.POSTGRES_POOL_MODE not in ('', 'pgbouncer'):
+            raise ImproperlyConfigured(f'Unknown POSTGRES_POOL_MODE {cls.POSTGRES_POOL_MODE!r}')
+        for settings_dict in cls.DATABASES.values():
+            if settings_dict['ENGINE'] not in POSTGRES_ENGINES:
+                continue
+            settings_dict['ENGINE'] = 'drfdemo.postgresql'
+            settings_dict['CONN_HEALTH_CHECKS'] = bool(cls.POSTGRES_HEALTH_CHECKS)
+            if cls.POSTGRES_POOL_MODE == 'pgbouncer':
+                settings_dict['DISABLE_SERVER_SIDE_CURSORS'] = True
+        if not cls.VETCLINIC_BROWSABLE_API:
+            cls.REST_FRAMEWORK = dict(
+                cls.REST_FRAMEWORK,
+                DEFAULT_RENDERER_CLASSES=tuple(
+                    renderer for renderer in cls.REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES']
+                    if renderer != 'rest_framework.renderers.BrowsableAPIRenderer'
+                ),
+            )
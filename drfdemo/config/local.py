@@ -12,14 +12,28 @@ class Local(Common):
     TEST_RUNNER = 'django_nose.NoseTestSuiteRunner'
     NOSE_ARGS = [
         BASE_DIR,
+        os.path.join(os.path.dirname(BASE_DIR), 'vetclinic'),
         '-s',
         '--nologcapture',
         '--with-coverage',
         '--with-progressive',
-        '--cover-package=drfdemo'
+        '--cover-package=drfdemo,vetclinic'
     ]
 
     # Mail
     EMAIL_HOST = 'localhost'
     EMAIL_PORT = 1025
     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+    @classmethod
+    def setup(cls):
+        super().setup()
+        # A second connection to the development database, standing in for
+        # a read replica. Tests give it a database of its own, so the
+        # routing tests can tell which one answered. Nothing reads from it
+        # unless VETCLINIC_READ_REPLICAS names it.
+        default = cls.DATABASES['default']
+        replica = dict(default, TEST={})
+        if 'sqlite' not in default['ENGINE']:
+            replica['TEST'] = {'NAME': f'test_{default["NAME"]}_replica'}
+        cls.DATABASES = dict(cls.DATABASES, replica=replica)
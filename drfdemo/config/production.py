@@ -1,4 +1,7 @@
 import os
+import sys
+from distutils.util import strtobool
+from django.core.exceptions import ImproperlyConfigured
 from .common import Common
 
 
@@ -9,6 +12,7 @@ class Production(Common):
     # https://docs.djangoproject.com/en/2.0/ref/settings/#allowed-hosts
     ALLOWED_HOSTS = ["*"]
     INSTALLED_APPS += ("gunicorn", )
+    VETCLINIC_BROWSABLE_API = strtobool(os.getenv('VETCLINIC_BROWSABLE_API', 'no'))
 
     # Static files (CSS, JavaScript, Images)
     # https://docs.djangoproject.com/en/2.0/howto/static-files/
@@ -30,3 +34,81 @@ class Production(Common):
     AWS_HEADERS = {
         'Cache-Control': 'max-age=86400, s-maxage=86400, must-revalidate',
     }
+
+    # Caching across requests needs a cache every worker shares: in a
+    # process-local one, each worker only invalidates its own entries and
+    # the others keep serving theirs until they expire. Read replicas keep
+    # which clients just wrote (and so read from the primary for a while)
+    # there, and profiling the totals /metrics shows. Without a shared
+    # cache, these default to off, and turning them on is an error.
+    SHARED_CACHE_SETTINGS = (
+        'PERMISSION_CACHE_TIMEOUT', 'TOKEN_CACHE_TIMEOUT', 'VETCLINIC_RESPONSE_CACHE_TIMEOUT',
+        'VETCLINIC_READ_REPLICAS', 'VETCLINIC_PROFILING_SAMPLE_RATE',
+    )
+    # permissions are still cached for the length of a request
+    PERMISSION_CACHE_TIMEOUT = int(os.getenv(
+        'DJANGO_PERMISSION_CACHE_TIMEOUT', 300 if Common.SHARED_CACHE else 0))
+    TOKEN_CACHE_TIMEOUT = int(os.getenv('DJANGO_TOKEN_CACHE_TIMEOUT', 300 if Common.SHARED_CACHE else 0))
+    VETCLINIC_RESPONSE_CACHE_TIMEOUT = int(os.getenv(
+        'VETCLINIC_RESPONSE_CACHE_TIMEOUT', 3600 if Common.SHARED_CACHE else 0))
+    VETCLINIC_PROFILING_SAMPLE_RATE = float(os.getenv(
+        'VETCLINIC_PROFILING_SAMPLE_RATE', 0.01 if Common.SHARED_CACHE else 0))
+
+    @classmethod
+    def setup(cls):
+        super().setup()
+        cls.check_shared_cache()
+
+    @classmethod
+    def check_shared_cache(cls):
+        if cls.SHARED_CACHE:
+            return
+        enabled = [name for name in cls.SHARED_CACHE_SETTINGS if getattr(cls, name)]
+        if enabled:
+            raise ImproperlyConfigured(
+                f'{", ".join(enabled)} need a cache shared between workers; '
+                f'set DJANGO_CACHE_BACKEND and DJANGO_CACHE_LOCATION, or turn '
+                f'them off'
+            )
+
+
+class ApiWorker(Production):
+    """
+    Production for worker pools that only serve the API, started with
+    DJANGO_CONFIGURATION=ApiWorker. Everything else (the admin, the Swagger
+    docs, the browsable API's login) needs a Production worker.
+
+    Each app, middleware and renderer here is imported as every worker
+    boots and kept in its memory; ``manage.py profile_imports`` shows what
+    that costs.
+    """
+    INSTALLED_APPS = tuple(
+        app for app in Production.INSTALLED_APPS
+        if app not in (
+            'django.contrib.admin', 'django.contrib.messages',
+            'django.contrib.staticfiles', 'rest_framework_swagger', 'storages',
+        )
+    )
+    MIDDLEWARE = tuple(
+        middleware for middleware in Production.MIDDLEWARE
+        if middleware != 'django.contrib.messages.middleware.MessageMiddleware'
+    )
+    ROOT_URLCONF = 'drfdemo.api_urls'
+    VETCLINIC_BROWSABLE_API = False
+
+    # Optional packages that DRF, django-filter and Django's admindocs
+    # import whenever they're installed, for features these workers don't
+    # use: coreapi schemas, DRF's requests test client, the browsable API's
+    # markdown and pygments, and docutils. Between them (with the
+    # pkg_resources they pull in) they're the largest part of startup.
+    # Django imports jinja2 the same way, but before settings are loaded.
+    SKIPPED_IMPORTS = ('coreapi', 'coreschema', 'requests', 'markdown', 'pygments', 'docutils')
+
+    @classmethod
+    def setup(cls):
+        super().setup()
+        # settings load before any app is imported; with a None entry in
+        # sys.modules, importing one of these raises ImportError, which
+        # each of those libraries takes to mean it isn't installed
+        for module in cls.SKIPPED_IMPORTS:
+            sys.modules.setdefault(module, None)
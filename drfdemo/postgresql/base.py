@@ -0,0 +1,92 @@
+"""Postgres backend with connection health checks and counters
+
+Persistent connections (CONN_MAX_AGE) are checked out by the first query of
+each request. With ``CONN_HEALTH_CHECKS`` in a database's settings, that
+first query is preceded by a ``SELECT 1``, and a connection that fails it
+(a restarted server, a pgbouncer that dropped us) is replaced rather than
+failing the request. Django grows the same option in 4.1.
+
+:func:`connection_stats` counts what this process's connections have been
+doing, to size pools and spot churn. /metrics adds those up across workers
+as ``vetclinic_db_connections_total`` (see vetclinic/profiling.py), and
+``manage.py bench_connections`` compares connection counts and latency as
+workers grow.
+
+Behind pgbouncer (POSTGRES_POOL_MODE=pgbouncer), use transaction pooling:
+each transaction may run on a different server connection, so
+
+* server-side cursors, which outlive the transaction that opened them in
+  autocommit mode, are turned off (DISABLE_SERVER_SIDE_CURSORS), and
+  ``.iterator()`` reads everything at once -- see
+  ``vetclinic.export.animal_chunks`` for chunking without them
+* psycopg2 never prepares statements on the server, so there are none to
+  lose between transactions
+* Django sets the session's time zone when it connects unless the
+  server's default already matches, and that SET reaches only whichever
+  server connection ran it: give the role the right default instead
+  (``ALTER ROLE ... SET timezone TO 'UTC'``)
+"""
+
+import threading
+from collections import Counter
+
+from django.db.backends.postgresql import base
+
+_stats = Counter()
+_lock = threading.Lock()
+
+
+def _count(stat):
+    with _lock:
+        _stats[stat] += 1
+
+
+def connection_stats():
+    """Connections opened, reused, found broken and closed by this process"""
+    with _lock:
+        stats = {
+            stat: _stats[stat]
+            for stat in ('opened', 'reused', 'health_check_failures', 'closed')
+        }
+    checkouts = stats['opened'] + stats['reused']
+    stats['reuse_rate'] = stats['reused'] / checkouts if checkouts else 0
+    return stats
+
+
+def reset_connection_stats():
+    with _lock:
+        _stats.clear()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # whether the next query checks the connection out
+        self.checkout_pending = False
+
+    def connect(self):
+        # before connecting: that calls ensure_connection, too
+        self.checkout_pending = False
+        super().connect()
+        _count('opened')
+
+    def ensure_connection(self):
+        if self.connection is not None and self.checkout_pending and not self.in_atomic_block:
+            self.checkout_pending = False
+            _count('reused')
+            if self.settings_dict.get('CONN_HEALTH_CHECKS') and not self.is_usable():
+                _count('health_check_failures')
+                self.close()
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        # called as each request starts and finishes; what it looks at isn't
+        # a checkout
+        self.checkout_pending = False
+        super().close_if_unusable_or_obsolete()
+        self.checkout_pending = self.connection is not None
+
+    def _close(self):
+        super()._close()
+        _count('closed')
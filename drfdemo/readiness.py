@@ -0,0 +1,200 @@
+"""Startup checks, warm-up, and the /healthz and /readyz probes
+
+A worker that takes traffic before it can serve it fails requests, and one
+that's slow to say it's ready holds up a deploy. :func:`prepare` runs once
+as each worker starts (see wsgi.py) and in ``manage.py wait_until_ready``:
+
+* wait for the database, backing off exponentially with full jitter so a
+  fleet of containers starting together doesn't retry in lockstep
+* check that every migration has been applied
+* warm up what the first requests would otherwise pay for: the URL
+  resolver, every routed view's serializer fields, and a connection to
+  each database
+
+How long each step took is kept as the worker's cold start, logged, and
+shown by /readyz.
+
+/healthz only says the process is up. /readyz says whether :func:`prepare`
+succeeded; it answers from memory, so once a worker is ready neither probe
+touches the database. A worker that isn't ready retries the checks (without
+waiting) when it's probed, at most every STARTUP_BACKOFF_MAX seconds.
+"""
+
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.http import JsonResponse
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+_state = {'ready': False, 'problems': ['not checked yet'], 'checked': None, 'cold_start': {}}
+_lock = threading.Lock()
+
+
+def backoff(initial, maximum):
+    """Delays between attempts: exponential, capped, with full jitter"""
+    ceiling = initial
+    while True:
+        yield random.uniform(0, ceiling)
+        ceiling = min(ceiling * 2, maximum)
+
+
+def wait_for_database(timeout, alias=DEFAULT_DB_ALIAS, sleep=time.sleep):
+    """Whether ``alias`` accepted a connection within ``timeout`` seconds"""
+    connection = connections[alias]
+    deadline = time.monotonic() + timeout
+    delays = backoff(settings.STARTUP_BACKOFF_INITIAL, settings.STARTUP_BACKOFF_MAX)
+    while True:
+        try:
+            connection.ensure_connection()
+            return True
+        except DatabaseError as e:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.error('Database %s not reachable after %ss: %s', alias, timeout, e)
+                return False
+            delay = min(next(delays), remaining)
+            logger.info('Database %s not reachable yet, retrying in %.2fs', alias, delay)
+            sleep(delay)
+
+
+def unapplied_migrations(alias=DEFAULT_DB_ALIAS):
+    """``app.migration`` names not yet applied to ``alias``"""
+    executor = MigrationExecutor(connections[alias])
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    return [f'{migration.app_label}.{migration.name}' for migration, backwards in plan]
+
+
+def routed_views(patterns=None):
+    """The class of every DRF view in the URLconf"""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        if hasattr(pattern, 'url_patterns'):
+            yield from routed_views(pattern.url_patterns)
+            continue
+        view_class = getattr(pattern.callback, 'cls', None)
+        if view_class is not None:
+            yield view_class
+
+
+def warm_up_urls():
+    # reading it compiles every pattern and fills the reverse lookup tables
+    get_resolver().reverse_dict
+
+
+def warm_up_serializers():
+    # building a serializer's fields introspects its model; later instances
+    # of the class do the same work again, but the imports, lazy
+    # translations and field mappings are paid for here
+    seen = set()
+    for view_class in routed_views():
+        serializer_class = getattr(view_class, 'serializer_class', None)
+        if serializer_class is None or serializer_class in seen:
+            continue
+        seen.add(serializer_class)
+        serializer_class().fields
+
+
+def warm_up_connections():
+    # replicas are optional: the router stops using one that's down
+    for alias in connections:
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError as e:
+            if alias == DEFAULT_DB_ALIAS:
+                raise
+            logger.warning('Database %s not reachable: %s', alias, e)
+
+
+def prepare(timeout=0, warm_up=True, timings=None):
+    """Check and warm up this process, and remember whether it's ready
+
+    Returns what's wrong, if anything. How long each step took goes in
+    ``timings``, if given.
+    """
+    if timings is None:
+        timings = {}
+    problems = []
+
+    def timed(step, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            timings[step] = time.perf_counter() - start
+
+    if not timed('database', wait_for_database, timeout):
+        problems.append('database unreachable')
+    else:
+        unapplied = timed('migrations', unapplied_migrations)
+        if unapplied:
+            problems.append(f'unapplied migrations: {", ".join(unapplied)}')
+        if warm_up:
+            timed('urls', warm_up_urls)
+            timed('serializers', warm_up_serializers)
+            try:
+                timed('connections', warm_up_connections)
+            except DatabaseError as e:
+                problems.append(f'database unreachable: {e}')
+    with _lock:
+        _state.update(ready=not problems, problems=problems, checked=time.monotonic())
+    return problems
+
+
+def startup(started):
+    """Prepare a serving process that began starting at ``started``
+
+    ``started`` is a :func:`time.perf_counter` reading from before Django
+    was set up, so the cold start includes that.
+    """
+    timings = {}
+    problems = prepare(settings.STARTUP_TIMEOUT, settings.STARTUP_WARM_UP, timings)
+    timings['total'] = time.perf_counter() - started
+    with _lock:
+        _state['cold_start'] = timings
+    logger.info('Cold start %s', ' '.join(
+        f'{step}={seconds * 1000:.1f}ms' for step, seconds in timings.items()))
+    if problems:
+        logger.error('Not ready: %s', '; '.join(problems))
+    return problems
+
+
+def cold_start():
+    """Seconds each step of this process's :func:`startup` took"""
+    with _lock:
+        return dict(_state['cold_start'])
+
+
+def is_ready():
+    with _lock:
+        if _state['ready']:
+            return True
+        checked = _state['checked']
+        retry = checked is None or time.monotonic() - checked >= settings.STARTUP_BACKOFF_MAX
+    if retry:
+        return not prepare(warm_up=settings.STARTUP_WARM_UP)
+    return False
+
+
+def healthz(request):
+    return JsonResponse({'status': 'ok'})
+
+
+def readyz(request):
+    ready = is_ready()
+    with _lock:
+        body = {
+            'status': 'ready' if ready else 'not ready',
+            'problems': list(_state['problems']),
+            'cold_start_ms': {
+                step: round(seconds * 1000, 1) for step, seconds in _state['cold_start'].items()
+            },
+        }
+    return JsonResponse(body, status=200 if ready else 503)
@@ -0,0 +1,180 @@
+"""Send API reads to read replicas
+
+Safe requests (GET, HEAD, OPTIONS) to the paths in VETCLINIC_REPLICA_PATHS
+read models of the apps in VETCLINIC_REPLICA_APPS from one of the replicas
+in VETCLINIC_READ_REPLICAS, chosen at random in proportion to its weight.
+Everything else -- writes, other apps' models (tokens, sessions,
+permissions), management commands -- stays on the primary.
+
+A replica can be behind the primary, so a few things send reads back to it:
+
+* a replica more than VETCLINIC_REPLICA_MAX_LAG seconds behind, or one we
+  can't reach, isn't used until it's checked again (every
+  VETCLINIC_REPLICA_LAG_CHECK_INTERVAL seconds); with none left, reads go to
+  the primary
+* once a request writes anything, its remaining reads go to the primary, and
+  so do the requests made with the same credentials (token or session) for
+  the next VETCLINIC_REPLICA_STICKY_SECONDS, so clients read their own writes.
+  That's remembered in the cache, which every worker has to share for it to
+  work; Production won't use replicas otherwise.
+* a client can always ask for the primary with ``X-Read-Primary: 1``
+* reads inside a transaction on the primary stay there
+* code that keeps what it reads for other requests (the response cache,
+  animal summaries) reads inside :func:`reading_from_primary` or from the
+  primary directly
+"""
+
+import contextlib
+import hashlib
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+_state = threading.local()
+# alias -> (when it was checked, seconds behind or None if unreachable)
+_lag = {}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def replica_lag(alias):
+    """Seconds ``alias`` is behind the primary, or ``None`` if it's down
+
+    Rechecked at most every VETCLINIC_REPLICA_LAG_CHECK_INTERVAL seconds.
+    """
+    checked, lag = _lag.get(alias, (None, None))
+    now = time.monotonic()
+    if checked is not None and now - checked < settings.VETCLINIC_REPLICA_LAG_CHECK_INTERVAL:
+        return lag
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        lag = 0.0
+    else:
+        try:
+            with connection.cursor() as cursor:
+                # caught up when everything received has been replayed;
+                # otherwise, how old the last replayed transaction is
+                cursor.execute(
+                    'SELECT CASE WHEN NOT pg_is_in_recovery() '
+                    'OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+                )
+                lag = float(cursor.fetchone()[0] or 0)
+        except DatabaseError:
+            lag = None
+    _lag[alias] = (now, lag)
+    return lag
+
+
+def choose_replica():
+    """A replica that's caught up enough to read from, or ``None``"""
+    usable = {
+        alias: weight
+        for alias, weight in settings.VETCLINIC_READ_REPLICAS.items()
+        if weight > 0
+    }
+    usable = {
+        alias: weight for alias, weight in usable.items()
+        if _acceptable(replica_lag(alias))
+    }
+    if not usable:
+        return None
+    aliases = list(usable)
+    return random.choices(aliases, [usable[alias] for alias in aliases])[0]
+
+
+def _acceptable(lag):
+    return lag is not None and lag <= settings.VETCLINIC_REPLICA_MAX_LAG
+
+
+def credential_key(request):
+    """Cache key for whoever is making ``request``, without a query"""
+    credential = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(
+        settings.SESSION_COOKIE_NAME)
+    if not credential:
+        return None
+    return f'replicas:wrote:{hashlib.sha256(credential.encode()).hexdigest()}'
+
+
+def read_database_for(request):
+    """Where ``request``'s reads should go; ``None`` for the primary"""
+    if not settings.VETCLINIC_READ_REPLICAS or request.method not in SAFE_METHODS:
+        return None
+    if not request.path.startswith(tuple(settings.VETCLINIC_REPLICA_PATHS)):
+        return None
+    if request.META.get('HTTP_X_READ_PRIMARY', '') not in ('', '0'):
+        return None
+    key = credential_key(request)
+    if key is not None and cache.get(key):
+        return None
+    return choose_replica()
+
+
+def current_read_database():
+    return getattr(_state, 'read_db', None)
+
+
+@contextlib.contextmanager
+def reading_from_primary():
+    """Send this request's reads to the primary for the block"""
+    read_db = current_read_database()
+    _state.read_db = None
+    try:
+        yield
+    finally:
+        # after a write the rest of the request stays on the primary
+        if not getattr(_state, 'wrote', False):
+            _state.read_db = read_db
+
+
+class ReplicaRoutingMiddleware:
+    """Decide where each request reads from (see the module docstring)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.read_db = read_database_for(request)
+        _state.wrote = False
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = _state.wrote
+            _state.read_db = None
+            _state.wrote = False
+        if wrote and settings.VETCLINIC_READ_REPLICAS:
+            key = credential_key(request)
+            if key is not None:
+                cache.set(key, True, settings.VETCLINIC_REPLICA_STICKY_SECONDS)
+        return response
+
+
+class ReplicaRouter:
+    """Reads go where the middleware said; writes go to the primary
+
+    Every alias is answered explicitly: left to itself, Django would write
+    an instance back to the database it was read from.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = current_read_database()
+        if alias is None or model._meta.app_label not in settings.VETCLINIC_REPLICA_APPS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # it may be reading what the transaction wrote
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # the rest of the request reads its own writes
+        _state.read_db = None
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
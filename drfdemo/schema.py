@@ -0,0 +1,184 @@
+"""The OpenAPI schema behind /docs, generated ahead of time
+
+Generating the schema inspects every view, serializer and filter, which
+made /docs one of our most expensive pages, and internal tooling asks for
+it all the time. Instead ``manage.py generate_schema`` writes it to
+VETCLINIC_OPENAPI_SCHEMA, which is committed alongside the code;
+``generate_schema --check`` fails when it no longer matches. Each process
+reads the file once. If it's missing, the first request generates the
+schema instead.
+
+* /docs is the Swagger UI showing the stored schema; it says who's logged
+  in, so it isn't cached
+* ``/docs?format=openapi`` is the schema, with an ETag, cacheable for
+  VETCLINIC_SCHEMA_MAX_AGE seconds
+* /docs/openapi.<hash>.json is the same bytes under a URL that changes
+  with them, so it can be cached for a year. Both of the above link to it.
+
+The schema documents every endpoint as a superuser sees it, so only
+authenticated users get it, and only caches private to them may keep it.
+Anybody else gets the Swagger UI with nothing in it but the login link.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import HttpRequest
+from django.shortcuts import redirect
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from openapi_codec.encode import generate_swagger_object
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.schemas import SchemaGenerator
+from rest_framework.views import APIView
+from rest_framework_swagger import renderers
+from rest_framework_swagger.settings import swagger_settings
+
+logger = logging.getLogger(__name__)
+
+TITLE = 'Swagger API'
+YEAR = 365 * 24 * 60 * 60
+
+StoredSchema = namedtuple('StoredSchema', 'content hash')
+
+_stored = None
+_lock = threading.Lock()
+
+
+def generate_schema():
+    """The OpenAPI document for every endpoint, as bytes"""
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = '/docs'
+    request.META.update(SERVER_NAME='localhost', SERVER_PORT='80')
+    request = Request(request)
+    # an unsaved superuser passes every permission check, so nothing is
+    # left out
+    request.user = get_user_model()(
+        username='schema', is_active=True, is_staff=True, is_superuser=True,
+    )
+    # '/' leaves the host out, so the UI uses the one it was loaded from
+    document = SchemaGenerator(title=TITLE, url='/').get_schema(request=request)
+    data = generate_swagger_object(document)
+    data.update(renderers.OpenAPIRenderer().get_customizations())
+    # sorted and indented, so regenerating it makes a readable diff
+    return (json.dumps(data, indent=2, sort_keys=True) + '\n').encode()
+
+
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()[:16]
+
+
+def stored_schema():
+    """The schema this process serves, read (or generated) once"""
+    global _stored
+    with _lock:
+        if _stored is None:
+            path = settings.VETCLINIC_OPENAPI_SCHEMA
+            try:
+                with open(path, 'rb') as schema_file:
+                    content = schema_file.read()
+            except FileNotFoundError:
+                logger.warning('%s is missing; generating the schema', path)
+                content = generate_schema()
+            _stored = StoredSchema(content, content_hash(content))
+        return _stored
+
+
+def forget_stored_schema():
+    global _stored
+    with _lock:
+        _stored = None
+
+
+def versioned_url(schema):
+    return reverse('openapi-schema', kwargs={'version': schema.hash})
+
+
+# what /docs shows to anybody who isn't logged in
+EMPTY_SCHEMA = json.dumps({
+    'swagger': '2.0', 'info': {'title': TITLE, 'version': ''}, 'paths': {},
+})
+
+
+class StoredOpenAPIRenderer(renderers.OpenAPIRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, StoredSchema):
+            # errors (405 and so on)
+            return JSONRenderer().render(data)
+        return data.content
+
+
+class StoredSwaggerUIRenderer(renderers.SwaggerUIRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # the upstream renderer returns an HttpResponse, and reading its
+        # content closes it: request_finished fires mid-request and takes
+        # the database connection with it
+        self.set_context(data, renderer_context)
+        return render_to_string(self.template, renderer_context, request=renderer_context['request'])
+
+    def set_context(self, data, renderer_context):
+        renderer_context['USE_SESSION_AUTH'] = swagger_settings.USE_SESSION_AUTH
+        renderer_context.update(self.get_auth_urls())
+        renderer_context['drs_settings'] = json.dumps(self.get_ui_settings())
+        if isinstance(data, StoredSchema):
+            renderer_context['spec'] = data.content.decode()
+        else:
+            # not logged in, and so on
+            renderer_context['spec'] = EMPTY_SCHEMA
+
+
+class SchemaOnly(BaseContentNegotiation):
+    """The schema whatever the client accepts, as the URL promises"""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class SchemaView(APIView):
+    """The Swagger UI, or the schema itself, from the stored schema"""
+    schema = None
+    permission_classes = (IsAuthenticated, )
+    renderer_classes = (StoredOpenAPIRenderer, StoredSwaggerUIRenderer)
+
+    def get(self, request):
+        schema = stored_schema()
+        if request.accepted_renderer.format == 'openapi':
+            etag = f'"{schema.hash}"'
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = Response(schema)
+            response['ETag'] = etag
+            patch_cache_control(response, private=True, max_age=settings.VETCLINIC_SCHEMA_MAX_AGE)
+        else:
+            response = Response(schema)
+        response['Link'] = f'<{versioned_url(schema)}>; rel="describedby"'
+        return response
+
+
+class VersionedSchemaView(APIView):
+    """The stored schema under a URL that changes whenever it does"""
+    schema = None
+    permission_classes = (IsAuthenticated, )
+    renderer_classes = (StoredOpenAPIRenderer, )
+    content_negotiation_class = SchemaOnly
+
+    def get(self, request, version):
+        schema = stored_schema()
+        if version != schema.hash:
+            return redirect(versioned_url(schema))
+        response = Response(schema)
+        patch_cache_control(response, private=True, max_age=YEAR, immutable=True)
+        return response
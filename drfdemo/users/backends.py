@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from .caches import permission_cache_key
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend that keeps each user's permission set in the shared cache.
+
+    ModelBackend already caches permissions on the user instance, but we get
+    a fresh instance on every request, so that's two queries (user and group
+    permissions) per request for anything that checks a permission. Setting
+    PERMISSION_CACHE_TIMEOUT to a number of seconds shares the result across
+    requests and processes; 0 turns the shared cache off.
+    """
+
+    def get_all_permissions(self, user_obj, obj=None):
+        timeout = getattr(settings, 'PERMISSION_CACHE_TIMEOUT', 0)
+        if not timeout or obj is not None or hasattr(user_obj, '_perm_cache'):
+            return super().get_all_permissions(user_obj, obj)
+        if not user_obj.is_active or user_obj.is_anonymous:
+            return set()
+        key = permission_cache_key(user_obj.pk)
+        perms = cache.get(key)
+        if perms is None:
+            perms = super().get_all_permissions(user_obj, obj)
+            cache.set(key, perms, timeout)
+        user_obj._perm_cache = perms
+        return perms
@@ -0,0 +1,168 @@
+"""Shared-cache helpers for user data that's read on every request"""
+
+import hashlib
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+PERMISSION_CACHE_VERSION_KEY = 'users:permissions:version'
+
+
+def permission_cache_key(user_pk):
+    # Every key embeds a version that invalidate_permission_cache() replaces,
+    # which drops every user's entry at once without having to find them.
+    version = cache.get_or_set(
+        PERMISSION_CACHE_VERSION_KEY, lambda: uuid.uuid4().hex, None,
+    )
+    return f'users:permissions:{version}:{user_pk}'
+
+
+def invalidate_permission_cache(user_pk=None):
+    """Forget cached permissions for one user, or for everybody"""
+    if user_pk is None:
+        cache.set(PERMISSION_CACHE_VERSION_KEY, uuid.uuid4().hex, None)
+    else:
+        cache.delete(permission_cache_key(user_pk))
+
+
+class LocalTokenCache:
+    """An LRU of authenticated tokens, private to this process
+
+    ``generation`` goes up with every invalidation, so a request that read a
+    token from the database before an invalidation can tell not to cache
+    what it read.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.generation = 0
+        self.stats = Counter()
+
+    def get(self, key):
+        with self.lock:
+            try:
+                expires, entry = self.entries[key]
+            except KeyError:
+                return None
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, timeout, size, generation):
+        with self.lock:
+            if generation != self.generation:
+                return False
+            self.entries[key] = (time.monotonic() + timeout, entry)
+            self.entries.move_to_end(key)
+            while len(self.entries) > size:
+                self.entries.popitem(last=False)
+            return True
+
+    def delete(self, keys):
+        with self.lock:
+            self.generation += 1
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+
+local_tokens = LocalTokenCache()
+
+
+def token_cache_key(token_key):
+    # hashed so the cache never holds usable credentials
+    return f'users:tokens:{hashlib.sha256(token_key.encode()).hexdigest()}'
+
+
+def get_cached_token(token_key):
+    """What :func:`cache_token` stored for ``token_key``, or ``None``"""
+    entry = None
+    if settings.TOKEN_CACHE_LOCAL_SIZE:
+        entry = local_tokens.get(token_key)
+        if entry is not None:
+            local_tokens.stats['local_hits'] += 1
+            return entry
+    if settings.TOKEN_CACHE_TIMEOUT:
+        entry = cache.get(token_cache_key(token_key))
+    if entry is None:
+        local_tokens.stats['misses'] += 1
+        return None
+    local_tokens.stats['shared_hits'] += 1
+    if settings.TOKEN_CACHE_LOCAL_SIZE:
+        local_tokens.set(
+            token_key, entry, settings.TOKEN_CACHE_LOCAL_TIMEOUT,
+            settings.TOKEN_CACHE_LOCAL_SIZE, local_tokens.generation,
+        )
+    return entry
+
+
+def token_cache_generation():
+    """Pass to :func:`cache_token` for what's about to be read"""
+    return local_tokens.generation
+
+
+def cache_token(token_key, entry, generation):
+    """Keep ``entry`` for ``token_key`` unless it was invalidated since
+    ``generation``"""
+    if settings.TOKEN_CACHE_LOCAL_SIZE:
+        stored = local_tokens.set(
+            token_key, entry, settings.TOKEN_CACHE_LOCAL_TIMEOUT,
+            settings.TOKEN_CACHE_LOCAL_SIZE, generation,
+        )
+        if not stored:
+            return
+    elif generation != local_tokens.generation:
+        return
+    if settings.TOKEN_CACHE_TIMEOUT:
+        cache.set(token_cache_key(token_key), entry, settings.TOKEN_CACHE_TIMEOUT)
+
+
+def invalidate_token_cache(token_keys):
+    """Forget cached tokens, now and again when the transaction commits
+
+    The second time catches a request that read the old rows in between.
+    Other processes' local caches can't be reached; they hold entries for
+    at most TOKEN_CACHE_LOCAL_TIMEOUT seconds.
+    """
+    token_keys = list(token_keys)
+    if not token_keys:
+        return
+
+    def invalidate():
+        local_tokens.delete(token_keys)
+        cache.delete_many([token_cache_key(key) for key in token_keys])
+
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+def token_cache_stats():
+    """This process's token cache lookups since the last reset
+
+    /metrics adds these up across workers as
+    ``vetclinic_token_cache_lookups_total`` (see vetclinic/profiling.py).
+    """
+    stats = {
+        stat: local_tokens.stats[stat]
+        for stat in ('local_hits', 'shared_hits', 'misses')
+    }
+    total = sum(stats.values())
+    hits = stats['local_hits'] + stats['shared_hits']
+    stats['hit_rate'] = hits / total if total else 0
+    return stats
+
+
+def reset_token_cache_stats():
+    local_tokens.stats.clear()
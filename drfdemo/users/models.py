@@ -2,11 +2,13 @@ import uuid
 from django.db import models
 from django.conf import settings
 from django.dispatch import receiver
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.utils.encoding import python_2_unicode_compatible
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from rest_framework.authtoken.models import Token
 
+from .caches import invalidate_permission_cache, invalidate_token_cache
+
 
 @python_2_unicode_compatible
 class User(AbstractUser):
@@ -20,3 +22,36 @@ class User(AbstractUser):
 def create_auth_token(sender, instance=None, created=False, **kwargs):
     if created:
         Token.objects.create(user=instance)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_permissions(sender, instance=None, **kwargs):
+    # is_superuser and is_active both change what has_perm() returns
+    invalidate_permission_cache(instance.pk)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_tokens(sender, instance=None, created=False, **kwargs):
+    # Deactivation and password changes have to lock the user out straight
+    # away, and the cached copy of everything else shouldn't go stale either
+    if not created:
+        invalidate_token_cache(
+            Token.objects.filter(user=instance).values_list('key', flat=True))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance=None, **kwargs):
+    invalidate_token_cache([instance.key])
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def invalidate_all_permissions(sender, action=None, **kwargs):
+    # Membership changes can touch any number of users (adding a permission
+    # to a group, say), so start everybody over. They're rare enough that
+    # it's not worth working out exactly who was affected.
+    if action is None or action.startswith('post_'):
+        invalidate_permission_cache()
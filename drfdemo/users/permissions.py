@@ -12,3 +12,23 @@ class IsUserOrReadOnly(permissions.BasePermission):
             return True
 
         return obj == request.user
+
+
+class RequestPermissionCacheMixin:
+    """
+    Viewset mixin that resolves each permission at most once per request.
+
+    Views tend to ask the same question from several hooks (get_queryset(),
+    get_serializer_class(), permission classes...). Use self.has_perm()
+    instead of request.user.has_perm() to only ask the auth backends once.
+    """
+
+    def has_perm(self, perm):
+        request = self.request
+        try:
+            resolved = request._resolved_permissions
+        except AttributeError:
+            resolved = request._resolved_permissions = {}
+        if perm not in resolved:
+            resolved[perm] = request.user.has_perm(perm)
+        return resolved[perm]
@@ -0,0 +1,165 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from nose.tools import eq_, ok_
+from rest_framework.authtoken.models import Token
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from drfdemo.config import Production
+
+from .. import caches
+from ..authentication import CachedTokenAuthentication
+from .factories import UserFactory
+
+
+@override_settings(
+    TOKEN_CACHE_TIMEOUT=300, TOKEN_CACHE_LOCAL_SIZE=1000, TOKEN_CACHE_LOCAL_TIMEOUT=10,
+)
+class TestCachedTokenAuthentication(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches.local_tokens.clear()
+        caches.reset_token_cache_stats()
+        self.user = UserFactory()
+        self.key = self.user.auth_token.key
+
+    def authenticate(self, key=None):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {key or self.key}')
+        return CachedTokenAuthentication().authenticate(request)
+
+    def test_cached(self):
+        with self.assertNumQueries(1):
+            first, _ = self.authenticate()
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+        eq_(str(user.pk), str(self.user.pk))
+        eq_((user.username, user.is_active, user.password),
+            (self.user.username, True, self.user.password))
+        eq_((token.key, token.user_id, token.created), (self.key, user.pk, self.user.auth_token.created))
+        ok_(token.user is user)
+        # every request gets its own instances
+        ok_(user is not first)
+        eq_(caches.token_cache_stats(), {
+            'local_hits': 1, 'shared_hits': 0, 'misses': 1, 'hit_rate': 0.5,
+        })
+
+    def test_shared_between_processes(self):
+        self.authenticate()
+        # as another process would find it
+        caches.local_tokens.clear()
+        with self.assertNumQueries(0):
+            eq_(self.authenticate()[0].username, self.user.username)
+        with self.assertNumQueries(0):
+            self.authenticate()
+        eq_(caches.token_cache_stats()['shared_hits'], 1)
+        eq_(caches.token_cache_stats()['local_hits'], 1)
+
+    def test_deactivation(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_password_change(self):
+        self.authenticate()
+        self.user.set_password('a new password')
+        self.user.save()
+        eq_(self.authenticate()[0].password, self.user.password)
+        eq_(caches.token_cache_stats()['misses'], 2)
+
+    def test_token_deleted(self):
+        self.authenticate()
+        Token.objects.filter(pk=self.key).delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+        self.authenticate(Token.objects.create(user=self.user).key)
+
+    def test_failures_arent_cached(self):
+        for _ in range(2):
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate('not-a-token')
+        eq_(caches.token_cache_stats()['misses'], 2)
+
+    def test_invalidated_while_reading(self):
+        real = TokenAuthentication.authenticate_credentials
+
+        def deactivated_meanwhile(authentication, key):
+            result = real(authentication, key)
+            caches.invalidate_token_cache([key])
+            return result
+
+        with mock.patch('rest_framework.authentication.TokenAuthentication.authenticate_credentials',
+                        autospec=True, side_effect=deactivated_meanwhile):
+            self.authenticate()
+        # what was read before the invalidation wasn't kept
+        eq_(caches.get_cached_token(self.key), None)
+
+    @override_settings(TOKEN_CACHE_LOCAL_SIZE=2, TOKEN_CACHE_TIMEOUT=0)
+    def test_least_recently_used_go_first(self):
+        others = [UserFactory().auth_token.key for _ in range(2)]
+        self.authenticate()
+        self.authenticate(others[0])
+        self.authenticate()
+        self.authenticate(others[1])
+        eq_(list(caches.local_tokens.entries), [self.key, others[1]])
+
+    def test_local_entries_expire(self):
+        self.authenticate()
+        cache.clear()
+        with mock.patch('time.monotonic', return_value=caches.time.monotonic() + 11):
+            with self.assertNumQueries(1):
+                self.authenticate()
+
+    @override_settings(TOKEN_CACHE_TIMEOUT=0, TOKEN_CACHE_LOCAL_SIZE=0)
+    def test_off(self):
+        self.authenticate()
+        with self.assertNumQueries(1):
+            self.authenticate()
+
+    def test_stale_fields(self):
+        self.authenticate()
+        entry = caches.get_cached_token(self.key)
+        del entry['user']['email']
+        with self.assertNumQueries(1):
+            self.authenticate()
+
+
+class TestAPI(APITestCase):
+
+    def setUp(self):
+        caches.local_tokens.clear()
+        self.user = UserFactory()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+
+    def test_api(self):
+        eq_(self.client.get(reverse('animal-list')).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        # 403 rather than 401: SessionAuthentication comes first
+        eq_(self.client.get(reverse('animal-list')).status_code, 403)
+
+
+class TestProductionSettings(TestCase):
+    """
+    Production won't cache tokens across requests in a cache each worker
+    has to itself: deleting a token would only reach one of them.
+    """
+
+    def configuration(self, shared, **settings):
+        settings = dict({name: 0 for name in Production.SHARED_CACHE_SETTINGS}, **settings)
+        return type('Configured', (Production, ), dict(settings, SHARED_CACHE=shared))
+
+    def test_process_local_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.configuration(False, TOKEN_CACHE_TIMEOUT=300).check_shared_cache()
+        self.configuration(False, TOKEN_CACHE_TIMEOUT=0).check_shared_cache()
+
+    def test_shared_cache(self):
+        self.configuration(True, TOKEN_CACHE_TIMEOUT=300).check_shared_cache()
@@ -0,0 +1,99 @@
+from unittest import mock
+
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from nose.tools import eq_, ok_
+from rest_framework.test import APITestCase
+
+from drfdemo.config import Production
+
+from ..models import User
+from .factories import UserFactory
+
+PERM = 'vetclinic.see_animal_appointments_with_animal'
+
+
+@override_settings(PERMISSION_CACHE_TIMEOUT=300)
+class TestCachedModelBackend(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.permission = Permission.objects.get(
+            codename='see_animal_appointments_with_animal',
+        )
+
+    def fresh_user(self):
+        # every request loads its own user instance
+        return User.objects.get(pk=self.user.pk)
+
+    def test_permissions_are_shared_between_user_instances(self):
+        ok_(not self.fresh_user().has_perm(PERM))
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            ok_(not user.has_perm(PERM))
+
+    def test_group_membership_change_invalidates(self):
+        group = Group.objects.create(name='vets')
+        group.permissions.add(self.permission)
+        ok_(not self.fresh_user().has_perm(PERM))
+        self.user.groups.add(group)
+        ok_(self.fresh_user().has_perm(PERM))
+
+    def test_group_permission_change_invalidates(self):
+        group = Group.objects.create(name='vets')
+        self.user.groups.add(group)
+        ok_(not self.fresh_user().has_perm(PERM))
+        group.permissions.add(self.permission)
+        ok_(self.fresh_user().has_perm(PERM))
+
+    def test_user_permission_change_invalidates(self):
+        ok_(not self.fresh_user().has_perm(PERM))
+        self.user.user_permissions.add(self.permission)
+        ok_(self.fresh_user().has_perm(PERM))
+
+    def test_deactivation_invalidates(self):
+        self.user.user_permissions.add(self.permission)
+        ok_(self.fresh_user().has_perm(PERM))
+        self.user.is_active = False
+        self.user.save()
+        ok_(not self.fresh_user().has_perm(PERM))
+
+    @override_settings(PERMISSION_CACHE_TIMEOUT=0)
+    def test_timeout_of_zero_disables_shared_cache(self):
+        self.fresh_user().has_perm(PERM)
+        user = self.fresh_user()
+        with self.assertNumQueries(2):
+            user.has_perm(PERM)
+
+    def test_production_needs_a_shared_cache(self):
+        # a revoked permission would only be forgotten by one worker
+        settings = {name: 0 for name in Production.SHARED_CACHE_SETTINGS}
+        for shared, timeout in [(False, 300), (False, 0), (True, 300)]:
+            configuration = type('Configured', (Production, ), dict(
+                settings, SHARED_CACHE=shared, PERMISSION_CACHE_TIMEOUT=timeout,
+            ))
+            with self.subTest(shared=shared, timeout=timeout):
+                if shared or not timeout:
+                    configuration.check_shared_cache()
+                else:
+                    with self.assertRaises(ImproperlyConfigured):
+                        configuration.check_shared_cache()
+
+
+class TestRequestPermissionCache(APITestCase):
+
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+
+    def test_animal_list_checks_each_permission_once(self):
+        with mock.patch.object(
+                User, 'has_perm', autospec=True, return_value=False,
+        ) as has_perm:
+            response = self.client.get(reverse('animal-list'))
+        eq_(response.status_code, 200)
+        eq_(has_perm.call_count, 1)
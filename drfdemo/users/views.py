@@ -1,11 +1,12 @@
 from rest_framework import viewsets, mixins
 from rest_framework.permissions import AllowAny
 from .models import User
-from .permissions import IsUserOrReadOnly
+from .permissions import IsUserOrReadOnly, RequestPermissionCacheMixin
 from .serializers import CreateUserSerializer, UserSerializer
 
 
-class UserViewSet(mixins.RetrieveModelMixin,
+class UserViewSet(RequestPermissionCacheMixin,
+                  mixins.RetrieveModelMixin,
                   mixins.UpdateModelMixin,
                   viewsets.GenericViewSet):
     """
@@ -16,7 +17,8 @@ class UserViewSet(mixins.RetrieveModelMixin,
     permission_classes = (IsUserOrReadOnly,)
 
 
-class UserCreateViewSet(mixins.CreateModelMixin,
+class UserCreateViewSet(RequestPermissionCacheMixin,
+                        mixins.CreateModelMixin,
                         viewsets.GenericViewSet):
     """
     Creates user accounts
@@ -5,9 +5,15 @@ For more information on this file, see
 https://docs.djangoproject.com/en/2.0/howto/deployment/wsgi/gunicorn/
 """
 import os
+import time
 
+started = time.perf_counter()
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "drfdemo.config")
 os.environ.setdefault("DJANGO_CONFIGURATION", "Production")
 
 from configurations.wsgi import get_wsgi_application  # noqa
 application = get_wsgi_application()
+
+# wait for the database and warm up; /readyz reports how that went
+from drfdemo import readiness  # noqa
+readiness.startup(started)
@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class VetclinicConfig(AppConfig):
     name = 'vetclinic'
+
+    def ready(self):
+        # connects the receivers that maintain AnimalSummary
+        from . import summaries  # noqa
+        # adds the __any lookup, if a database is Postgres
+        from . import filters
+        filters.register_lookups()
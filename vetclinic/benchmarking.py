@@ -0,0 +1,167 @@
+"""Helpers shared by the ``bench_*`` management commands
+
+Benchmarks seed their data inside :func:`rolled_back`, a transaction that
+is rolled back when they finish (unless asked to keep it), so they're safe
+to point at a dev database.
+"""
+
+import contextlib
+import datetime
+import itertools
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Max
+from django.utils.timezone import now
+
+from . import models
+
+
+ANIMAL_NAMES = [
+    'Ace', 'Bella', 'Charlie', 'Daisy', 'Fido', 'Luna', 'Max', 'Rex',
+    'Spot', 'Tiger',
+]
+
+
+class Rollback(Exception):
+    """Raised to unwind the benchmark transaction"""
+
+
+@contextlib.contextmanager
+def rolled_back(keep=False):
+    """Run the block in a transaction that's rolled back unless ``keep``"""
+    try:
+        with transaction.atomic():
+            yield
+            if not keep:
+                raise Rollback
+    except Rollback:
+        pass
+
+
+def bulk_create(model, objects, batch_size=500):
+    """bulk_create ``objects`` and return them with primary keys
+
+    Only Postgres hands keys back from bulk_create, so read the new rows
+    back instead. ``model`` needs an increasing integer primary key.
+    """
+    last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    model.objects.bulk_create(objects, batch_size=batch_size)
+    return list(model.objects.filter(pk__gt=last).order_by('pk'))
+
+
+def seed_animals(count, batch_size=500, names=None):
+    """Bulk insert ``count`` animals (and a client for every four of them)
+
+    By default names repeat on purpose so orderings on ``name`` have plenty
+    of ties; pass an iterable of ``names`` to use instead. Returns the
+    animals.
+    """
+    species, _ = models.Species.objects.get_or_create(name='Benchmark dog')
+    breed, _ = models.Breed.objects.get_or_create(
+        name='Benchmark mutt', species=species,
+    )
+    clients = bulk_create(
+        models.Client,
+        (
+            models.Client(
+                name=f'Benchmark client {i}', address_line_1='1 Main St',
+                city='Philadelphia', state='PA', zip='19107',
+                phone='215-555-0100',
+            )
+            for i in range(max(count // 4, 1))
+        ),
+        batch_size,
+    )
+    client_ids = itertools.cycle(client.pk for client in clients)
+    names = iter(names) if names is not None else itertools.cycle(ANIMAL_NAMES)
+    return bulk_create(
+        models.Animal,
+        (
+            models.Animal(
+                name=next(names), client_id=next(client_ids),
+                species=species, breed=breed, approx_year_of_birth=2010,
+            )
+            for _ in range(count)
+        ),
+        batch_size,
+    )
+
+
+def seed_users(count, prefix='benchmark-user', batch_size=500):
+    """Bulk insert ``count`` users and return them
+
+    Numbering carries on from users already seeded with ``prefix``, so
+    seeding again (after a run with --keep, say) doesn't clash.
+    """
+    User = get_user_model()
+    seeded = User.objects.filter(username__startswith=f'{prefix}-').count()
+    usernames = [f'{prefix}-{i}' for i in range(seeded, seeded + count)]
+    User.objects.bulk_create(
+        (User(username=username) for username in usernames),
+        batch_size=batch_size,
+    )
+    return list(User.objects.filter(username__in=usernames).order_by('username'))
+
+
+def seed_appointments(count, vets=50, start=None, batch_size=500):
+    """Bulk insert ``count`` hourly appointments spread over ``vets`` vets
+
+    Returns the time of the first appointment; the last one is about
+    ``count / vets`` hours later.
+    """
+    if start is None:
+        start = now().replace(minute=0, second=0, microsecond=0)
+    vet_ids = [vet.pk for vet in bulk_create(
+        models.Veterinarian,
+        (
+            models.Veterinarian(user=user)
+            for user in seed_users(vets, prefix='benchmark-vet')
+        ),
+        batch_size,
+    )]
+    # one animal per vet keeps (time, animal) unique as well
+    animal_ids = [animal.pk for animal in seed_animals(vets)]
+    models.Appointment.objects.bulk_create(
+        (
+            models.Appointment(
+                time=start + datetime.timedelta(hours=i // vets),
+                veterinarian_id=vet_ids[i % vets],
+                animal_id=animal_ids[i % vets],
+            )
+            for i in range(count)
+        ),
+        batch_size=batch_size,
+    )
+    return start
+
+
+def benchmark_user(**kwargs):
+    """Return a throwaway user for authenticating benchmark requests"""
+    user, _ = get_user_model().objects.get_or_create(
+        username='benchmark', defaults=kwargs,
+    )
+    return user
+
+
+def time_it(func, repeat=20):
+    """Call ``func`` ``repeat`` times and return timings in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'max': max(timings),
+    }
+
+
+def format_timings(label, timings):
+    return (
+        f'{label:<40} min {timings["min"]:8.2f}ms  '
+        f'median {timings["median"]:8.2f}ms  max {timings["max"]:8.2f}ms'
+    )
@@ -0,0 +1,443 @@
+"""End-to-end benchmark suite for the vetclinic API
+
+:func:`seed` fills the database through the test factories (so the data
+looks like what the tests use, only more of it) and the seeders in
+:mod:`vetclinic.benchmarking`, then :func:`run_suite`
+drives every vetclinic endpoint through a harness:
+
+* :class:`InProcessHarness` goes through Django's test client: the full
+  middleware and view stack, without sockets
+* :class:`HTTPHarness` starts a single-threaded WSGI server on localhost
+  and talks real HTTP to it (a new connection per request)
+
+Either way, the server side shares the benchmark's database connection, so
+it sees the seeded data without it ever being committed.
+
+Each scenario reports p50/p95/p99 latency, throughput and queries per
+request. :func:`results` bundles them with the commit and settings into
+something to save as JSON, and :func:`compare` diffs two of those.
+"""
+
+import datetime
+import http.client
+import itertools
+import json
+import math
+import random
+import subprocess
+import threading
+import time
+from urllib.parse import urlencode
+
+import factory
+import factory.random
+from django.core import signals
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.servers.basehttp import WSGIRequestHandler, WSGIServer
+from django.db import close_old_connections, connection, connections
+from django.test import Client as TestClient
+from django.utils.timezone import now
+
+from . import benchmarking, models
+from .test.factories import (
+    AnimalFactory, AppointmentFactory, AppointmentViewerFactory,
+    BreedFactory, ClientFactory, SpeciesFactory, UserFactory,
+    VeterinarianFactory,
+)
+
+API = '/api/v1/vetclinic'
+
+# rows seeded at --scale 1
+DEFAULT_SCALE = {
+    'species': 10,
+    'breeds': 40,
+    'technicians': 20,
+    'veterinarians': 10,
+    'clients': 250,
+    'animals': 1000,
+    'appointments': 2000,
+}
+
+
+def scaled(scale):
+    return {
+        name: max(int(count * scale), 1)
+        for name, count in DEFAULT_SCALE.items()
+    }
+
+
+def seed(scale=1, batch_size=500, random_seed=0):
+    """Insert a clinic's worth of data and return the row counts
+
+    Users come from :func:`benchmarking.seed_users`. Species and breeds go
+    through the factories one at a time (there are few, and reruns reuse
+    them); clients, animals and appointments are built by the factories and
+    bulk inserted with :func:`benchmarking.bulk_create`.
+    """
+    counts = scaled(scale)
+    factory.random.reseed_random(random_seed)
+    rng = random.Random(random_seed)
+
+    technicians = benchmarking.seed_users(
+        counts['technicians'], prefix='benchsuite-technician',
+        batch_size=batch_size,
+    )
+    vet_users = benchmarking.seed_users(
+        counts['veterinarians'], prefix='benchsuite-vet',
+        batch_size=batch_size,
+    )
+
+    species = [SpeciesFactory() for _ in range(counts['species'])]
+    Technicians = models.Species.technicians.through
+    Technicians.objects.bulk_create(
+        [
+            Technicians(species_id=instance.pk, user_id=technician.pk)
+            for instance in species
+            for technician in rng.sample(technicians, min(3, len(technicians)))
+        ],
+        batch_size=batch_size,
+    )
+    breeds = [
+        BreedFactory(species=species[i % len(species)])
+        for i in range(counts['breeds'])
+    ]
+
+    clients = benchmarking.bulk_create(
+        models.Client, ClientFactory.build_batch(counts['clients']),
+        batch_size,
+    )
+    animals = []
+    for _ in range(counts['animals']):
+        breed = rng.choice(breeds)
+        animals.append(AnimalFactory.build(
+            client=rng.choice(clients), breed=breed, species=breed.species,
+        ))
+    animals = benchmarking.bulk_create(models.Animal, animals, batch_size)
+
+    vets = benchmarking.bulk_create(
+        models.Veterinarian,
+        [VeterinarianFactory.build(user=user) for user in vet_users],
+        batch_size,
+    )
+    # hourly, every vet busy at once, starting a few days back so the
+    # appointments view has both past and upcoming ones to show
+    start = now().replace(minute=0, second=0, microsecond=0)
+    start -= datetime.timedelta(days=3)
+    per_hour = min(len(vets), len(animals))
+    models.Appointment.objects.bulk_create(
+        (
+            AppointmentFactory.build(
+                time=start + datetime.timedelta(hours=i // per_hour),
+                veterinarian=vets[i % per_hour],
+                # consecutive animals, so none is booked twice in an hour
+                animal=animals[i % len(animals)],
+            )
+            for i in range(counts['appointments'])
+        ),
+        batch_size=batch_size,
+    )
+    return counts
+
+
+class Fixtures:
+    """IDs and users the scenarios need, picked from the seeded data"""
+
+    def __init__(self):
+        self.user = UserFactory()
+        self.viewer = AppointmentViewerFactory()
+        busy = models.Appointment.objects.order_by('-time').first()
+        self.animal = busy.animal
+        self.veterinarian_id = busy.veterinarian_id
+        self.breed = self.animal.breed
+        self.client_id = self.animal.client_id
+        self.species = self.animal.species
+        # far enough ahead that bookings never hit the seeded appointments
+        start = now().replace(minute=0, second=0, microsecond=0)
+        self._booking_times = (
+            start + datetime.timedelta(days=365, hours=hour)
+            for hour in itertools.count()
+        )
+
+    def next_booking_time(self):
+        return next(self._booking_times).isoformat()
+
+
+class Scenario:
+    """One kind of request, rebuilt for every iteration"""
+
+    def __init__(self, name, path, method='GET', params=None, body=None,
+                 user='user'):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.params = params
+        self.body = body
+        self.user = user
+
+    def build(self, fixtures):
+        """``(method, url, body or None)`` for the next request"""
+        path = self.path.format(f=fixtures)
+        params = self.params(fixtures) if callable(self.params) else self.params
+        if params:
+            path = f'{path}?{urlencode(params, doseq=True)}'
+        body = self.body(fixtures) if self.body else None
+        return self.method, path, body
+
+
+def _free_slot_params(fixtures):
+    start = now().replace(minute=0, second=0, microsecond=0)
+    return {
+        'start': start.isoformat(),
+        'end': (start + datetime.timedelta(days=7)).isoformat(),
+        'limit': 20,
+    }
+
+
+def _booking(fixtures):
+    return {
+        'time': fixtures.next_booking_time(),
+        'veterinarian': fixtures.veterinarian_id,
+    }
+
+
+def _batch_booking(fixtures):
+    return [
+        {
+            'animal': fixtures.animal.pk,
+            'veterinarian': fixtures.veterinarian_id,
+            'time': fixtures.next_booking_time(),
+        }
+        for _ in range(5)
+    ]
+
+
+SCENARIOS = [
+    Scenario('animals.list', f'{API}/animals/'),
+    Scenario('animals.list.page_100', f'{API}/animals/',
+             params={'page_size': 100}),
+    Scenario('animals.list.filtered', f'{API}/animals/', params=lambda f: {
+        'breed__species__name': f.species.name,
+        'name__istartswith': f.animal.name[:1],
+    }),
+    Scenario('animals.list.search', f'{API}/animals/',
+             params=lambda f: {'search': f.animal.name[:4]}),
+    Scenario('animals.list.appointments', f'{API}/animals/', user='viewer'),
+    Scenario('animals.retrieve', f'{API}/animals/{{f.animal.pk}}/'),
+    Scenario('animals.retrieve.appointments',
+             f'{API}/animals/{{f.animal.pk}}/', user='viewer'),
+    Scenario('animals.export', f'{API}/animals/export/',
+             params=lambda f: {'breed': f.breed.pk}),
+    # book_appointment is a detail @action without methods, so GET it is
+    Scenario('animals.book_appointment',
+             f'{API}/animals/{{f.animal.pk}}/book_appointment/',
+             body=_booking),
+    Scenario('animals.book_appointments', f'{API}/animals/book_appointments/',
+             method='POST', body=_batch_booking),
+    Scenario('clients.list', f'{API}/clients/'),
+    Scenario('clients.retrieve', f'{API}/clients/{{f.client_id}}/'),
+    Scenario('species.list', f'{API}/species/'),
+    Scenario('species.retrieve', f'{API}/species/{{f.species.pk}}/'),
+    *[
+        scenario
+        for kind in ('writable_pk', 'separate_pk', 'nested_field')
+        for scenario in (
+            Scenario(f'breeds.{kind}.list', f'{API}/breeds/{kind}/'),
+            Scenario(f'breeds.{kind}.retrieve',
+                     f'{API}/breeds/{kind}/{{f.breed.pk}}/'),
+        )
+    ],
+    Scenario('free_slots.list', f'{API}/free_slots/',
+             params=_free_slot_params),
+]
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class InProcessHarness:
+    """Requests through Django's test client"""
+    name = 'inprocess'
+
+    def __init__(self):
+        self.clients = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def request(self, user, method, path, body):
+        """``(status, seconds)`` for one request"""
+        client = self.clients.get(user.pk)
+        if client is None:
+            client = self.clients[user.pk] = TestClient(
+                HTTP_AUTHORIZATION=f'Token {user.auth_token}')
+        started = time.perf_counter()
+        response = client.generic(
+            method, path,
+            data=json.dumps(body) if body is not None else '',
+            content_type='application/json',
+        )
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code, time.perf_counter() - started
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HTTPHarness:
+    """Real HTTP against a WSGI server in a background thread
+
+    The server runs one request at a time on the benchmark's own database
+    connection, and close_old_connections is unhooked while it runs, the
+    same as the test client does.
+    """
+    name = 'http'
+
+    def __enter__(self):
+        self.connection = connections['default']
+        self.connection.allow_thread_sharing = True
+        signals.request_started.disconnect(close_old_connections)
+        signals.request_finished.disconnect(close_old_connections)
+        self.server = WSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+        self.server.set_app(WSGIHandler())
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+        return self
+
+    def serve(self):
+        connections['default'] = self.connection
+        self.server.serve_forever(poll_interval=0.05)
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        signals.request_started.connect(close_old_connections)
+        signals.request_finished.connect(close_old_connections)
+        self.connection.allow_thread_sharing = False
+
+    def request(self, user, method, path, body):
+        host, port = self.server.server_address
+        started = time.perf_counter()
+        conn = http.client.HTTPConnection(host, port)
+        try:
+            conn.request(
+                method, path,
+                body=json.dumps(body) if body is not None else None,
+                headers={
+                    'Authorization': f'Token {user.auth_token}',
+                    'Content-Type': 'application/json',
+                },
+            )
+            response = conn.getresponse()
+            response.read()
+        finally:
+            conn.close()
+        return response.status, time.perf_counter() - started
+
+
+HARNESSES = {harness.name: harness for harness in (InProcessHarness, HTTPHarness)}
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(math.ceil(fraction * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def summarize(timings, queries, statuses):
+    ordered = sorted(timings)
+    total = sum(ordered)
+    return {
+        'requests': len(ordered),
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+        'mean_ms': round(total / len(ordered) * 1000, 3),
+        'throughput_rps': round(len(ordered) / total, 1) if total else None,
+        'queries_per_request': round(sum(queries) / len(queries), 2),
+        'statuses': sorted(set(statuses)),
+    }
+
+
+def run_scenario(harness, scenario, fixtures, requests, warmup=3):
+    """Drive ``scenario`` ``requests`` times and summarize it"""
+    user = getattr(fixtures, scenario.user)
+    timings, queries, statuses = [], [], []
+    for iteration in range(warmup + requests):
+        method, path, body = scenario.build(fixtures)
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            status, seconds = harness.request(user, method, path, body)
+        if iteration >= warmup:
+            timings.append(seconds)
+            queries.append(counter.count)
+            statuses.append(status)
+    return summarize(timings, queries, statuses)
+
+
+def run_suite(harness, requests=100, warmup=3, only=None, progress=None):
+    """Run every scenario (or those named in ``only``) through ``harness``"""
+    fixtures = Fixtures()
+    summaries = {}
+    with harness:
+        for scenario in SCENARIOS:
+            if only and not any(scenario.name.startswith(o) for o in only):
+                continue
+            summaries[scenario.name] = run_scenario(
+                harness, scenario, fixtures, requests, warmup=warmup)
+            if progress:
+                progress(scenario.name, summaries[scenario.name])
+    return summaries
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def results(summaries, harness, counts, requests):
+    """Everything worth keeping about a run, ready for json.dump()"""
+    return {
+        'commit': current_commit(),
+        'timestamp': now().isoformat(),
+        'database': connection.vendor,
+        'harness': harness,
+        'requests_per_scenario': requests,
+        'rows': counts,
+        'scenarios': summaries,
+    }
+
+
+def compare(baseline, current):
+    """``(scenario, metric, before, after, change)`` for shared scenarios
+
+    ``change`` is the ratio after/before, or ``None`` when before was 0.
+    """
+    metrics = ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request')
+    rows = []
+    for name, summary in current['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            continue
+        for metric in metrics:
+            old, new = before[metric], summary[metric]
+            rows.append((name, metric, old, new, new / old if old else None))
+    return rows
@@ -0,0 +1,115 @@
+"""Booking many appointments at once
+
+book_appointment books one slot and leans on the unique_together
+constraints on Appointment to catch double bookings. For a batch that would
+mean a round trip (and possibly an IntegrityError) per slot, so instead we
+look up every existing appointment that could collide with the batch in one
+query, sort out conflicts in Python, and insert whatever is left together.
+"""
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+from . import bulk
+from . import models
+from . import summaries
+
+
+BOOKED = 'booked'
+CONFLICT = 'conflict'
+INVALID = 'invalid'
+
+# Someone else can book a slot between our conflict check and our insert;
+# the database constraint catches that, and we check again.
+MAX_ATTEMPTS = 3
+
+
+def existing_bookings(slots):
+    """Return the (time, vet) and (time, animal) pairs already taken
+
+    One query: every appointment at one of the batch's times that involves
+    one of its vets or animals. That's a superset of the real collisions,
+    which are picked out exactly by the caller.
+    """
+    if not slots:
+        return set(), set()
+    times = {slot['time'] for slot in slots}
+    vet_ids = {slot['veterinarian'].pk for slot in slots}
+    animal_ids = {slot['animal'].pk for slot in slots}
+    rows = models.Appointment.objects.filter(
+        Q(veterinarian_id__in=vet_ids) | Q(animal_id__in=animal_ids),
+        time__in=times,
+    ).values_list('time', 'veterinarian_id', 'animal_id')
+    vets_taken, animals_taken = set(), set()
+    for time, vet_id, animal_id in rows:
+        vets_taken.add((time, vet_id))
+        animals_taken.add((time, animal_id))
+    return vets_taken, animals_taken
+
+
+def plan_bookings(slots):
+    """Split ``[(index, slot), ...]`` into bookable slots and conflicts"""
+    vets_taken, animals_taken = existing_bookings([slot for _, slot in slots])
+    bookable, conflicts = [], {}
+    for index, slot in slots:
+        vet_key = (slot['time'], slot['veterinarian'].pk)
+        animal_key = (slot['time'], slot['animal'].pk)
+        errors = {}
+        if vet_key in vets_taken:
+            errors['veterinarian'] = [
+                'The veterinarian is already booked at this time.',
+            ]
+        if animal_key in animals_taken:
+            errors['animal'] = ['The animal is already booked at this time.']
+        if errors:
+            conflicts[index] = errors
+            continue
+        # later slots in the same batch can collide with this one too
+        vets_taken.add(vet_key)
+        animals_taken.add(animal_key)
+        bookable.append((index, slot))
+    return bookable, conflicts
+
+
+def book_appointments(serializer):
+    """Book every valid, non-conflicting slot in a batch
+
+    ``serializer`` is an unvalidated ``many=True`` serializer for the
+    batch. Returns one ``(status, appointment or errors)`` pair per item,
+    in request order.
+    """
+    data = serializer.initial_data
+    serializer.preload(data)
+    results = [None] * len(data)
+    slots = []
+    for index, item in enumerate(data):
+        try:
+            slots.append((index, serializer.child.run_validation(item)))
+        except ValidationError as exc:
+            results[index] = (INVALID, exc.detail)
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        bookable, conflicts = plan_bookings(slots)
+        appointments = [models.Appointment(**slot) for _, slot in bookable]
+        try:
+            with transaction.atomic():
+                bulk.bulk_create(
+                    models.Appointment.objects.all(), appointments,
+                    batch_size=settings.VETCLINIC_BULK_BATCH_SIZE,
+                )
+                # bulk_create sends no signals
+                summaries.refresh_appointments(
+                    appointment.animal_id for appointment in appointments)
+        except IntegrityError:
+            if attempt == MAX_ATTEMPTS:
+                raise
+            continue
+        break
+
+    for index, errors in conflicts.items():
+        results[index] = (CONFLICT, errors)
+    for (index, _), appointment in zip(bookable, appointments):
+        results[index] = (BOOKED, appointment)
+    return results
@@ -0,0 +1,55 @@
+"""Batched writes for list serializers"""
+
+from django.db import connections
+from django.db.models import Case, Value, When
+
+
+def _batch_size(queryset, fields, objs, batch_size):
+    # Django 2.2+ caps batch_size at what the backend can take in a single
+    # query (SQLite has a 999 parameter limit); older versions trust us.
+    limit = connections[queryset.db].ops.bulk_batch_size(fields, objs)
+    return max(min(batch_size or limit, limit), 1)
+
+
+def bulk_create(queryset, objs, batch_size=None):
+    model = queryset.model
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key
+    ]
+    return queryset.bulk_create(
+        objs, batch_size=_batch_size(queryset, fields, objs, batch_size),
+    )
+
+
+def bulk_update(queryset, objs, field_names, batch_size=None):
+    """Save ``field_names`` on every object in ``objs`` in as few queries as
+    the database allows
+
+    Uses ``QuerySet.bulk_update()`` where Django has it (2.2+), and the same
+    CASE WHEN approach by hand where it doesn't.
+    """
+    if not objs or not field_names:
+        return
+    if hasattr(queryset, 'bulk_update'):
+        queryset.bulk_update(objs, field_names, batch_size=batch_size)
+        return
+    model = queryset.model
+    fields = [model._meta.get_field(name) for name in field_names]
+    batch_size = _batch_size(queryset, fields + [model._meta.pk], objs,
+                             batch_size)
+    for start in range(0, len(objs), batch_size):
+        batch = objs[start:start + batch_size]
+        updates = {
+            field.attname: Case(
+                *[
+                    When(pk=obj.pk, then=Value(
+                        getattr(obj, field.attname), output_field=field,
+                    ))
+                    for obj in batch
+                ],
+                output_field=field,
+            )
+            for field in fields
+        }
+        queryset.filter(pk__in=[obj.pk for obj in batch]).update(**updates)
@@ -0,0 +1,130 @@
+"""Response cache for reference data
+
+Species and breeds are read constantly and change rarely, so list() and
+retrieve() responses for those viewsets are kept in the shared cache. Every
+key embeds a version that the model signals in models.py replace when a
+species, breed or technician changes, which drops every entry at once.
+
+Misses read from the primary even when the request was routed to a read
+replica: a lagging replica would otherwise put rows from before the change
+in the cache under the new version.
+
+The version is the time of the last change, which doubles as the
+Last-Modified of every response cached under it. ETags are a hash of the
+response data, worked out once when the entry is stored.
+"""
+
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, urlencode
+from rest_framework.response import Response
+
+from drfdemo import replicas
+
+RESPONSE_CACHE_VERSION_KEY = 'vetclinic:responses:version'
+RESPONSE_CACHE_STATS_KEYS = {
+    'hits': 'vetclinic:responses:hits',
+    'misses': 'vetclinic:responses:misses',
+}
+
+
+def response_cache_version():
+    return cache.get_or_set(
+        RESPONSE_CACHE_VERSION_KEY, lambda: f'{time.time():.6f}', None,
+    )
+
+
+def invalidate_response_cache():
+    """Forget every cached species and breed response"""
+    cache.set(RESPONSE_CACHE_VERSION_KEY, f'{time.time():.6f}', None)
+
+
+def _count(stat):
+    key = RESPONSE_CACHE_STATS_KEYS[stat]
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # evicted between add() and incr(); losing one count is fine
+        pass
+
+
+def response_cache_stats():
+    """Hits and misses since the counters were last reset"""
+    return {
+        stat: cache.get(key) or 0
+        for stat, key in RESPONSE_CACHE_STATS_KEYS.items()
+    }
+
+
+def reset_response_cache_stats():
+    cache.delete_many(list(RESPONSE_CACHE_STATS_KEYS.values()))
+
+
+def etag_for(data):
+    encoded = json.dumps(data, cls=DjangoJSONEncoder).encode()
+    return '"%s"' % hashlib.md5(encoded).hexdigest()
+
+
+class CachedResponseMixin:
+    """Serve list() and retrieve() from the response cache
+
+    Authentication, permissions and content negotiation all run as usual
+    before the cache is consulted; only the queries and serialization are
+    skipped. Responses are cached per URL (with the query string in a
+    canonical order), renderer and the few user attributes that could change
+    what comes back. Set VETCLINIC_RESPONSE_CACHE_TIMEOUT to 0 to turn it
+    off.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def get_response_cache_key(self, request, version):
+        user = request.user
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        parts = (
+            request.build_absolute_uri(request.path), query,
+            request.accepted_renderer.format,
+            user.is_authenticated, user.is_staff, user.is_superuser,
+        )
+        digest = hashlib.md5(repr(parts).encode()).hexdigest()
+        return f'vetclinic:responses:{version}:{digest}'
+
+    def cached_response(self, view, request, *args, **kwargs):
+        timeout = settings.VETCLINIC_RESPONSE_CACHE_TIMEOUT
+        if not timeout:
+            return view(request, *args, **kwargs)
+        version = response_cache_version()
+        key = self.get_response_cache_key(request, version)
+        entry = cache.get(key)
+        if entry is None:
+            _count('misses')
+            with replicas.reading_from_primary():
+                response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            entry = {'data': response.data, 'etag': etag_for(response.data)}
+            cache.set(key, entry, timeout)
+            response['X-Cache'] = 'MISS'
+        else:
+            _count('hits')
+            response = Response(entry['data'])
+            response['X-Cache'] = 'HIT'
+        last_modified = int(float(version))
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(last_modified)
+        return get_conditional_response(
+            request, etag=entry['etag'], last_modified=last_modified,
+            response=response,
+        )
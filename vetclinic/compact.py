@@ -0,0 +1,214 @@
+"""Compact read path for list endpoints
+
+Rendering a page through ModelSerializer binds a tree of Field objects and
+builds an OrderedDict per row (and per nested object), which dominates CPU
+time for big pages. A :class:`ValuesPlan` walks a serializer's fields once,
+works out which ``.values()`` columns each one needs, and afterwards turns
+rows straight into dicts with the same keys, in the same order, holding the
+same values as the serializer would produce.
+
+Only the field types our list serializers use are supported; compiling a
+plan for anything else raises :class:`UnsupportedField`, and callers should
+fall back to the regular serializer.
+"""
+
+from collections import defaultdict
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import relations
+from rest_framework import serializers
+
+from . import fields
+
+
+class UnsupportedField(Exception):
+    """The serializer has a field the compact path can't reproduce"""
+
+
+class ColumnStep:
+    """A plain model field: one column, run through the field's own
+    to_representation() so the output matches exactly"""
+
+    def __init__(self, name, column, field):
+        self.name = name
+        self.column = column
+        self.to_representation = field.to_representation
+
+    def columns(self):
+        return [self.column]
+
+    def build(self, row, related):
+        value = row[self.column]
+        return None if value is None else self.to_representation(value)
+
+
+class PrimaryKeyStep(ColumnStep):
+    """A PrimaryKeyRelatedField, which renders as the raw foreign key"""
+
+    def build(self, row, related):
+        return row[self.column]
+
+
+class NestedStep:
+    """A nested (non-many) serializer over a foreign key"""
+
+    def __init__(self, name, plan, null_column):
+        self.name = name
+        self.plan = plan
+        # the related object's primary key, which is NULL with no relation
+        self.null_column = null_column
+
+    def columns(self):
+        return [self.null_column] + self.plan.columns()
+
+    def build(self, row, related):
+        if row[self.null_column] is None:
+            return None
+        return self.plan.build(row, related)
+
+
+class ManyStep:
+    """A nested many=True serializer over a many-to-many field
+
+    These can't come from the same ``.values()`` query, so the whole page's
+    worth is fetched in one extra query against the through table. Related
+    rows come back in primary key order, so the regular path needs to be
+    prefetched with the same ordering to match.
+    """
+
+    def __init__(self, name, owner_column, model_field, plan):
+        self.name = name
+        self.owner_column = owner_column
+        self.through = model_field.remote_field.through
+        self.owner_fk = model_field.m2m_field_name()
+        self.target_fk = model_field.m2m_reverse_field_name()
+        self.plan = plan
+
+    def columns(self):
+        return [self.owner_column]
+
+    def fetch(self, rows):
+        owner_ids = {row[self.owner_column] for row in rows}
+        owner_ids.discard(None)
+        grouped = defaultdict(list)
+        if not owner_ids:
+            return grouped
+        through_rows = self.through.objects.filter(**{
+            f'{self.owner_fk}__in': owner_ids,
+        }).order_by(self.target_fk).values(self.owner_fk, *self.plan.columns())
+        for through_row in through_rows:
+            grouped[through_row[self.owner_fk]].append(
+                self.plan.build(through_row, {}))
+        return grouped
+
+    def build(self, row, related):
+        return related[self][row[self.owner_column]]
+
+
+class ValuesPlan:
+    """Precompiled mapping from ``.values()`` rows to serializer output"""
+
+    def __init__(self, serializer, prefix=''):
+        if (type(serializer).to_representation
+                is not serializers.Serializer.to_representation):
+            raise UnsupportedField('to_representation')
+        self.steps = []
+        model = serializer.Meta.model
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                # properties, methods, dotted sources and so on
+                raise UnsupportedField(name)
+            column = prefix + field.source
+            if isinstance(field, serializers.ListSerializer):
+                if not (model_field.many_to_many and model_field.concrete):
+                    raise UnsupportedField(name)
+                child_plan = ValuesPlan(
+                    field.child,
+                    prefix=model_field.m2m_reverse_field_name() + '__',
+                )
+                if any(child_plan.many_steps()):
+                    raise UnsupportedField(name)
+                self.steps.append(ManyStep(
+                    name, prefix + model._meta.pk.name, model_field,
+                    child_plan,
+                ))
+            elif isinstance(field, (
+                    serializers.ModelSerializer, fields.SpeciesField)):
+                if not (model_field.many_to_one or model_field.one_to_one):
+                    raise UnsupportedField(name)
+                if not model_field.concrete:
+                    # reverse relations can have any number of rows
+                    raise UnsupportedField(name)
+                if isinstance(field, fields.SpeciesField):
+                    field = SpeciesFieldShape()
+                related_pk = model_field.related_model._meta.pk.name
+                self.steps.append(NestedStep(
+                    name, ValuesPlan(field, prefix=column + '__'),
+                    f'{column}__{related_pk}',
+                ))
+            elif isinstance(field, relations.PrimaryKeyRelatedField):
+                self.steps.append(PrimaryKeyStep(name, column, field))
+            elif isinstance(field, (
+                    relations.RelatedField, relations.ManyRelatedField,
+                    serializers.BaseSerializer,
+                    serializers.SerializerMethodField,
+            )):
+                raise UnsupportedField(name)
+            elif model_field.is_relation or not model_field.concrete:
+                raise UnsupportedField(name)
+            else:
+                self.steps.append(ColumnStep(name, column, field))
+
+    def columns(self):
+        columns = []
+        for step in self.steps:
+            for column in step.columns():
+                if column not in columns:
+                    columns.append(column)
+        return columns
+
+    def many_steps(self):
+        for step in self.steps:
+            if isinstance(step, ManyStep):
+                yield step
+            elif isinstance(step, NestedStep):
+                yield from step.plan.many_steps()
+
+    def build(self, row, related):
+        return {step.name: step.build(row, related) for step in self.steps}
+
+    def values(self, queryset):
+        """``queryset`` as the ``.values()`` rows this plan needs
+
+        Annotations (a search rank, say) come along so pagination can still
+        order and seek on them.
+        """
+        return queryset.select_related(None).prefetch_related(None).values(
+            *self.columns(), *queryset.query.annotations)
+
+    def serialize(self, rows):
+        """Turn a page of rows from :meth:`values` into serializer output"""
+        related = {step: step.fetch(rows) for step in self.many_steps()}
+        return [self.build(row, related) for row in rows]
+
+
+class SpeciesFieldShape(serializers.ModelSerializer):
+    """What SpeciesField renders, spelled out as a serializer"""
+
+    class Meta:
+        model = fields.Species
+        fields = ('id', 'name')
+
+
+@lru_cache(maxsize=None)
+def plan_for(serializer_class):
+    """The compiled plan for ``serializer_class``, or ``None``"""
+    try:
+        return ValuesPlan(serializer_class())
+    except UnsupportedField:
+        return None
@@ -0,0 +1,72 @@
+"""Conditional GET for detail routes
+
+The models behind every detail representation carry an ``updated_at``
+column (species are also touched when their technicians change; see
+models.py). A viewset lists the ``updated_at`` lookups its representation
+depends on, and retrieve() reads just those columns to build an ETag and
+Last-Modified. When the client already has that version it gets a 304
+without the object ever being loaded or serialized.
+"""
+
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.permissions import BasePermission
+
+
+class ConditionalRetrieveMixin:
+    """Answer retrieve() with 304 Not Modified when nothing has changed"""
+
+    # updated_at columns, relative to the model, that the detail serializer
+    # renders something from
+    version_fields = ('updated_at',)
+
+    def get_version_fields(self):
+        """Columns to version the response by, or ``None`` to opt out"""
+        return self.version_fields
+
+    def get_versions(self, fields):
+        """The version columns of the requested object, or ``None``"""
+        for permission in self.get_permissions():
+            if (type(permission).has_object_permission
+                    is not BasePermission.has_object_permission):
+                # the object has to be loaded to check these
+                return None
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            return queryset.prefetch_related(None).filter(**{
+                self.lookup_field: self.kwargs[lookup_url_kwarg],
+            }).values_list(*fields).first()
+        except (TypeError, ValueError, ValidationError):
+            # a malformed pk; let retrieve() turn that into a 404
+            return None
+
+    def get_etag(self, versions):
+        # the same versions render differently through another serializer
+        # or renderer
+        parts = (
+            self.get_serializer_class().__name__,
+            self.request.accepted_renderer.format,
+            *(version.isoformat() for version in versions if version),
+        )
+        return '"%s"' % hashlib.md5(repr(parts).encode()).hexdigest()
+
+    def retrieve(self, request, *args, **kwargs):
+        fields = self.get_version_fields()
+        versions = self.get_versions(fields) if fields else None
+        if versions is None:
+            return super().retrieve(request, *args, **kwargs)
+        etag = self.get_etag(versions)
+        last_modified = int(max(
+            version for version in versions if version).timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified,
+        )
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
@@ -1,9 +1,144 @@
+from collections import OrderedDict, defaultdict
+
+from django.core.exceptions import ValidationError
 from rest_framework import serializers
+from rest_framework.fields import get_attribute
+from rest_framework.relations import PKOnlyObject
 
 from .models import Species
 
 
+class IdentityMap:
+    """Model instances by primary key, shared for the life of a request
+
+    Fields that need related objects can ask the map instead of the
+    database; anything it hasn't seen yet is fetched with one ``in_bulk``
+    query per call rather than one query per row.
+    """
+    attribute_name = '_vetclinic_identity_map'
+
+    def __init__(self):
+        self._instances = defaultdict(dict)
+
+    @classmethod
+    def for_serializer(cls, serializer):
+        # Hang the map off the request so every serializer rendering this
+        # response shares it. Serializers used outside of a view don't have a
+        # request, so fall back to the root serializer.
+        holder = serializer.context.get('request') or serializer.root
+        identity_map = getattr(holder, cls.attribute_name, None)
+        if identity_map is None:
+            identity_map = cls()
+            setattr(holder, cls.attribute_name, identity_map)
+        return identity_map
+
+    def has(self, model, pk):
+        return pk in self._instances[model]
+
+    def get_many(self, model, pks, queryset=None):
+        """Instances for ``pks`` (``None`` for any that don't exist)
+
+        Pass ``queryset`` to restrict what gets loaded. Instances are only
+        keyed by model, so everything asking for a model should agree on
+        which of its rows are visible.
+        """
+        known = self._instances[model]
+        missing = {pk for pk in pks if pk not in known}
+        if missing:
+            if queryset is None:
+                queryset = model._default_manager.all()
+            found = queryset.in_bulk(missing)
+            for pk in missing:
+                # remember misses too so we don't go looking for them again
+                known[pk] = found.get(pk)
+        return {pk: known[pk] for pk in pks}
+
+    def get(self, model, pk):
+        return self.get_many(model, [pk])[pk]
+
+
 class SpeciesField(serializers.PrimaryKeyRelatedField):
+    """Write a species by PK, read it back as a nested object
+
+    If the species was loaded along with its parent (``select_related``),
+    that instance is used as-is. Otherwise the species for every row being
+    rendered by the enclosing list serializer are fetched in one query and
+    kept in a request-wide :class:`IdentityMap`.
+    """
+
+    def get_attribute(self, instance):
+        attribute_instance = get_attribute(instance, self.source_attrs[:-1])
+        field_name = self.source_attrs[-1]
+        field = attribute_instance._meta.get_field(field_name)
+        if field.is_cached(attribute_instance):
+            return getattr(attribute_instance, field_name)
+        return PKOnlyObject(pk=attribute_instance.serializable_value(
+            field.attname))
 
     def to_representation(self, value):
-        return Species.objects.get(id=value)
+        if not isinstance(value, Species):
+            identity_map = IdentityMap.for_serializer(self)
+            if not identity_map.has(Species, value.pk):
+                # first time we've seen this species; load it along with
+                # the rest of the page in one go
+                identity_map.get_many(
+                    Species, self.get_sibling_pks() | {value.pk})
+            value = identity_map.get(Species, value.pk)
+            if value is None:
+                return None
+        return OrderedDict([('id', value.pk), ('name', value.name)])
+
+    def get_sibling_pks(self):
+        """PKs of this relation on every row the list serializer is rendering"""
+        list_serializer = getattr(self.parent, 'parent', None)
+        if not isinstance(list_serializer, serializers.ListSerializer):
+            return set()
+        # The list serializer has already evaluated its instance by the time
+        # any child is rendered, so iterating it again doesn't hit the db.
+        field_name = self.source_attrs[-1]
+        pks = set()
+        for row in list_serializer.instance or ():
+            attribute_instance = get_attribute(row, self.source_attrs[:-1])
+            field = attribute_instance._meta.get_field(field_name)
+            if field.is_cached(attribute_instance):
+                continue
+            pks.add(attribute_instance.serializable_value(field.attname))
+        pks.discard(None)
+        return pks
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField that validates through the IdentityMap
+
+    On its own this behaves like PrimaryKeyRelatedField (one query per
+    value). When a list serializer has called :meth:`preload` first, every
+    value is found in the map and validating N rows costs no queries at all.
+    """
+
+    def coerce_pk(self, data):
+        """Return ``data`` as a PK for the related model, or ``None``"""
+        if isinstance(data, bool):
+            return None
+        try:
+            return self.get_queryset().model._meta.pk.to_python(data)
+        except (TypeError, ValueError, ValidationError):
+            return None
+
+    def preload(self, values):
+        """Load the related objects for every value in one query"""
+        pks = {self.coerce_pk(value) for value in values}
+        pks.discard(None)
+        queryset = self.get_queryset()
+        IdentityMap.for_serializer(self).get_many(
+            queryset.model, pks, queryset=queryset)
+
+    def to_internal_value(self, data):
+        pk = self.coerce_pk(data)
+        model = self.get_queryset().model
+        identity_map = IdentityMap.for_serializer(self)
+        if pk is None or not identity_map.has(model, pk):
+            return super().to_internal_value(data)
+        instance = identity_map.get(model, pk)
+        if instance is None:
+            self.fail('does_not_exist', pk_value=data)
+        return instance
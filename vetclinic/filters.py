@@ -1,9 +1,14 @@
 """Filters for vet clinic"""
 
+from django.conf import settings
+from django.db import connections
+from django.db.models import Field, Lookup, Model
+from rest_framework.exceptions import ValidationError
 from rest_framework_filters.filterset import FilterSet
-from rest_framework_filters import RelatedFilter
+from rest_framework_filters import CharFilter, RelatedFilter
 
 from . import models
+from . import search
 
 # some handy defaults I like to use
 DEFAULT_NUMERIC_FILTER_OPERATORS = [
@@ -16,7 +21,96 @@ DEFAULT_STRING_FILTER_OPERATORS = [
 ]
 
 
-class SpeciesFilter(FilterSet):
+class RegexFilter(CharFilter):
+    """Regex lookup that refuses to scan a big table
+
+    Patterns the trigram indexes can't help with are only allowed while the
+    table is under VETCLINIC_REGEX_SCAN_LIMIT rows.
+    """
+
+    def filter(self, qs, value):
+        if value and not search.has_required_trigram(value):
+            if search.has_more_rows_than(qs, settings.VETCLINIC_REGEX_SCAN_LIMIT):
+                raise ValidationError({
+                    f'{self.field_name}__{self.lookup_expr}': [
+                        'This pattern would scan every row. Include at least '
+                        'three letters or digits in a row that every match '
+                        'must contain.',
+                    ],
+                })
+        return super().filter(qs, value)
+
+
+class ArrayAny(Lookup):
+    """``field = ANY(%s)`` with the whole list bound as one array (Postgres)
+
+    Same plan as ``IN (...)``, but the statement doesn't grow with the list,
+    so it's cheaper to send and parse and every request has the same shape
+    in pg_stat_statements. Only registered when a database is Postgres (see
+    :func:`register_lookups`).
+    """
+    lookup_name = 'any'
+    prepare_rhs = False
+
+    def get_db_prep_lookup(self, value, connection):
+        field = self.lhs.output_field
+        return '%s', [[
+            field.get_db_prep_value(
+                item.pk if isinstance(item, Model) else item, connection,
+            )
+            for item in value
+        ]]
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} = ANY({rhs})', lhs_params + rhs_params
+
+
+def register_lookups():
+    """Add the ``__any`` lookup to every field, if any database can run it"""
+    if any(connections[alias].vendor == 'postgresql' for alias in connections):
+        Field.register_lookup(ArrayAny)
+
+
+class ArrayAnyInMixin:
+    """``in`` filter that switches to :class:`ArrayAny` for long lists"""
+    # Related fields only take their own lookups, so foreign keys go through
+    # the target's pk (which Django reads off the local column, no join).
+    any_lookup = 'any'
+
+    def filter(self, qs, value):
+        rewrite = len(value or ()) >= settings.VETCLINIC_FILTER_IN_REWRITE_SIZE
+        if not rewrite or connections[qs.db].vendor != 'postgresql':
+            return super().filter(qs, value)
+        if self.distinct:
+            qs = qs.distinct()
+        return self.get_method(qs)(**{
+            f'{self.field_name}__{self.any_lookup}': list(value),
+        })
+
+
+class GuardedFilterSet(FilterSet):
+    """FilterSet that swaps in the guarded versions of expensive lookups
+
+    Pair it with planning.PlannedFilterBackend, which limits how they
+    combine.
+    """
+
+    @classmethod
+    def filter_for_lookup(cls, f, lookup_type):
+        filter_class, params = super().filter_for_lookup(f, lookup_type)
+        if lookup_type in ('regex', 'iregex'):
+            return RegexFilter, params
+        if lookup_type == 'in':
+            class GuardedInFilter(ArrayAnyInMixin, filter_class):
+                any_lookup = 'pk__any' if f.is_relation else 'any'
+            GuardedInFilter.__name__ = filter_class.__name__
+            return GuardedInFilter, params
+        return filter_class, params
+
+
+class SpeciesFilter(GuardedFilterSet):
 
     class Meta:
         model = models.Species
@@ -26,7 +120,7 @@ class SpeciesFilter(FilterSet):
         }
 
 
-class BreedFilter(FilterSet):
+class BreedFilter(GuardedFilterSet):
     species = RelatedFilter(
         SpeciesFilter,
         name='species',
@@ -42,7 +136,7 @@ class BreedFilter(FilterSet):
         }
 
 
-class AnimalFilter(FilterSet):
+class AnimalFilter(GuardedFilterSet):
     breed = RelatedFilter(
         BreedFilter,
         name='breed',
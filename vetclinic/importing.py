@@ -0,0 +1,500 @@
+"""Bulk import of a clinic's clients, animals and appointments
+
+Onboarding a clinic means loading hundreds of thousands of rows, which is
+hours of work through the API. ``import_clinic_data`` streams CSV or NDJSON
+files through here instead, a batch at a time:
+
+1. rows are cleaned with the model fields' own validation, and species and
+   breeds are resolved by name through an in-memory cache (missing ones are
+   created in one go)
+2. references to other files (an animal's client, an appointment's animal)
+   and ids we've seen before are resolved with one query per batch against
+   :class:`~vetclinic.models.ImportedRecord`, and appointments are checked
+   against the (time, veterinarian) and (time, animal) constraints in bulk
+3. on Postgres the batch is COPYed into a temporary staging table and
+   upserted with a single ``INSERT ... SELECT ... ON CONFLICT``; elsewhere
+   it's a bulk update plus a bulk insert
+
+Each batch commits together with a checkpoint, so an import that dies
+picks up after its last good batch, and rows with ids we've imported
+before update rather than duplicate, so rerunning a file is harmless.
+Rejected rows are reported with their errors rather than stopping the
+import.
+
+Rows are keyed by their id in the source system, in an ``id`` column.
+Animals refer to their client by that id (``client_id``) and to species and
+breed by name; appointments refer to their animal by id (``animal_id``) and
+to the veterinarian by username.
+"""
+
+import csv
+import hashlib
+import io
+import itertools
+import json
+import os
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from . import bulk, caches, models, summaries
+from .export import chunked
+
+FORMATS = ('csv', 'ndjson')
+EXTENSIONS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+
+class ImportFailed(Exception):
+    """The import can't go on (as opposed to a single bad row)"""
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        return EXTENSIONS[extension]
+    except KeyError:
+        raise ImportFailed(f"Can't tell the format of {path} from its extension")
+
+
+def read_rows(stream, file_format):
+    """Yield a dict per row of ``stream``, or ``None`` for one that isn't"""
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield row if isinstance(row, dict) else None
+
+
+def fingerprint(path):
+    """Size and a hash of the start of ``path``, to tell files apart"""
+    with open(path, 'rb') as stream:
+        digest = hashlib.sha256(stream.read(64 * 1024)).hexdigest()
+    return f'{os.path.getsize(path)}:{digest[:32]}'
+
+
+def reserve_ids(model, count):
+    """Primary keys for ``count`` new ``model`` rows
+
+    Postgres takes them from the table's sequence, so they can't collide
+    with anyone else's inserts. Other databases get the next ones after the
+    current maximum, which is only safe with nobody else writing.
+    """
+    if not count:
+        return []
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(pg_get_serial_sequence(%s, %s)) '
+                'FROM generate_series(1, %s)',
+                [model._meta.db_table, model._meta.pk.column, count],
+            )
+            return [row[0] for row in cursor.fetchall()]
+    start = (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+    return list(range(start, start + count))
+
+
+def copy_value(value):
+    """``value`` in COPY's text format"""
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace(
+        '\n', '\\n').replace('\r', '\\r')
+
+
+def copy_upsert(objs):
+    """Insert or update ``objs`` (all with primary keys) through COPY"""
+    model = type(objs[0])
+    fields = model._meta.concrete_fields
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    staging = quote(f'import_{model._meta.db_table}')
+    columns = ', '.join(quote(field.column) for field in fields)
+    updates = ', '.join(
+        f'{quote(field.column)} = EXCLUDED.{quote(field.column)}'
+        for field in fields if not field.primary_key
+    )
+    data = io.StringIO()
+    for obj in objs:
+        data.write('\t'.join(
+            copy_value(field.get_db_prep_save(getattr(obj, field.attname), connection))
+            for field in fields
+        ))
+        data.write('\n')
+    data.seek(0)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE {staging} (LIKE {table} INCLUDING DEFAULTS)')
+        cursor.copy_expert(f'COPY {staging} ({columns}) FROM STDIN', data)
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} '
+            f'ON CONFLICT ({quote(model._meta.pk.column)}) DO UPDATE SET {updates}'
+        )
+        cursor.execute(f'DROP TABLE {staging}')
+
+
+def orm_upsert(objs):
+    """Insert or update ``objs`` (all with primary keys) through the ORM"""
+    model = type(objs[0])
+    queryset = model.objects.all()
+    existing = set(queryset.filter(
+        pk__in=[obj.pk for obj in objs]).values_list('pk', flat=True))
+    bulk.bulk_update(
+        queryset, [obj for obj in objs if obj.pk in existing],
+        [field.name for field in model._meta.concrete_fields if not field.primary_key],
+    )
+    bulk.bulk_create(queryset, [obj for obj in objs if obj.pk not in existing])
+
+
+class Lookups:
+    """Names and ids resolved during an import, cached as we go
+
+    Species, breeds and veterinarians are small enough to load whole;
+    imported ids are looked up a batch at a time.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.species = dict(models.Species.objects.values_list('name', 'pk'))
+        self.breeds = {
+            (species_id, name): pk
+            for species_id, name, pk in models.Breed.objects.values_list(
+                'species_id', 'name', 'pk')
+        }
+        self.veterinarians = dict(models.Veterinarian.objects.values_list(
+            'user__username', 'pk'))
+
+    def add_species(self, names):
+        """Make sure every species in ``names`` exists"""
+        missing = set(names) - set(self.species)
+        if missing:
+            self._create(models.Species, [{'name': name} for name in missing])
+            self.species.update(models.Species.objects.filter(
+                name__in=missing).values_list('name', 'pk'))
+
+    def add_breeds(self, keys):
+        """Make sure every ``(species_id, name)`` breed in ``keys`` exists"""
+        missing = set(keys) - set(self.breeds)
+        if missing:
+            self._create(models.Breed, [
+                {'species_id': species_id, 'name': name}
+                for species_id, name in missing
+            ])
+            for species_id, name, pk in models.Breed.objects.filter(
+                    species_id__in={species_id for species_id, _ in missing},
+                    name__in={name for _, name in missing},
+            ).values_list('species_id', 'name', 'pk'):
+                self.breeds[species_id, name] = pk
+
+    def _create(self, model, rows):
+        try:
+            with transaction.atomic():
+                bulk.bulk_create(model.objects.all(), [model(**row) for row in rows])
+        except IntegrityError:
+            # somebody else got some of them in first
+            for row in rows:
+                model.objects.get_or_create(**row)
+        # bulk_create doesn't send post_save, so the cached species and
+        # breed responses wouldn't hear about these
+        transaction.on_commit(caches.invalidate_response_cache)
+
+    def object_ids(self, kind, external_ids):
+        """``{external id: object id}`` for the ones imported before"""
+        return dict(models.ImportedRecord.objects.filter(
+            source=self.source, kind=kind, external_id__in=set(external_ids),
+        ).values_list('external_id', 'object_id'))
+
+
+class Row:
+    """One row of a file on its way in"""
+
+    def __init__(self, number, data):
+        self.number = number
+        self.data = data
+        self.external_id = None
+        self.values = {}
+        self.errors = {}
+        self.object_id = None
+        # whether it's the first time we've seen its id
+        self.created = False
+
+
+class Importer:
+    """Imports one kind of row; see the subclasses"""
+    kind = None
+    model = None
+    # model fields read straight from the row
+    fields = ()
+
+    def __init__(self, lookups, use_copy=None):
+        self.lookups = lookups
+        if use_copy is None:
+            use_copy = connection.vendor == 'postgresql'
+        self.use_copy = use_copy
+
+    def clean(self, row):
+        """Validate ``row.data`` into ``row.values``, or fill ``row.errors``"""
+        if row.data is None:
+            row.errors['non_field_errors'] = ['Not a JSON object.']
+            return
+        external_id = row.data.get('id')
+        if external_id in (None, ''):
+            row.errors['id'] = ['This field is required.']
+        else:
+            row.external_id = str(external_id)
+        for name in self.fields:
+            field = self.model._meta.get_field(name)
+            value = row.data.get(name)
+            if value in (None, ''):
+                value = None if field.null else ''
+            try:
+                row.values[field.attname] = field.clean(value, None)
+            except ValidationError as exc:
+                row.errors[name] = exc.messages
+
+    def prepare(self, rows):
+        """Create whatever reference data ``rows`` need (outside the batch
+        transaction: it's shared, and harmless if the batch fails)"""
+
+    def resolve(self, rows):
+        """Fill in references and check constraints, a batch at a time"""
+
+    def after_write(self, rows):
+        """Bring anything derived from the written ``rows`` up to date"""
+
+    def import_batch(self, rows, checkpoint=None):
+        """Write the valid ``rows``; ``rows`` that aren't get ``errors``
+
+        ``checkpoint()`` is called in the same transaction as the writes.
+        """
+        for row in rows:
+            self.clean(row)
+        self.prepare([row for row in rows if not row.errors])
+        with transaction.atomic():
+            self.resolve([row for row in rows if not row.errors])
+            # later rows win over earlier ones with the same id
+            valid = list({row.external_id: row for row in rows if not row.errors}.values())
+            if valid:
+                self.write(valid)
+                self.after_write(valid)
+            if checkpoint is not None:
+                checkpoint()
+
+    def write(self, rows):
+        known = self.lookups.object_ids(self.kind, [row.external_id for row in rows])
+        new = [row for row in rows if row.external_id not in known]
+        for row in rows:
+            row.object_id = known.get(row.external_id)
+        for row, object_id in zip(new, reserve_ids(self.model, len(new))):
+            row.object_id = object_id
+            row.created = True
+        stamp = timezone.now()
+        objs = []
+        for row in rows:
+            obj = self.model(pk=row.object_id, **row.values)
+            if hasattr(obj, 'updated_at'):
+                obj.updated_at = stamp
+            objs.append(obj)
+        (copy_upsert if self.use_copy else orm_upsert)(objs)
+        bulk.bulk_create(models.ImportedRecord.objects.all(), [
+            models.ImportedRecord(
+                source=self.lookups.source, kind=self.kind,
+                external_id=row.external_id, object_id=row.object_id,
+            )
+            for row in new
+        ])
+
+    def reference(self, rows, kind, column, label):
+        """Resolve each row's ``column`` (an id from ``kind``'s file)"""
+        ids = self.lookups.object_ids(kind, [
+            str(row.data.get(column)) for row in rows])
+        for row in rows:
+            value = row.data.get(column)
+            object_id = ids.get(str(value))
+            if value in (None, ''):
+                row.errors[column] = ['This field is required.']
+            elif object_id is None:
+                row.errors[column] = [f'Unknown {label} {value!r}.']
+            else:
+                row.values[f'{label}_id'] = object_id
+
+
+class ClientImporter(Importer):
+    kind = 'clients'
+    model = models.Client
+    fields = (
+        'name', 'address_line_1', 'address_line_2', 'city', 'state', 'zip',
+        'phone', 'email',
+    )
+
+    def after_write(self, rows):
+        # renamed clients show up in their animals' summaries
+        summaries.refresh(models.Animal.objects.filter(
+            client_id__in=[row.object_id for row in rows if not row.created],
+        ).values_list('pk', flat=True))
+
+
+class AnimalImporter(Importer):
+    kind = 'animals'
+    model = models.Animal
+    fields = ('name', 'approx_year_of_birth', 'first_visit_date')
+
+    def clean(self, row):
+        super().clean(row)
+        if row.data is None:
+            return
+        for name, model in (('species', models.Species), ('breed', models.Breed)):
+            value = str(row.data.get(name) or '').strip()
+            try:
+                row.values[name] = model._meta.get_field('name').clean(value, None)
+            except ValidationError as exc:
+                row.errors[name] = exc.messages
+
+    def prepare(self, rows):
+        self.lookups.add_species(row.values['species'] for row in rows)
+        self.lookups.add_breeds(
+            (self.lookups.species[row.values['species']], row.values['breed'])
+            for row in rows
+        )
+
+    def resolve(self, rows):
+        for row in rows:
+            species_id = self.lookups.species[row.values.pop('species')]
+            row.values['species_id'] = species_id
+            row.values['breed_id'] = self.lookups.breeds[species_id, row.values.pop('breed')]
+        self.reference(rows, ClientImporter.kind, 'client_id', 'client')
+
+    def after_write(self, rows):
+        summaries.refresh(row.object_id for row in rows)
+
+
+class AppointmentImporter(Importer):
+    kind = 'appointments'
+    model = models.Appointment
+    fields = ('time', )
+
+    def clean(self, row):
+        super().clean(row)
+        if row.data is None:
+            return
+        time_ = row.values.get('time')
+        if time_ is not None and timezone.is_naive(time_):
+            row.values['time'] = timezone.make_aware(time_)
+        username = row.data.get('veterinarian')
+        if username not in self.lookups.veterinarians:
+            row.errors['veterinarian'] = [f'Unknown veterinarian {username!r}.']
+        else:
+            row.values['veterinarian_id'] = self.lookups.veterinarians[username]
+
+    def resolve(self, rows):
+        self.reference(rows, AnimalImporter.kind, 'animal_id', 'animal')
+        rows = [row for row in rows if not row.errors]
+        known = self.lookups.object_ids(self.kind, [row.external_id for row in rows])
+        # one query for every appointment that could collide with the batch
+        taken = {}
+        previous_animals = {}
+        same_vet = Q(veterinarian_id__in={row.values['veterinarian_id'] for row in rows})
+        same_animal = Q(animal_id__in={row.values['animal_id'] for row in rows})
+        colliding = Q(time__in={row.values['time'] for row in rows}) & (same_vet | same_animal)
+        # and where the ones we're updating are now
+        existing = models.Appointment.objects.filter(
+            colliding | Q(pk__in=known.values()),
+        ).values_list('pk', 'time', 'veterinarian_id', 'animal_id')
+        for pk, time_, veterinarian_id, animal_id in existing:
+            taken[time_, 'veterinarian', veterinarian_id] = pk
+            taken[time_, 'animal', animal_id] = pk
+            previous_animals[pk] = animal_id
+        for row in rows:
+            # the appointment itself, imported before, doesn't count
+            own = known.get(row.external_id, row.external_id)
+            for label in ('veterinarian', 'animal'):
+                key = (row.values['time'], label, row.values[f'{label}_id'])
+                if taken.get(key, own) != own:
+                    row.errors[label] = [f'The {label} is already booked at this time.']
+            if not row.errors:
+                taken[row.values['time'], 'veterinarian', row.values['veterinarian_id']] = own
+                taken[row.values['time'], 'animal', row.values['animal_id']] = own
+                row.previous_animal_id = previous_animals.get(own)
+
+    def after_write(self, rows):
+        # an appointment moved to another animal changes both summaries
+        summaries.refresh_appointments(itertools.chain(
+            (row.values['animal_id'] for row in rows),
+            (row.previous_animal_id for row in rows if row.previous_animal_id),
+        ))
+
+
+IMPORTERS = (ClientImporter, AnimalImporter, AppointmentImporter)
+
+
+class Progress:
+    """Rows read, imported and rejected so far, and how fast"""
+
+    def __init__(self, kind, skipped=0):
+        self.kind = kind
+        self.skipped = skipped
+        self.rows = self.imported = self.rejected = 0
+        self.start = time.perf_counter()
+
+    def add(self, rows):
+        self.rows += len(rows)
+        self.rejected += sum(1 for row in rows if row.errors)
+        self.imported = self.rows - self.rejected
+
+    @property
+    def rate(self):
+        elapsed = time.perf_counter() - self.start
+        return self.rows / elapsed if elapsed else 0
+
+    def __str__(self):
+        return (
+            f'{self.kind}: {self.skipped + self.rows:,} rows  '
+            f'{self.imported:,} imported  {self.rejected:,} rejected  '
+            f'{self.rate:,.0f} rows/s'
+        )
+
+
+def import_file(importer, path, file_format=None, batch_size=10000,
+                restart=False, on_batch=None):
+    """Import the rows of ``path``, resuming from its checkpoint
+
+    ``on_batch(progress, rejected_rows)`` is called after every batch
+    commits. Returns the final :class:`Progress`, or ``None`` if the file
+    was already imported in full.
+    """
+    file_format = file_format or detect_format(path)
+    checkpoint, _ = models.ImportCheckpoint.objects.get_or_create(
+        source=importer.lookups.source, kind=importer.kind,
+    )
+    current = fingerprint(path)
+    if restart or checkpoint.fingerprint != current:
+        checkpoint.fingerprint = current
+        checkpoint.rows_done = 0
+        checkpoint.finished = False
+        checkpoint.save()
+    if checkpoint.finished:
+        return None
+    progress = Progress(importer.kind, skipped=checkpoint.rows_done)
+    with open(path, encoding='utf-8', newline='') as stream:
+        numbered = enumerate(read_rows(stream, file_format), start=1)
+        # batches before the checkpoint are already in
+        numbered = itertools.islice(numbered, checkpoint.rows_done, None)
+        for batch in chunked(numbered, batch_size):
+            rows = [Row(number, data) for number, data in batch]
+            checkpoint.rows_done = rows[-1].number
+            importer.import_batch(rows, checkpoint=lambda: checkpoint.save(
+                update_fields=['rows_done', 'updated_at']))
+            progress.add(rows)
+            if on_batch is not None:
+                on_batch(progress, [row for row in rows if row.errors])
+    checkpoint.finished = True
+    checkpoint.save(update_fields=['finished', 'updated_at'])
+    return progress
@@ -0,0 +1,150 @@
+import asyncio
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+
+from drfdemo.asgi_handler import ASGIHandler
+from vetclinic import benchmarking, models
+from vetclinic.benchsuite import percentile
+
+URL = '/api/v1/vetclinic/animals/'
+
+
+def wsgi_environ(token):
+    return {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': URL, 'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_AUTHORIZATION': f'Token {token}',
+        'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the ASGI handler with sync WSGI workers as concurrent '
+        'connections grow'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--connections', type=int, nargs='+', default=[1, 50, 500],
+            help='Concurrent clients to try',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=1000,
+            help='Requests per run, split between the clients',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Requests in flight at once on each side: sync WSGI workers, '
+                 'and the ASGI handler\'s threads for this (read) path. '
+                 'Defaults to VETCLINIC_ASGI_READ_THREADS',
+        )
+        parser.add_argument('--animals', type=int, default=50)
+        parser.add_argument(
+            '--keep', action='store_true',
+            help="Keep the seeded data instead of deleting it",
+        )
+
+    def handle(self, *args, **options):
+        # the handlers run requests on other threads, which can't see an
+        # uncommitted transaction, so this one commits and cleans up after
+        try:
+            self.run(**options)
+        finally:
+            if not options['keep']:
+                models.Animal.objects.filter(
+                    client__name__startswith='Benchmark client').delete()
+                models.Client.objects.filter(
+                    name__startswith='Benchmark client').delete()
+                benchmarking.benchmark_user().delete()
+
+    def run(self, connections, requests, workers, animals, **options):
+        benchmarking.seed_animals(animals)
+        token = benchmarking.benchmark_user().auth_token.key
+        if workers is None:
+            workers = settings.VETCLINIC_ASGI_READ_THREADS
+        # only reads are sent, so the write threads sit idle and both sides
+        # serve the same number of requests at once
+        asgi = ASGIHandler(WSGIHandler(), read_threads=workers)
+        wsgi = WSGIHandler()
+        for clients in connections:
+            per_client = max(requests // clients, 1)
+            self.report(
+                f'asgi x{workers}, {clients} connections',
+                *self.drive_asgi(asgi, token, clients, per_client),
+            )
+            self.report(
+                f'wsgi x{workers}, {clients} connections',
+                *self.drive_wsgi(wsgi, token, clients, per_client, workers),
+            )
+        asgi.read_executor.shutdown()
+        asgi.write_executor.shutdown()
+
+    def report(self, label, timings, elapsed):
+        ordered = sorted(timings)
+        self.stdout.write(
+            f'{label:<32} {len(ordered) / elapsed:8.1f} req/s  '
+            f'p50 {percentile(ordered, 0.50) * 1000:8.2f}ms  '
+            f'p99 {percentile(ordered, 0.99) * 1000:8.2f}ms'
+        )
+
+    def drive_asgi(self, handler, token, clients, per_client):
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': URL, 'query_string': b'',
+            'headers': [(b'authorization', f'Token {token}'.encode())],
+        }
+        timings = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                assert message['status'] == 200, message['status']
+
+        async def client():
+            for _ in range(per_client):
+                start = time.perf_counter()
+                await handler(scope, receive, send)
+                timings.append(time.perf_counter() - start)
+
+        async def main():
+            await asyncio.gather(*(client() for _ in range(clients)))
+
+        loop = asyncio.new_event_loop()
+        try:
+            start = time.perf_counter()
+            loop.run_until_complete(main())
+            return timings, time.perf_counter() - start
+        finally:
+            loop.close()
+
+    def drive_wsgi(self, handler, token, clients, per_client, workers):
+        # a connection waits for one of ``workers`` sync workers, as it
+        # would behind gunicorn
+        free_workers = threading.BoundedSemaphore(workers)
+        timings = []
+
+        def start_response(status, headers, exc_info=None):
+            assert status.startswith('200'), status
+
+        def client():
+            for _ in range(per_client):
+                start = time.perf_counter()
+                with free_workers:
+                    result = handler(wsgi_environ(token), start_response)
+                    b''.join(result)
+                    result.close()
+                timings.append(time.perf_counter() - start)
+
+        with ThreadPoolExecutor(clients) as executor:
+            start = time.perf_counter()
+            for future in [executor.submit(client) for _ in range(clients)]:
+                future.result()
+            return timings, time.perf_counter() - start
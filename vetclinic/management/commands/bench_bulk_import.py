@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from vetclinic import benchmarking
+from vetclinic import models
+from vetclinic.serializers import AnimalWriteSerializer
+from vetclinic.views import AnimalViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        'Time importing animals with one bulk POST versus one POST per '
+        'animal'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=50000)
+        parser.add_argument(
+            '--sample', type=int, default=500,
+            help='Animals to create one at a time; the total is extrapolated',
+        )
+
+    def handle(self, *args, **options):
+        with benchmarking.rolled_back():
+            self.run(**options)
+
+    def run(self, count, sample, **options):
+        benchmarking.seed_animals(100)
+        breed = models.Breed.objects.get(name='Benchmark mutt')
+        client_ids = list(models.Client.objects.values_list('id', flat=True))
+        payload = [
+            {
+                'name': f'Import {i}',
+                'client': client_ids[i % len(client_ids)],
+                'species': breed.species_id,
+                'breed': breed.id,
+                'approx_year_of_birth': 2012,
+            }
+            for i in range(count)
+        ]
+        user = benchmarking.benchmark_user()
+        view = AnimalViewSet.as_view({'post': 'create'})
+        factory = APIRequestFactory()
+
+        def bulk_post():
+            request = factory.post('/animals/', payload, format='json')
+            force_authenticate(request, user)
+            response = view(request)
+            assert response.status_code == 201, response.data
+
+        with CaptureQueriesContext(connection) as queries:
+            timings = benchmarking.time_it(bulk_post, repeat=1)
+        self.stdout.write(benchmarking.format_timings(
+            f'bulk POST of {count}', timings))
+        self.stdout.write(
+            f'    {len(queries)} queries, '
+            f'{count / (timings["median"] / 1000):,.0f} animals/sec'
+        )
+
+        # The single-item API can't write relations, so time the
+        # per-animal path through the same write serializer instead.
+        def single_posts():
+            for item in payload[:sample]:
+                serializer = AnimalWriteSerializer(data=item)
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            timings = benchmarking.time_it(single_posts, repeat=1)
+        per_animal = timings['median'] / sample
+        self.stdout.write(benchmarking.format_timings(
+            f'one at a time, {sample} animals', timings))
+        self.stdout.write(
+            f'    {len(queries) / sample:.1f} queries/animal, '
+            f'~{per_animal * count / 1000:,.1f}s extrapolated to {count}'
+        )
@@ -0,0 +1,55 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vetclinic.benchsuite import percentile
+
+# what a gunicorn worker does as it boots, then what it measured
+WORKER = (
+    'import json, drfdemo.wsgi; from drfdemo import readiness; '
+    'print(json.dumps({"ready": readiness.is_ready(), "cold_start": readiness.cold_start()}))'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Start fresh processes the way a WSGI worker starts and report how '
+        'long each startup step takes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=10)
+        parser.add_argument(
+            '--no-warm-up', action='store_true',
+            help='Skip warming up, to see what it costs',
+        )
+
+    def handle(self, *args, runs, no_warm_up, **options):
+        environment = dict(os.environ)
+        if no_warm_up:
+            environment['STARTUP_WARM_UP'] = 'no'
+        steps = {}
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, '-c', WORKER], stdout=subprocess.PIPE, env=environment,
+                universal_newlines=True,
+            )
+            elapsed = time.perf_counter() - start
+            if result.returncode:
+                raise CommandError(f'The worker exited with {result.returncode}')
+            measured = json.loads(result.stdout.splitlines()[-1])
+            if not measured['ready']:
+                raise CommandError("The worker wasn't ready; its log says why")
+            for step, seconds in dict(measured['cold_start'], process=elapsed).items():
+                steps.setdefault(step, []).append(seconds)
+        for step, timings in steps.items():
+            ordered = sorted(timings)
+            self.stdout.write(
+                f'{step:<12} p50 {percentile(ordered, 0.50) * 1000:8.1f}ms  '
+                f'max {ordered[-1] * 1000:8.1f}ms'
+            )
@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from vetclinic import benchmarking
+from vetclinic import compact
+from vetclinic import models
+from vetclinic import serializers
+from vetclinic.views import AnimalViewSet, ClientViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare rows/sec rendering animal and client pages through the '
+        'serializers and through the compact values() path'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--page-sizes', type=int, nargs='+', default=[10, 100, 1000],
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--keep', action='store_true',
+            help="Keep the seeded data instead of rolling it back",
+        )
+
+    def handle(self, *args, **options):
+        with benchmarking.rolled_back(options['keep']):
+            self.run(**options)
+
+    def run(self, page_sizes, repeat, **options):
+        seed = max(max(page_sizes) - models.Animal.objects.count(), 0)
+        if seed:
+            self.stdout.write(f'Seeding {seed} animals...')
+            benchmarking.seed_animals(seed)
+        # give every species a few technicians so the many-to-many counts
+        technicians = [
+            get_user_model().objects.get_or_create(
+                username=f'benchmark-tech-{i}')[0]
+            for i in range(3)
+        ]
+        for species in models.Species.objects.all():
+            species.technicians.add(*technicians)
+
+        renderer = JSONRenderer()
+        endpoints = [
+            (
+                'animals', serializers.AnimalDetailSerializer,
+                AnimalViewSet.queryset.order_by('id'),
+            ),
+            (
+                'clients', serializers.ClientSerializer,
+                ClientViewSet.queryset.order_by('id'),
+            ),
+        ]
+        for name, serializer_class, queryset in endpoints:
+            plan = compact.plan_for(serializer_class)
+            for page_size in page_sizes:
+                page = queryset[:page_size]
+                rows = page.count()
+
+                def regular():
+                    renderer.render(serializer_class(page, many=True).data)
+
+                def compact_path():
+                    renderer.render(plan.serialize(list(plan.values(page))))
+
+                for label, func in [('serializer', regular),
+                                    ('compact', compact_path)]:
+                    timings = benchmarking.time_it(func, repeat=repeat)
+                    rate = rows / (timings['median'] / 1000)
+                    self.stdout.write(
+                        benchmarking.format_timings(
+                            f'{name}, {label}, {page_size} rows', timings,
+                        ) + f'  {rate:10.0f} rows/s'
+                    )
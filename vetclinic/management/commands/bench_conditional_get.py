@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from vetclinic import benchmarking
+from vetclinic import models
+from vetclinic.views import AnimalViewSet, ClientViewSet, SpeciesViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare a full detail GET with a conditional GET answered by 304 '
+        'Not Modified'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument(
+            '--technicians', type=int, default=20,
+            help='Technicians on the species, which every animal nests',
+        )
+        parser.add_argument(
+            '--keep', action='store_true',
+            help="Keep the seeded data instead of rolling it back",
+        )
+
+    def handle(self, *args, **options):
+        with benchmarking.rolled_back(options['keep']):
+            self.run(**options)
+
+    def run(self, repeat, technicians, **options):
+        benchmarking.seed_animals(1)
+        animal = models.Animal.objects.filter(
+            client__name__startswith='Benchmark client',
+        ).latest('id')
+        for user in benchmarking.seed_users(technicians):
+            animal.species.technicians.add(user)
+        user = benchmarking.benchmark_user()
+        factory = APIRequestFactory()
+
+        endpoints = [
+            ('animal', AnimalViewSet, animal.pk),
+            ('client', ClientViewSet, animal.client_id),
+            ('species', SpeciesViewSet, animal.species_id),
+        ]
+        for name, viewset, pk in endpoints:
+            view = viewset.as_view({'get': 'retrieve'})
+
+            def call(status, **headers):
+                request = factory.get('/', **headers)
+                force_authenticate(request, user)
+                response = view(request, pk=pk)
+                assert response.status_code == status, response.status_code
+                if hasattr(response, 'render'):
+                    response.render()
+                return response
+
+            etag = call(200)['ETag']
+            scenarios = [
+                (f'{name}, 200', lambda: call(200)),
+                (
+                    f'{name}, 304',
+                    lambda: call(304, HTTP_IF_NONE_MATCH=etag),
+                ),
+            ]
+            for label, func in scenarios:
+                self.stdout.write(benchmarking.format_timings(
+                    label, benchmarking.time_it(func, repeat=repeat),
+                ))
@@ -0,0 +1,137 @@
+import multiprocessing
+import threading
+import time
+
+import dj_database_url
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import DatabaseError, connection, connections
+
+from drfdemo.postgresql.base import connection_stats, reset_connection_stats
+from vetclinic.benchsuite import percentile
+
+CLIENT_BACKENDS = (
+    "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() "
+    "AND backend_type = 'client backend' AND pid <> pg_backend_pid()"
+)
+
+
+def worker(settings, requests, query_seconds, results):
+    # a gunicorn worker: each "request" checks the connection out, runs one
+    # query and hands the connection back
+    connection.settings_dict.update(settings)
+    reset_connection_stats()
+    timings = []
+    try:
+        for _ in range(requests):
+            start = time.perf_counter()
+            request_started.send(sender=worker)
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_sleep(%s)', [query_seconds])
+            finally:
+                request_finished.send(sender=worker)
+            timings.append(time.perf_counter() - start)
+        connection.close()
+    except DatabaseError as e:
+        # the parent is waiting to hear from every worker
+        results.put(e)
+    else:
+        results.put((timings, connection_stats()))
+
+
+class Command(BaseCommand):
+    help = (
+        'Count Postgres connections and time requests as sync workers grow, '
+        'with persistent connections, one connection per request, and '
+        'through pgbouncer'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, nargs='+', default=[4, 16, 64],
+            help='Worker processes to try',
+        )
+        parser.add_argument('--requests', type=int, default=50, help='Requests per worker')
+        parser.add_argument(
+            '--query-ms', type=float, default=5,
+            help='How long each request spends in its query',
+        )
+        parser.add_argument(
+            '--pgbouncer-url',
+            help='Database URL of a pgbouncer in front of the same database, to compare',
+        )
+
+    def handle(self, *args, workers, requests, query_ms, pgbouncer_url, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Connection pooling is measured against Postgres')
+        modes = [
+            ('persistent', {'CONN_MAX_AGE': 600}),
+            ('per request', {'CONN_MAX_AGE': 0}),
+        ]
+        if pgbouncer_url:
+            through_pgbouncer = dj_database_url.parse(pgbouncer_url)
+            settings = {
+                key: through_pgbouncer[key] for key in ('NAME', 'USER', 'PASSWORD', 'HOST', 'PORT')
+            }
+            settings.update(CONN_MAX_AGE=600, DISABLE_SERVER_SIDE_CURSORS=True)
+            modes.append(('pgbouncer', settings))
+        for count in workers:
+            for label, settings in modes:
+                self.report(f'{label}, {count} workers', *self.drive(
+                    count, settings, requests, query_ms / 1000))
+
+    def drive(self, count, settings, requests, query_seconds):
+        # forked workers mustn't share the parent's connection
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        processes = [
+            context.Process(target=worker, args=(settings, requests, query_seconds, results))
+            for _ in range(count)
+        ]
+        peak = 0
+        done = threading.Event()
+
+        def watch():
+            # Postgres backends serving this database, whoever opened them
+            nonlocal peak
+            while not done.is_set():
+                with connection.cursor() as cursor:
+                    cursor.execute(CLIENT_BACKENDS)
+                    peak = max(peak, cursor.fetchone()[0])
+                time.sleep(0.01)
+            connection.close()
+
+        watcher = threading.Thread(target=watch)
+        watcher.start()
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        timings, opened = [], 0
+        failures = []
+        for _ in processes:
+            result = results.get()
+            if isinstance(result, DatabaseError):
+                failures.append(result)
+                continue
+            worker_timings, stats = result
+            timings.extend(worker_timings)
+            opened += stats['opened']
+        elapsed = time.perf_counter() - start
+        done.set()
+        watcher.join()
+        for process in processes:
+            process.join()
+        if failures:
+            raise CommandError(f'{len(failures)} of {count} workers failed: {failures[0]}')
+        return timings, elapsed, peak, opened
+
+    def report(self, label, timings, elapsed, peak, opened):
+        ordered = sorted(timings)
+        self.stdout.write(
+            f'{label:<28} {len(ordered) / elapsed:8.1f} req/s  '
+            f'p50 {percentile(ordered, 0.50) * 1000:7.2f}ms  '
+            f'p95 {percentile(ordered, 0.95) * 1000:7.2f}ms  '
+            f'peak connections {peak:4}  opened {opened:5}'
+        )
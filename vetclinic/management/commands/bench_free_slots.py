@@ -0,0 +1,75 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from vetclinic import availability
+from vetclinic import benchmarking
+from vetclinic import models
+
+
+def naive_first_free_slots(start, end, limit):
+    """What API clients do today: fetch every appointment, find the gaps"""
+    length = availability.appointment_length()
+    busy = set(models.Appointment.objects.filter(
+        veterinarian__user__is_active=True,
+    ).values_list('veterinarian_id', 'time'))
+    vet_ids = sorted(models.Veterinarian.objects.filter(
+        user__is_active=True,
+    ).values_list('id', flat=True))
+    slots = []
+    slot = availability.align(start, length)
+    while slot + length <= end and len(slots) < limit:
+        for vet_id in vet_ids:
+            if (vet_id, slot) not in busy and len(slots) < limit:
+                slots.append((slot, vet_id))
+        slot += length
+    return slots
+
+
+class Command(BaseCommand):
+    help = 'Time the free-slot search against a large appointment table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--appointments', type=int, default=1000000)
+        parser.add_argument('--vets', type=int, default=50)
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with benchmarking.rolled_back():
+            self.run(**options)
+
+    def run(self, appointments, vets, limit, repeat, **options):
+        self.stdout.write(f'Seeding {appointments} appointments...')
+        start = benchmarking.seed_appointments(appointments, vets=vets)
+        hours = appointments // vets
+        # Leave one vet with a free afternoon in the middle of the schedule
+        middle = start + datetime.timedelta(hours=hours // 2)
+        models.Appointment.objects.filter(
+            veterinarian__user__username='benchmark-vet-7',
+            time__range=(middle, middle + datetime.timedelta(hours=4)),
+        ).delete()
+        window = datetime.timedelta(days=7)
+
+        for label, window_start in [
+                ('start of schedule', start),
+                ('middle of schedule', middle - datetime.timedelta(days=1)),
+                ('after the schedule', start + datetime.timedelta(hours=hours)),
+        ]:
+            def search():
+                return availability.first_free_slots(
+                    window_start, window_start + window, limit)
+
+            found = len(search())
+            self.stdout.write(benchmarking.format_timings(
+                f'indexed, {label} ({found} slots)',
+                benchmarking.time_it(search, repeat=repeat),
+            ))
+
+        def naive():
+            return naive_first_free_slots(middle, middle + window, limit)
+
+        self.stdout.write(benchmarking.format_timings(
+            'fetch everything and scan, middle',
+            benchmarking.time_it(naive, repeat=1),
+        ))
@@ -0,0 +1,90 @@
+from django.core.management.base import BaseCommand
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from vetclinic import benchmarking
+from vetclinic import models
+from vetclinic.pagination import AnimalPagination
+from vetclinic.views import AnimalViewSet
+
+
+class PageNumberBaseline(PageNumberPagination):
+    page_size_query_param = 'page_size'
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare page-number and keyset pagination latency on /animals at '
+        'the first page and a deep page'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page', type=int, default=10000)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--seed', type=int, default=None,
+            help='Number of animals to insert (default: enough to reach '
+                 '--page)',
+        )
+        parser.add_argument(
+            '--keep', action='store_true',
+            help="Keep the seeded data instead of rolling it back",
+        )
+
+    def handle(self, *args, **options):
+        with benchmarking.rolled_back(options['keep']):
+            self.run(**options)
+
+    def run(self, page, page_size, repeat, seed, **options):
+        needed = page * page_size
+        if seed is None:
+            seed = max(needed - models.Animal.objects.count(), 0)
+        if seed:
+            self.stdout.write(f'Seeding {seed} animals...')
+            benchmarking.seed_animals(seed)
+        user = benchmarking.benchmark_user()
+        factory = APIRequestFactory()
+
+        page_number_view = AnimalViewSet.as_view(
+            {'get': 'list'}, pagination_class=PageNumberBaseline,
+            # same ordering as the keyset view so the comparison is fair
+            queryset=AnimalViewSet.queryset.order_by(
+                *AnimalPagination.ordering),
+        )
+        keyset_view = AnimalViewSet.as_view({'get': 'list'})
+
+        def call(view, **params):
+            request = factory.get('/animals/', dict(
+                params, page_size=page_size,
+            ))
+            force_authenticate(request, user)
+            response = view(request)
+            assert response.status_code == 200, response.data
+            response.render()
+
+        # Build the keyset cursor for the deep page up front; the position is
+        # simply the last row of the page before it.
+        paginator = AnimalPagination()
+        position = list(
+            models.Animal.objects.order_by(*paginator.ordering)
+            .values_list(*paginator.ordering)[(page - 1) * page_size - 1]
+        )
+        deep_cursor = paginator.sign_cursor((False, position))
+
+        scenarios = [
+            ('page number, page 1', lambda: call(page_number_view)),
+            (
+                f'page number, page {page}',
+                lambda: call(page_number_view, page=page),
+            ),
+            ('keyset, page 1', lambda: call(keyset_view)),
+            (
+                f'keyset, page {page}',
+                lambda: call(keyset_view, cursor=deep_cursor),
+            ),
+        ]
+        for label, func in scenarios:
+            self.stdout.write(benchmarking.format_timings(
+                label, benchmarking.time_it(func, repeat=repeat),
+            ))
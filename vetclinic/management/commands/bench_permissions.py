@@ -0,0 +1,78 @@
+from contextlib import ExitStack
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from drfdemo.users.models import User
+from vetclinic import benchmarking
+from vetclinic.views import AnimalViewSet
+
+
+def uncached_has_perm(self, perm):
+    # what AnimalViewSet did before RequestPermissionCacheMixin
+    return self.request.user.has_perm(perm)
+
+
+class Command(BaseCommand):
+    help = (
+        'Count permission checks and permission queries per request on '
+        '/animals with and without permission caching'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=10)
+
+    def handle(self, *args, **options):
+        with benchmarking.rolled_back():
+            self.run(**options)
+
+    def run(self, requests, seed, **options):
+        benchmarking.seed_animals(seed)
+        user_pk = benchmarking.benchmark_user().pk
+        factory = APIRequestFactory()
+        view = AnimalViewSet.as_view({'get': 'list'})
+        real_has_perm = User.has_perm
+        checks = []
+
+        def counting_has_perm(user, perm, obj=None):
+            checks.append(perm)
+            return real_has_perm(user, perm, obj)
+
+        def call():
+            request = factory.get('/animals/')
+            # each request authenticates its own user instance
+            force_authenticate(request, User.objects.get(pk=user_pk))
+            view(request).render()
+
+        modes = [
+            ('before', {'PERMISSION_CACHE_TIMEOUT': 0}, uncached_has_perm),
+            ('per-request cache', {'PERMISSION_CACHE_TIMEOUT': 0}, None),
+            ('per-request + shared cache', {'PERMISSION_CACHE_TIMEOUT': 300},
+             None),
+        ]
+        for label, settings, has_perm in modes:
+            with ExitStack() as stack:
+                stack.enter_context(override_settings(**settings))
+                stack.enter_context(
+                    mock.patch.object(User, 'has_perm', counting_has_perm))
+                if has_perm is not None:
+                    stack.enter_context(
+                        mock.patch.object(AnimalViewSet, 'has_perm', has_perm))
+                call()  # warm the shared cache, if any
+                del checks[:]
+                with CaptureQueriesContext(connection) as queries:
+                    timings = benchmarking.time_it(call, repeat=requests)
+            permission_queries = [
+                query for query in queries
+                if 'auth_permission' in query['sql']
+            ]
+            self.stdout.write(benchmarking.format_timings(label, timings))
+            self.stdout.write(
+                f'    has_perm() calls/request: {len(checks) / requests:.1f}'
+                f'  permission queries/request: '
+                f'{len(permission_queries) / requests:.1f}'
+            )
@@ -0,0 +1,100 @@
+import itertools
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from vetclinic import benchmarking
+from vetclinic import models
+from vetclinic.views import AnimalViewSet
+
+SYLLABLES = [
+    'ba', 'bel', 'cha', 'da', 'fi', 'go', 'ka', 'la', 'lu', 'ma', 'max',
+    'mi', 'na', 'o', 'pe', 'rex', 'ro', 'sa', 'spo', 'ti', 'to', 'zy',
+]
+
+TRIGRAM_INDEXES = ['vetclinic_animal_name_trgm', 'vetclinic_animal_name_upper_trgm']
+
+
+def random_names(seed=0):
+    """Endless, reproducible stream of made-up pet names"""
+    rng = random.Random(seed)
+    while True:
+        name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        yield name.capitalize()
+
+
+class Command(BaseCommand):
+    help = (
+        'Time /animals name filters and ?search= with and without the '
+        'trigram indexes (Postgres; elsewhere only the first pass runs)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=100000,
+            help='Number of animals to insert; use 5000000 for the full run',
+        )
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument(
+            '--keep', action='store_true',
+            help="Keep the seeded data instead of rolling it back",
+        )
+
+    def handle(self, *args, **options):
+        with benchmarking.rolled_back(options['keep']):
+            self.run(**options)
+
+    def run(self, seed, page_size, repeat, **options):
+        if seed:
+            self.stdout.write(f'Seeding {seed} animals...')
+            benchmarking.seed_animals(
+                seed, batch_size=5000 if connection.vendor == 'postgresql' else 500,
+                names=itertools.islice(random_names(), seed),
+            )
+        postgres = connection.vendor == 'postgresql'
+        if postgres:
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE vetclinic_animal')
+        user = benchmarking.benchmark_user()
+        factory = APIRequestFactory()
+        view = AnimalViewSet.as_view({'get': 'list'})
+
+        def call(**params):
+            request = factory.get('/animals/', dict(params, page_size=page_size))
+            force_authenticate(request, user)
+            response = view(request)
+            assert response.status_code == 200, response.data
+            response.render()
+
+        scenarios = [
+            ('name__icontains=uma', {'name__icontains': 'uma'}),
+            ('name__iendswith=rex', {'name__iendswith': 'rex'}),
+            ('name__contains=Spo', {'name__contains': 'Spo'}),
+            ('name__iregex=^lu.*max', {'name__iregex': '^lu.*max'}),
+            ('search=lumax', {'search': 'lumax'}),
+        ]
+        passes = [('indexed' if postgres else connection.vendor, [])]
+        if postgres:
+            # dropped inside the benchmark transaction, so they come back
+            passes.append(('no index', [
+                f'DROP INDEX {name}' for name in TRIGRAM_INDEXES
+            ]))
+        for label, statements in passes:
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+            for name, params in scenarios:
+                self.stdout.write(benchmarking.format_timings(
+                    f'{label}, {name}',
+                    benchmarking.time_it(lambda: call(**params), repeat=repeat),
+                ))
+        if not postgres:
+            self.stdout.write(
+                'Not on Postgres: no trigram indexes, so there is nothing to '
+                'compare against.'
+            )
+        count = models.Animal.objects.count()
+        self.stdout.write(f'{count} animals in the table')
@@ -0,0 +1,83 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vetclinic import benchmarking
+from vetclinic import benchsuite
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a clinic through the test factories and time every vetclinic '
+        'endpoint: p50/p95/p99 latency, throughput and queries per request'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', type=float, default=1,
+            help='Multiplier for the seeded row counts (1 is '
+                 f'{benchsuite.DEFAULT_SCALE["animals"]} animals)',
+        )
+        parser.add_argument(
+            '--harness', choices=sorted(benchsuite.HARNESSES),
+            default='inprocess',
+        )
+        parser.add_argument('--requests', type=int, default=100)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--only', nargs='*', default=None,
+            help='Only run scenarios whose names start with one of these',
+        )
+        parser.add_argument('--random-seed', type=int, default=0)
+        parser.add_argument(
+            '--output', help='Write the results to this JSON file',
+        )
+        parser.add_argument(
+            '--compare', help='Results JSON from an earlier run to diff against',
+        )
+        parser.add_argument(
+            '--keep', action='store_true',
+            help="Keep the seeded data instead of rolling it back",
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as baseline_file:
+                    baseline = json.load(baseline_file)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'Cannot read {options["compare"]}: {exc}')
+        with benchmarking.rolled_back(options['keep']):
+            self.run(baseline=baseline, **options)
+
+    def run(self, scale, harness, requests, warmup, only, random_seed, output,
+            baseline, **options):
+        self.stdout.write(f'Seeding at scale {scale}...')
+        counts = benchsuite.seed(scale, random_seed=random_seed)
+        self.stdout.write(
+            ', '.join(f'{count} {name}' for name, count in counts.items()))
+        summaries = benchsuite.run_suite(
+            benchsuite.HARNESSES[harness](), requests=requests,
+            warmup=warmup, only=only, progress=self.report,
+        )
+        results = benchsuite.results(summaries, harness, counts, requests)
+        if output:
+            with open(output, 'w') as output_file:
+                json.dump(results, output_file, indent=2, sort_keys=True)
+            self.stdout.write(f'Results written to {output}')
+        if baseline is not None:
+            self.stdout.write(f'\nAgainst {baseline.get("commit") or "baseline"}:')
+            for name, metric, old, new, change in benchsuite.compare(baseline, results):
+                ratio = f'{change:6.2f}x' if change is not None else '     -'
+                self.stdout.write(
+                    f'{name:<34} {metric:<20} {old:>10} -> {new:>10}  {ratio}')
+
+    def report(self, name, summary):
+        self.stdout.write(
+            f'{name:<34} p50 {summary["p50_ms"]:8.2f}ms  '
+            f'p95 {summary["p95_ms"]:8.2f}ms  p99 {summary["p99_ms"]:8.2f}ms  '
+            f'{summary["throughput_rps"] or 0:7.1f} req/s  '
+            f'{summary["queries_per_request"]:6.2f} queries  '
+            f'status {",".join(map(str, summary["statuses"]))}'
+        )
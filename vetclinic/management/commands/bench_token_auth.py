@@ -0,0 +1,70 @@
+import itertools
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from drfdemo.users import caches
+from drfdemo.users.authentication import CachedTokenAuthentication
+from vetclinic import benchmarking
+
+
+class Command(BaseCommand):
+    help = (
+        'Time token authentication with and without the token cache, and '
+        'count the queries each request makes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument(
+            '--users', type=int, default=100,
+            help='Distinct tokens the requests are spread over',
+        )
+
+    def handle(self, *args, **options):
+        with benchmarking.rolled_back():
+            self.run(**options)
+
+    def run(self, requests, users, **options):
+        tokens = Token.objects.bulk_create(
+            Token(user=user, key=Token().generate_key())
+            for user in benchmarking.seed_users(users, prefix='token-bench')
+        )
+        factory = APIRequestFactory()
+        modes = [
+            ('TokenAuthentication', TokenAuthentication, {}),
+            ('cached, shared cache only', CachedTokenAuthentication,
+             {'TOKEN_CACHE_LOCAL_SIZE': 0, 'TOKEN_CACHE_TIMEOUT': 300}),
+            ('cached, local LRU + shared cache', CachedTokenAuthentication,
+             {'TOKEN_CACHE_LOCAL_SIZE': 1000, 'TOKEN_CACHE_TIMEOUT': 300}),
+        ]
+        for label, authentication_class, settings in modes:
+            cache.clear()
+            caches.local_tokens.clear()
+            caches.reset_token_cache_stats()
+            authentication = authentication_class()
+            # round robin over the users, as a busy API would see them
+            keys = itertools.cycle(token.key for token in tokens)
+
+            def call():
+                request = factory.get('/', HTTP_AUTHORIZATION=f'Token {next(keys)}')
+                authentication.authenticate(request)
+
+            with override_settings(**settings):
+                with CaptureQueriesContext(connection) as queries:
+                    timings = benchmarking.time_it(call, repeat=requests)
+            self.stdout.write(benchmarking.format_timings(label, timings))
+            line = f'    queries/request: {len(queries) / requests:.3f}'
+            if authentication_class is CachedTokenAuthentication:
+                stats = caches.token_cache_stats()
+                line = (
+                    f'{line}  local hits {stats["local_hits"]}  shared hits '
+                    f'{stats["shared_hits"]}  misses {stats["misses"]}  hit rate '
+                    f'{stats["hit_rate"]:.1%}'
+                )
+            self.stdout.write(line)
@@ -0,0 +1,48 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vetclinic import summaries
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare every AnimalSummary with the data it copies, and optionally '
+        'rebuild the ones that are missing or out of date'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Rebuild the summaries that are wrong',
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, fix=False, chunk_size=1000, **options):
+        wrong = []
+        missing = 0
+        fields = Counter()
+        for animal_id, differing in summaries.inconsistencies(chunk_size):
+            wrong.append(animal_id)
+            if differing is None:
+                missing += 1
+            else:
+                fields.update(differing)
+            if options['verbosity'] > 1:
+                problem = 'missing' if differing is None else ', '.join(differing)
+                self.stdout.write(f'animal {animal_id}: {problem}')
+        report = (
+            f'{len(wrong)} summaries wrong: {missing} missing, '
+            f'{len(wrong) - missing} out of date'
+        )
+        if fields:
+            counts = ', '.join(f'{field} {count}' for field, count in sorted(fields.items()))
+            report = f'{report} ({counts})'
+        self.stdout.write(report)
+        if not wrong:
+            return
+        if not fix:
+            raise CommandError('Summaries are inconsistent; run with --fix to rebuild them')
+        for start in range(0, len(wrong), chunk_size):
+            summaries.refresh(wrong[start:start + chunk_size])
+        self.stdout.write(f'rebuilt {len(wrong)} summaries')
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from drfdemo import schema
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate the OpenAPI schema /docs serves, or check that the stored '
+        'one is up to date'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Fail if the stored schema doesn't match the code, without writing it",
+        )
+
+    def handle(self, *args, check, **options):
+        path = settings.VETCLINIC_OPENAPI_SCHEMA
+        content = schema.generate_schema()
+        if check:
+            try:
+                with open(path, 'rb') as schema_file:
+                    stored = schema_file.read()
+            except FileNotFoundError:
+                stored = None
+            if stored != content:
+                raise CommandError(f'{path} is out of date; run manage.py generate_schema')
+            self.stdout.write(f'{path} is up to date ({schema.content_hash(content)})')
+            return
+        with open(path, 'wb') as schema_file:
+            schema_file.write(content)
+        self.stdout.write(f'Wrote {path} ({schema.content_hash(content)})')
@@ -0,0 +1,82 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vetclinic import importing
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a clinic's clients, animals and appointments from CSV or "
+        'NDJSON files, resuming where a previous run left off'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source', required=True,
+            help='Name of the system the ids come from, e.g. the clinic',
+        )
+        for kind in ('clients', 'animals', 'appointments'):
+            parser.add_argument(f'--{kind}', metavar='PATH')
+        parser.add_argument(
+            '--format', choices=importing.FORMATS, dest='file_format',
+            help='Format of every file (default: from the extension)',
+        )
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument(
+            '--rejects', metavar='PATH',
+            help='Append rejected rows and their errors here, as NDJSON',
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Start every file from the top, ignoring checkpoints',
+        )
+        parser.add_argument(
+            '--no-copy', action='store_false', dest='use_copy', default=None,
+            help='Write through the ORM even on Postgres',
+        )
+
+    def handle(self, *args, source, file_format=None, batch_size=10000,
+               rejects=None, restart=False, use_copy=None, **options):
+        paths = [
+            (importer, options[importer.kind]) for importer in importing.IMPORTERS
+            if options[importer.kind]
+        ]
+        if not paths:
+            raise CommandError('Give at least one of --clients, --animals and --appointments')
+        self.verbosity = options['verbosity']
+        lookups = importing.Lookups(source)
+        rejected = open(rejects, 'a', encoding='utf-8') if rejects else None
+        try:
+            # in order: animals refer to clients, appointments to animals
+            for importer, path in paths:
+                self.import_file(
+                    importer(lookups, use_copy=use_copy), path, rejected,
+                    file_format=file_format, batch_size=batch_size,
+                    restart=restart,
+                )
+        except (importing.ImportFailed, OSError) as exc:
+            raise CommandError(str(exc))
+        finally:
+            if rejected is not None:
+                rejected.close()
+
+    def import_file(self, importer, path, rejected, **kwargs):
+        def on_batch(progress, rows):
+            self.stdout.write(str(progress))
+            if rejected is not None:
+                for row in rows:
+                    rejected.write(json.dumps({
+                        'kind': importer.kind, 'row': row.number,
+                        'errors': row.errors, 'data': row.data,
+                    }) + '\n')
+                rejected.flush()
+            elif self.verbosity > 1:
+                for row in rows:
+                    self.stderr.write(f'{importer.kind} row {row.number}: {row.errors}')
+
+        progress = importing.import_file(importer, path, on_batch=on_batch, **kwargs)
+        if progress is None:
+            self.stdout.write(f'{importer.kind}: {path} already imported')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{progress}  done'))
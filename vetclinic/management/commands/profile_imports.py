@@ -0,0 +1,93 @@
+import json
+import os
+import subprocess
+import sys
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+# boot a worker, serve one request, and say what that took
+WORKER = '''
+import io, json, resource, sys, time
+start = time.perf_counter()
+import drfdemo.wsgi
+imported = time.perf_counter()
+statuses = []
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[1], 'QUERY_STRING': '',
+    'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+    'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+}
+b''.join(drfdemo.wsgi.application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+print(json.dumps({
+    'import': imported - start,
+    'first_request': time.perf_counter() - imported,
+    'status': statuses[0],
+    'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+'''
+
+
+def parse_importtime(stderr):
+    """(module, self seconds, cumulative seconds) from ``-X importtime``"""
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, module = line[len('import time:'):].split('|')
+        yield module.strip(), int(own) / 1e6, int(cumulative) / 1e6
+
+
+class Command(BaseCommand):
+    help = (
+        'Boot drfdemo.wsgi in a fresh process for each configuration and '
+        'report import time per module, time to the first request and '
+        'memory use'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--configurations', nargs='+',
+            default=[os.environ.get('DJANGO_CONFIGURATION', 'Production')],
+            help='e.g. Production ApiWorker',
+        )
+        parser.add_argument(
+            '--by', choices=('package', 'module'), default='package',
+            help='Add up import time per top-level package, or list modules by '
+                 'cumulative time',
+        )
+        parser.add_argument('--limit', type=int, default=15)
+        parser.add_argument(
+            '--path', default='/api/v1/vetclinic/species/',
+            help='What the first request asks for',
+        )
+
+    def handle(self, *args, configurations, by, limit, path, **options):
+        for configuration in configurations:
+            result = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', WORKER, path],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+                env=dict(os.environ, DJANGO_CONFIGURATION=configuration),
+            )
+            if result.returncode:
+                raise CommandError(f'{configuration} failed to start:\n{result.stderr[-2000:]}')
+            measured = json.loads(result.stdout.splitlines()[-1])
+            modules = list(parse_importtime(result.stderr))
+            self.stdout.write(
+                f'{configuration}: {len(modules)} modules, drfdemo.wsgi '
+                f'{measured["import"] * 1000:.0f}ms, first request '
+                f'{measured["first_request"] * 1000:.0f}ms ({measured["status"]}), '
+                f'max RSS {measured["rss_kb"] / 1024:.1f}MB'
+            )
+            if by == 'package':
+                # self times add up without counting anything twice
+                totals = Counter()
+                for module, own, cumulative in modules:
+                    totals[module.split('.')[0]] += own
+                rows = totals.most_common(limit)
+            else:
+                rows = sorted(
+                    ((module, cumulative) for module, own, cumulative in modules),
+                    key=lambda row: row[1], reverse=True,
+                )[:limit]
+            for name, seconds in rows:
+                self.stdout.write(f'    {name:<48} {seconds * 1000:8.1f}ms')
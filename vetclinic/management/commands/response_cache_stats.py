@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from vetclinic import caches
+
+
+class Command(BaseCommand):
+    help = 'Show hits and misses for the species and breed response cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Zero the counters after showing them',
+        )
+
+    def handle(self, *args, reset=False, **options):
+        if not settings.SHARED_CACHE:
+            # the counters live in the cache, so this process's are all
+            # there is to see
+            self.stderr.write(self.style.WARNING(
+                'The cache is private to each process, so this only counts '
+                'requests this command served; set DJANGO_CACHE_BACKEND to '
+                'a shared cache'
+            ))
+        stats = caches.response_cache_stats()
+        total = stats['hits'] + stats['misses']
+        hit_rate = stats['hits'] / total if total else 0
+        self.stdout.write(
+            f'hits {stats["hits"]}  misses {stats["misses"]}  '
+            f'hit rate {hit_rate:.1%}'
+        )
+        if reset:
+            caches.reset_response_cache_stats()
@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from drfdemo import readiness
+
+
+class Command(BaseCommand):
+    help = (
+        'Wait for the database, backing off with jitter, and check that every '
+        'migration is applied; exits non-zero if either fails'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--timeout', type=float, default=settings.STARTUP_TIMEOUT,
+            help='Seconds to wait for the database',
+        )
+        parser.add_argument(
+            '--database-only', action='store_true',
+            help="Don't check migrations, e.g. before running migrate",
+        )
+
+    def handle(self, *args, timeout, database_only, **options):
+        start = time.perf_counter()
+        if database_only:
+            if not readiness.wait_for_database(timeout):
+                raise CommandError(f'Database not reachable within {timeout}s')
+        else:
+            timings = {}
+            # warming up this process would be wasted on the next one
+            problems = readiness.prepare(timeout, warm_up=False, timings=timings)
+            if problems:
+                raise CommandError('Not ready: ' + '; '.join(problems))
+        self.stdout.write(f'Ready in {time.perf_counter() - start:.2f}s')
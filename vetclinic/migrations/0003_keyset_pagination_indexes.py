@@ -0,0 +1,21 @@
+# Generated by Django 2.0.13 on 2026-10-18 10:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vetclinic', '0002_auto_20180911_0214'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='animal',
+            index=models.Index(fields=['name', 'id'], name='vetclinic_animal_name_id'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['name', 'id'], name='vetclinic_client_name_id'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.0.13 on 2026-10-18 10:11
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vetclinic', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='animal',
+            options={'permissions': (('see_animal_appointments_with_animal', 'Can see upcoming appointments with an animal'),)},
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.0.13 on 2026-10-18 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vetclinic', '0004_animal_appointments_permission'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['veterinarian', 'time'], name='vetclinic_appt_vet_time'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.0.13 on 2026-10-18 10:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vetclinic', '0005_appointment_vet_time_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='animal',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='breed',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='species',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
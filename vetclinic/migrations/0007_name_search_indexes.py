@@ -0,0 +1,46 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+TABLES = ['vetclinic_animal', 'vetclinic_breed', 'vetclinic_species']
+
+
+def create_indexes(apps, schema_editor):
+    # Django 2.0's GinIndex can't take an operator class, and the
+    # case-insensitive lookups compare UPPER(name), so these are by hand.
+    # Both kinds serve LIKE/ILIKE and regex matching through pg_trgm.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in TABLES:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {table}_name_trgm '
+            f'ON {table} USING gin (name gin_trgm_ops)'
+        )
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {table}_name_upper_trgm '
+            f'ON {table} USING gin (UPPER(name) gin_trgm_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in TABLES:
+        schema_editor.execute(
+            f'DROP INDEX CONCURRENTLY IF EXISTS {table}_name_trgm')
+        schema_editor.execute(
+            f'DROP INDEX CONCURRENTLY IF EXISTS {table}_name_upper_trgm')
+
+
+class Migration(migrations.Migration):
+    # CONCURRENTLY keeps the animal table writable while its indexes build,
+    # but can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('vetclinic', '0006_updated_at'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
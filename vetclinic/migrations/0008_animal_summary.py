@@ -0,0 +1,25 @@
+# Generated by Django 2.0.13 on 2026-10-18 11:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vetclinic', '0007_name_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnimalSummary',
+            fields=[
+                ('animal', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='vetclinic.Animal')),
+                ('client_name', models.CharField(max_length=100)),
+                ('species_name', models.CharField(max_length=50)),
+                ('breed_name', models.CharField(max_length=50)),
+                ('next_appointment', models.DateTimeField(null=True)),
+                ('appointment_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
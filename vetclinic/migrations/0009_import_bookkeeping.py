@@ -0,0 +1,43 @@
+# Generated by Django 2.0.13 on 2026-10-18 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vetclinic', '0008_animal_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=100)),
+                ('kind', models.CharField(max_length=20)),
+                ('fingerprint', models.CharField(max_length=100)),
+                ('rows_done', models.PositiveIntegerField(default=0)),
+                ('finished', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ImportedRecord',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=100)),
+                ('kind', models.CharField(max_length=20)),
+                ('external_id', models.CharField(max_length=100)),
+                ('object_id', models.IntegerField()),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='importedrecord',
+            unique_together={('source', 'kind', 'external_id')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='importcheckpoint',
+            unique_together={('source', 'kind')},
+        ),
+    ]
@@ -1,6 +1,13 @@
 from django.db import models
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete,
+)
+from django.dispatch import receiver
+from django.utils.timezone import now
 
 from drfdemo.users.models import User
+
+from .caches import invalidate_response_cache
 # NOTE: In a real-world setup, these models would be split into multiple apps
 # based on need/usage. In trying to keep this small, I'm restricting myself
 # to one app
@@ -19,11 +26,22 @@ class Client(models.Model):
     zip = models.CharField(max_length=10)
     phone = models.CharField(max_length=50)
     email = models.EmailField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # keyset pagination seeks on (name, id)
+            models.Index(
+                fields=['name', 'id'], name='vetclinic_client_name_id',
+            ),
+        ]
 
 
 class Species(models.Model):
     technicians = models.ManyToManyField(User)
     name = models.CharField(max_length=50, unique=True)
+    # also bumped when technicians are added, removed or edited
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -32,6 +50,7 @@ class Species(models.Model):
 class Breed(models.Model):
     name = models.CharField(max_length=50)
     species = models.ForeignKey(Species, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -54,10 +73,25 @@ class Animal(models.Model):
     breed = models.ForeignKey(Breed, blank=True, on_delete=models.DO_NOTHING)
     approx_year_of_birth = models.PositiveSmallIntegerField()
     first_visit_date = models.DateField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
+    class Meta:
+        indexes = [
+            # keyset pagination seeks on (name, id)
+            models.Index(
+                fields=['name', 'id'], name='vetclinic_animal_name_id',
+            ),
+        ]
+        permissions = (
+            (
+                'see_animal_appointments_with_animal',
+                'Can see upcoming appointments with an animal',
+            ),
+        )
+
 
 class Appointment(models.Model):
     time = models.DateTimeField()
@@ -73,3 +107,105 @@ class Appointment(models.Model):
             ('time', 'veterinarian'),
             ('time', 'animal'),
         )
+        indexes = [
+            # the unique index above leads with time, which can't answer
+            # "this vet's appointments in this window" as a range scan
+            models.Index(
+                fields=['veterinarian', 'time'], name='vetclinic_appt_vet_time',
+            ),
+        ]
+
+
+class AnimalSummary(models.Model):
+    """What the animal list shows of an animal's relations, denormalized
+
+    One row per animal, kept up to date by :mod:`vetclinic.summaries`;
+    don't write to it directly.
+    """
+    animal = models.OneToOneField(
+        Animal, primary_key=True, on_delete=models.CASCADE,
+        related_name='summary',
+    )
+    client_name = models.CharField(max_length=100)
+    species_name = models.CharField(max_length=50)
+    breed_name = models.CharField(max_length=50)
+    # the first appointment after the summary was refreshed, so it goes
+    # stale as the clock passes it
+    next_appointment = models.DateTimeField(null=True)
+    appointment_count = models.PositiveIntegerField(default=0)
+
+
+class ImportedRecord(models.Model):
+    """Which row an ID from another system was imported as
+
+    ``import_clinic_data`` looks rows up here to update rather than
+    duplicate them when a file is imported again, and to resolve references
+    between files (an animal's client, an appointment's animal).
+    """
+    # the system the IDs come from, e.g. the clinic being onboarded
+    source = models.CharField(max_length=100)
+    kind = models.CharField(max_length=20)
+    external_id = models.CharField(max_length=100)
+    object_id = models.IntegerField()
+
+    class Meta:
+        unique_together = (('source', 'kind', 'external_id'), )
+
+
+class ImportCheckpoint(models.Model):
+    """How far ``import_clinic_data`` got through a file"""
+    source = models.CharField(max_length=100)
+    kind = models.CharField(max_length=20)
+    # size and a hash of the start of the file, to notice a different file
+    fingerprint = models.CharField(max_length=100)
+    rows_done = models.PositiveIntegerField(default=0)
+    finished = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = (('source', 'kind'), )
+
+
+def touch_species(queryset):
+    """Mark ``queryset``'s species as changed without a full save()"""
+    queryset.update(updated_at=now())
+
+
+@receiver(post_save, sender=Species)
+@receiver(post_delete, sender=Species)
+@receiver(post_save, sender=Breed)
+@receiver(post_delete, sender=Breed)
+@receiver(post_delete, sender=User)
+@receiver(m2m_changed, sender=Species.technicians.through)
+def invalidate_reference_data(sender, action=None, **kwargs):
+    if action is None or action.startswith('post_'):
+        invalidate_response_cache()
+
+
+@receiver(m2m_changed, sender=Species.technicians.through)
+def touch_species_technicians(sender, instance=None, action=None,
+                              reverse=False, pk_set=None, **kwargs):
+    # keep Species.updated_at honest for conditional GETs
+    if not reverse:
+        if action.startswith('post_'):
+            touch_species(Species.objects.filter(pk=instance.pk))
+    elif action in ('post_add', 'post_remove'):
+        touch_species(Species.objects.filter(pk__in=pk_set))
+    elif action == 'pre_clear':
+        # afterwards there's no telling which species they were on
+        touch_species(Species.objects.filter(technicians=instance))
+
+
+@receiver(pre_delete, sender=User)
+def touch_technician_species(sender, instance=None, **kwargs):
+    touch_species(Species.objects.filter(technicians=instance))
+
+
+@receiver(post_save, sender=User)
+def invalidate_technician(sender, instance=None, update_fields=None,
+                          **kwargs):
+    # Technicians are nested in species responses. Logging in only touches
+    # last_login, which isn't part of them.
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        invalidate_response_cache()
+        touch_species(Species.objects.filter(technicians=instance))
@@ -0,0 +1,189 @@
+"""Keyset pagination for the vet clinic endpoints
+
+DRF's PageNumberPagination runs a COUNT(*) and an OFFSET scan for every
+page, so page 10,000 costs as much as reading the first 100,000 rows.
+Keyset (a.k.a. "seek") pagination instead remembers the ordering values of
+the last row it handed out and asks the database for rows *after* that
+position, which an index on the ordering columns can answer directly no
+matter how deep into the table we are.
+"""
+
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CursorSerializer(signing.JSONSerializer):
+    """JSON serializer for cursor positions
+
+    Positions can hold dates and datetimes (e.g. ordering by appointment
+    time), which the stock signing serializer can't encode. Decoded values
+    come back as ISO strings, which the ORM happily accepts in lookups.
+    """
+
+    def dumps(self, obj):
+        return DjangoJSONEncoder(separators=(',', ':')).encode(obj).encode(
+            'latin-1')
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor pagination that seeks on every column in ``ordering``
+
+    Unlike DRF's CursorPagination (which seeks on the first column and then
+    falls back to an OFFSET for ties), the cursor holds the full tuple of
+    ordering values so the last column can be the primary key. That makes
+    every position unique and every page a single index range scan.
+
+    Cursors are signed with ``SECRET_KEY`` so clients can't hand-craft
+    positions; they're opaque tokens as far as the API is concerned.
+    """
+    # The ordering *must* end in a unique column (usually 'id'). Subclasses
+    # should have a matching index in the database.
+    ordering = ('id', )
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_salt = 'vetclinic.pagination.KeysetPagination'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, position = False, None
+        else:
+            reverse, position = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if position is not None:
+            queryset = queryset.filter(
+                self.get_keyset_filter(position, reverse))
+
+        # Fetch one extra row so we know whether there's another page
+        # without having to COUNT the rest of the table.
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following_page = len(results) > len(self.page)
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = position is not None
+            self.has_previous = has_following_page
+        else:
+            self.has_next = has_following_page
+            self.has_previous = position is not None
+
+        # The browsable API needs this to render the pagination controls
+        if request.accepted_renderer.format == 'html':
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        # Like CursorPagination, let a filter backend (ranked search, say)
+        # decide the order, but only when it has an opinion.
+        for backend in getattr(view, 'filter_backends', ()):
+            if hasattr(backend, 'get_ordering'):
+                ordering = backend().get_ordering(request, queryset, view)
+                if ordering:
+                    return tuple(ordering)
+        ordering = self.ordering
+        if isinstance(ordering, str):
+            return (ordering, )
+        return tuple(ordering)
+
+    def get_keyset_filter(self, position, reverse=False):
+        """Build the "rows after ``position``" condition
+
+        For an ordering of ``(a, b, c)`` this is the expanded form of the
+        row-value comparison ``(a, b, c) > (x, y, z)``:
+
+            a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+
+        which every database we support can turn into an index range scan.
+        """
+        if len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        keyset_filter = Q()
+        equal_so_far = Q()
+        for field, value in zip(self.ordering, position):
+            descending = field.startswith('-')
+            name = field.lstrip('-')
+            lookup = 'lt' if descending != reverse else 'gt'
+            keyset_filter |= equal_so_far & Q(**{f'{name}__{lookup}': value})
+            equal_so_far &= Q(**{name: value})
+        return keyset_filter
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # we walked backwards off the start of the results; the next
+            # page is the first one.
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        position = self._get_position_from_instance(
+            self.page[-1], self.ordering)
+        return self.encode_cursor((False, position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            position = self.cursor[1]
+            return self.encode_cursor((True, position))
+        position = self._get_position_from_instance(
+            self.page[0], self.ordering)
+        return self.encode_cursor((True, position))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            reverse, position = signing.loads(
+                encoded, salt=self.cursor_salt, serializer=CursorSerializer,
+            )
+        except (signing.BadSignature, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return bool(reverse), position
+
+    def sign_cursor(self, cursor):
+        """Turn a ``(reverse, position)`` pair into an opaque token"""
+        return signing.dumps(
+            list(cursor), salt=self.cursor_salt, serializer=CursorSerializer,
+            compress=True,
+        )
+
+    def encode_cursor(self, cursor):
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self.sign_cursor(cursor))
+
+    def _get_position_from_instance(self, instance, ordering):
+        position = []
+        for field in ordering:
+            name = field.lstrip('-')
+            if isinstance(instance, dict):
+                position.append(instance[name])
+            else:
+                position.append(getattr(instance, name))
+        return position
+
+
+class AnimalPagination(KeysetPagination):
+    # backed by the vetclinic_animal_name_id index
+    ordering = ('name', 'id')
+
+
+class ClientPagination(KeysetPagination):
+    # backed by the vetclinic_client_name_id index
+    ordering = ('name', 'id')
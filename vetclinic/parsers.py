@@ -0,0 +1,31 @@
+"""JSON parsing through orjson when it's installed
+
+The counterpart to :mod:`vetclinic.renderers`. orjson only reads UTF-8 and
+already rejects NaN and infinity, as ``STRICT_JSON`` asks; other encodings
+and non-strict parsing go to DRF's parser. So does anything orjson can't
+parse, which either works (e.g. integers wider than 64 bits) or fails with
+the same error message clients have always seen.
+"""
+
+import io
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+from .renderers import FastJSONRenderer, orjson
+
+
+class FastJSONParser(JSONParser):
+    """Drop-in replacement for ``JSONParser`` that decodes with orjson"""
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or not self.strict or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except ValueError:
+            # orjson.JSONDecodeError
+            return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -0,0 +1,204 @@
+"""Cost guardrails for filter query strings
+
+AnimalFilter -> BreedFilter -> SpeciesFilter lets a query string join its
+way across tables with whatever operators it likes, including ``in`` lists
+of any length. Before anything is filtered, :func:`plan_filters` walks the
+requested parameters through the FilterSets and scores them with a few
+static rules:
+
+* every RelatedFilter hop is a join; more than VETCLINIC_FILTER_MAX_DEPTH
+  of them is refused
+* ``in`` lists longer than VETCLINIC_FILTER_MAX_IN_SIZE are refused
+* each parameter costs its operator's weight (plus a little per ``in``
+  value), doubled for every join in front of it
+
+Plans costing more than VETCLINIC_FILTER_MAX_COST are refused, and those
+over VETCLINIC_FILTER_THROTTLE_COST count against a per-user rate. On
+Postgres the filtered query can also be run through EXPLAIN and refused
+when the planner's estimate tops VETCLINIC_FILTER_MAX_PLANNER_COST.
+
+Every decision is logged to ``vetclinic.planning`` as a line of key=value
+pairs for the metrics pipeline to pick up.
+"""
+
+import logging
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.exceptions import Throttled, ValidationError
+from rest_framework.settings import api_settings
+from rest_framework.throttling import UserRateThrottle
+from rest_framework_filters.backends import DjangoFilterBackend
+
+logger = logging.getLogger(__name__)
+
+ACCEPTED = 'accepted'
+THROTTLED = 'throttled'
+REJECTED = 'rejected'
+
+OPERATOR_COSTS = {
+    'exact': 1, 'iexact': 2, 'isnull': 1, 'in': 1,
+    'lt': 1, 'lte': 1, 'gt': 1, 'gte': 1,
+    'startswith': 2, 'istartswith': 2,
+    # these lean on the trigram indexes, which aren't cheap to search
+    'contains': 5, 'icontains': 5, 'endswith': 5, 'iendswith': 5,
+    'regex': 10, 'iregex': 10,
+}
+DEFAULT_OPERATOR_COST = 5
+IN_VALUE_COST = 0.01
+
+
+class FilterPlan:
+    """What a set of filter parameters will cost, and what to do about it"""
+
+    def __init__(self):
+        self.filters = 0
+        self.depth = 0
+        self.largest_in = 0
+        self.rewrites = 0
+        self.cost = 0.0
+        self.planner_cost = None
+        self.errors = {}
+        self.decision = ACCEPTED
+
+    @property
+    def expensive(self):
+        return self.cost > settings.VETCLINIC_FILTER_THROTTLE_COST
+
+    def reject(self, param, message):
+        self.errors.setdefault(param, []).append(message)
+        self.decision = REJECTED
+
+    def log_fields(self):
+        return {
+            'decision': self.decision,
+            'filters': self.filters,
+            'depth': self.depth,
+            'largest_in': self.largest_in,
+            'rewrites': self.rewrites,
+            'cost': round(self.cost, 2),
+            'planner_cost': self.planner_cost,
+        }
+
+
+def resolve_param(filterset_class, param, depth=0):
+    """``(joins, filter)`` for a query parameter, or ``(depth, None)``"""
+    name = param[:-1] if param.endswith('!') else param
+    if name in filterset_class.base_filters:
+        return depth, filterset_class.base_filters[name]
+    related_name, related_param = filterset_class.get_related_filter_param(
+        param)
+    if related_name is None:
+        return depth, None
+    related_filter = filterset_class.base_filters[related_name]
+    return resolve_param(related_filter.filterset, related_param, depth + 1)
+
+
+def plan_filters(filterset_class, params, vendor=None):
+    """Score the filter parameters in ``params`` against the static rules"""
+    plan = FilterPlan()
+    max_depth = settings.VETCLINIC_FILTER_MAX_DEPTH
+    max_in = settings.VETCLINIC_FILTER_MAX_IN_SIZE
+    for param in params:
+        depth, filter_ = resolve_param(filterset_class, param)
+        if filter_ is None:
+            continue
+        plan.filters += 1
+        plan.depth = max(plan.depth, depth)
+        if depth > max_depth:
+            plan.reject(
+                param, f'Filters can follow at most {max_depth} relations.')
+        lookup = filter_.lookup_expr
+        cost = OPERATOR_COSTS.get(lookup, DEFAULT_OPERATOR_COST)
+        if lookup == 'in':
+            size = len([value for value in params[param].split(',') if value])
+            plan.largest_in = max(plan.largest_in, size)
+            if size > max_in:
+                plan.reject(param, f'Use at most {max_in} values with "in".')
+            rewrite = size >= settings.VETCLINIC_FILTER_IN_REWRITE_SIZE
+            if rewrite and vendor == 'postgresql':
+                plan.rewrites += 1
+            cost += size * IN_VALUE_COST
+        plan.cost += cost * 2 ** depth
+    if plan.cost > settings.VETCLINIC_FILTER_MAX_COST:
+        plan.reject(
+            api_settings.NON_FIELD_ERRORS_KEY,
+            f'These filters are too expensive to run together (cost '
+            f'{plan.cost:.0f}, limit {settings.VETCLINIC_FILTER_MAX_COST}). '
+            f'Use fewer of them, fewer relations or fewer pattern matches.',
+        )
+    return plan
+
+
+def explain_cost(queryset):
+    """Postgres' estimated total cost for ``queryset``"""
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        return cursor.fetchone()[0][0]['Plan']['Total Cost']
+
+
+def log_plan(plan, view):
+    fields = dict(view=type(view).__name__, **plan.log_fields())
+    logger.info(
+        'filter_plan %s',
+        ' '.join(f'{key}={value}' for key, value in fields.items()),
+        extra={'filter_plan': fields},
+    )
+
+
+class ExpensiveFilterThrottle(UserRateThrottle):
+    """Per-user rate for requests whose filters cost more than usual"""
+    scope = 'expensive_filters'
+
+    def get_rate(self):
+        return settings.VETCLINIC_EXPENSIVE_FILTER_RATE
+
+
+class PlannedFilterBackend(DjangoFilterBackend):
+    """DjangoFilterBackend that plans the filters before running them"""
+
+    throttle_class = ExpensiveFilterThrottle
+
+    def filter_queryset(self, request, queryset, view):
+        filter_class = self.get_filter_class(view, queryset)
+        if filter_class is None:
+            return queryset
+        vendor = connections[queryset.db].vendor
+        plan = plan_filters(filter_class, request.query_params, vendor)
+        if not plan.filters:
+            return super().filter_queryset(request, queryset, view)
+        try:
+            if plan.errors:
+                raise ValidationError(plan.errors)
+            if plan.expensive:
+                throttle = self.throttle_class()
+                if not throttle.allow_request(request, view):
+                    plan.decision = THROTTLED
+                    raise Throttled(
+                        throttle.wait(),
+                        detail='Too many expensive filter requests.',
+                    )
+            queryset = super().filter_queryset(request, queryset, view)
+            self.check_planner_cost(plan, queryset)
+        except ValidationError:
+            # including ones the filters raise themselves (RegexFilter)
+            plan.decision = REJECTED
+            raise
+        finally:
+            log_plan(plan, view)
+        return queryset
+
+    def check_planner_cost(self, plan, queryset):
+        limit = settings.VETCLINIC_FILTER_MAX_PLANNER_COST
+        if limit is None or connections[queryset.db].vendor != 'postgresql':
+            return
+        # unpaginated, so this overestimates what a page will cost
+        plan.planner_cost = explain_cost(queryset)
+        if plan.planner_cost > limit:
+            plan.reject(
+                api_settings.NON_FIELD_ERRORS_KEY,
+                f'These filters are too expensive to run (estimated cost '
+                f'{plan.planner_cost:.0f}, limit {limit}).',
+            )
+            raise ValidationError(plan.errors)
@@ -0,0 +1,569 @@
+"""Per-request SQL and serialization profiling
+
+ProfilingMiddleware follows a sample of requests (VETCLINIC_PROFILING_
+SAMPLE_RATE) and records, labelled by view and action:
+
+* how many queries ran and how long they took
+* how many of them repeated a statement already run for the request, which
+  is what an N+1 looks like from the outside
+* time spent in ``serializer.data`` (for views using
+  :class:`ProfiledSerializerMixin`; this includes any queries the
+  serializer runs itself)
+* time spent rendering, and the size of what was rendered
+
+The numbers go into histograms that MetricsView serves in the Prometheus
+text format. Workers share a port, so a scrape could land on any of them:
+each worker adds what it has recorded to running totals in the shared cache
+(at most every VETCLINIC_METRICS_FLUSH_INTERVAL seconds, when it next
+profiles a request), and /metrics shows those totals, so every worker
+answers with the same numbers. Streaming responses are only measured up to
+the point the view returns.
+"""
+
+import bisect
+import contextlib
+import hashlib
+import logging
+import random
+import threading
+import time
+from collections import Counter as TallyCounter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from drfdemo.postgresql.base import connection_stats
+from drfdemo.users.caches import token_cache_stats
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+MICROSECONDS = 1000000
+BYTES_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+LABELS = ('view', 'action')
+# every (metric name, labels) any process has added to the shared totals
+SERIES_KEY = 'vetclinic:metrics:series'
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per set of label values
+
+    :meth:`get` is what this process recorded; :meth:`take_pending` is what
+    it recorded since last asked, for adding to the shared totals. Those are
+    whole numbers, so sums are shared in units of ``1 / scale``.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets, labelnames=LABELS, scale=1):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self.labelnames = labelnames
+        self.scale = scale
+        self._lock = threading.Lock()
+        self._series = {}
+        self._pending = {}
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {
+                    'buckets': [0] * len(self.buckets), 'sum': 0, 'count': 0,
+                }
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+            # shared per bucket rather than cumulatively, so an observation
+            # only adds to one of them
+            pending = self._pending.setdefault(labels, TallyCounter())
+            pending[bisect.bisect_left(self.buckets, value)] += 1
+            pending['sum'] += value
+            pending['count'] += 1
+
+    def get(self, labels):
+        """``{'buckets': [...], 'sum': ..., 'count': ...}`` or ``None``"""
+        with self._lock:
+            series = self._series.get(labels)
+            return None if series is None else {
+                'buckets': list(series['buckets']),
+                'sum': series['sum'], 'count': series['count'],
+            }
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._pending.clear()
+
+    def take_pending(self):
+        """``{labels: {component: amount}}`` recorded since the last call"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def components(self):
+        return list(range(len(self.buckets))) + ['sum', 'count']
+
+    def shared_key(self, labels, component):
+        digest = hashlib.md5(repr(labels).encode()).hexdigest()
+        return f'vetclinic:metrics:{self.name}:{digest}:{component}'
+
+    def from_shared(self, totals):
+        """What :meth:`get` returns, from the shared ``{component: total}``"""
+        buckets, running = [], 0
+        for index in range(len(self.buckets)):
+            running += totals.get(index, 0)
+            buckets.append(running)
+        total = totals.get('sum', 0)
+        return {
+            'buckets': buckets,
+            'sum': total / self.scale if self.scale != 1 else total,
+            'count': totals.get('count', 0),
+        }
+
+    def samples(self, series=None):
+        """Text format samples for ``{labels: values}``, or this process's"""
+        if series is None:
+            with self._lock:
+                series = dict(self._series)
+        for labels, values in sorted(series.items()):
+            for bound, count in zip(self.buckets, values['buckets']):
+                yield '_bucket', self.labelnames + ('le', ), labels + (
+                    _format_number(bound), ), count
+            yield '_sum', self.labelnames, labels, values['sum']
+            yield '_count', self.labelnames, labels, values['count']
+
+
+class Counter(Histogram):
+    """A running total per set of label values"""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=LABELS):
+        super().__init__(name, documentation, (), labelnames)
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+            self._pending.setdefault(labels, TallyCounter())['total'] += amount
+
+    def get(self, labels):
+        with self._lock:
+            return self._series.get(labels, 0)
+
+    def components(self):
+        return ['total']
+
+    def from_shared(self, totals):
+        return totals.get('total', 0)
+
+    def samples(self, series=None):
+        if series is None:
+            with self._lock:
+                series = dict(self._series)
+        for labels, value in sorted(series.items()):
+            yield '_total', self.labelnames, labels, value
+
+
+class CollectedCounter(Counter):
+    """A :class:`Counter` read from running totals kept somewhere else
+
+    ``collect()`` returns this process's ``{labels: total so far}``; what's
+    new since the last look is picked up when the metrics are flushed.
+    """
+
+    def __init__(self, name, documentation, labelnames, collect):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+        self._seen = {}
+
+    def take_pending(self):
+        totals = self.collect()
+        with self._lock:
+            for labels, total in totals.items():
+                seen = self._seen.get(labels, 0)
+                # less than last time means they were reset
+                amount = total - seen if total >= seen else total
+                self._seen[labels] = total
+                if amount:
+                    self._series[labels] = self._series.get(labels, 0) + amount
+                    self._pending.setdefault(labels, TallyCounter())['total'] += amount
+        return super().take_pending()
+
+    def reset(self):
+        super().reset()
+        with self._lock:
+            self._seen.clear()
+
+
+def _connection_events():
+    stats = connection_stats()
+    return {
+        (event, ): stats[event]
+        for event in ('opened', 'reused', 'health_check_failures', 'closed')
+    }
+
+
+def _token_lookups():
+    stats = token_cache_stats()
+    return {
+        (result, ): stats[stat]
+        for result, stat in [
+            ('local_hit', 'local_hits'), ('shared_hit', 'shared_hits'), ('miss', 'misses'),
+        ]
+    }
+
+
+REQUEST_SECONDS = Histogram(
+    'vetclinic_request_seconds', 'Time from middleware to rendered response',
+    SECONDS_BUCKETS, scale=MICROSECONDS,
+)
+QUERIES = Histogram(
+    'vetclinic_request_queries', 'SQL statements run per request',
+    QUERY_BUCKETS,
+)
+DB_SECONDS = Histogram(
+    'vetclinic_request_db_seconds', 'Time spent in SQL per request',
+    SECONDS_BUCKETS, scale=MICROSECONDS,
+)
+DUPLICATE_QUERIES = Histogram(
+    'vetclinic_request_duplicate_queries',
+    'Statements per request that repeat one already run for it',
+    QUERY_BUCKETS,
+)
+SERIALIZER_SECONDS = Histogram(
+    'vetclinic_request_serializer_seconds',
+    'Time spent in serializer.data per request, including its queries',
+    SECONDS_BUCKETS, scale=MICROSECONDS,
+)
+RENDER_SECONDS = Histogram(
+    'vetclinic_request_render_seconds', 'Time spent rendering per request',
+    SECONDS_BUCKETS, scale=MICROSECONDS,
+)
+RESPONSE_BYTES = Histogram(
+    'vetclinic_response_bytes', 'Size of the rendered response body',
+    BYTES_BUCKETS,
+)
+N_PLUS_ONE = Counter(
+    'vetclinic_n_plus_one',
+    'Requests that ran one statement at least '
+    'VETCLINIC_PROFILING_DUPLICATE_THRESHOLD times',
+)
+DB_CONNECTIONS = CollectedCounter(
+    'vetclinic_db_connections',
+    'Postgres connections opened, reused (checked out again), replaced '
+    'after failing a health check, and closed; opened minus closed is how '
+    'many are open',
+    ('event', ), _connection_events,
+)
+TOKEN_LOOKUPS = CollectedCounter(
+    'vetclinic_token_cache_lookups',
+    'API token lookups answered by the local cache, the shared cache, or '
+    'neither (the database)',
+    ('result', ), _token_lookups,
+)
+METRICS = (
+    REQUEST_SECONDS, QUERIES, DB_SECONDS, DUPLICATE_QUERIES,
+    SERIALIZER_SECONDS, RENDER_SECONDS, RESPONSE_BYTES, N_PLUS_ONE,
+    DB_CONNECTIONS, TOKEN_LOOKUPS,
+)
+
+
+_registered = set()
+_flushed = {'at': None}
+_flush_lock = threading.Lock()
+
+
+def _add_to_total(key, amount):
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        # the first time (or it was evicted), unless another process has
+        # just started it
+        if not cache.add(key, amount, None):
+            cache.incr(key, amount)
+
+
+def flush_metrics():
+    """Add what this process recorded since the last flush to the totals"""
+    for metric in METRICS:
+        for labels, pending in metric.take_pending().items():
+            _registered.add((metric.name, labels))
+            for component, amount in pending.items():
+                if component == 'sum':
+                    amount = round(amount * metric.scale)
+                if amount:
+                    _add_to_total(metric.shared_key(labels, component), amount)
+    if _registered:
+        known = cache.get(SERIES_KEY) or set()
+        if not _registered <= known:
+            # two processes adding at once can lose each other's series;
+            # each puts its own back next time
+            cache.set(SERIES_KEY, known | _registered, None)
+
+
+def maybe_flush_metrics():
+    """:func:`flush_metrics`, at most every VETCLINIC_METRICS_FLUSH_INTERVAL"""
+    now = time.monotonic()
+    with _flush_lock:
+        flushed = _flushed['at']
+        if flushed is not None and now - flushed < settings.VETCLINIC_METRICS_FLUSH_INTERVAL:
+            return
+        _flushed['at'] = now
+    flush_metrics()
+
+
+def shared_series():
+    """``{metric name: {labels: values}}`` totalled across processes"""
+    keys = {}
+    by_name = {metric.name: metric for metric in METRICS}
+    for name, labels in cache.get(SERIES_KEY) or ():
+        metric = by_name.get(name)
+        if metric is None:
+            continue
+        for component in metric.components():
+            keys[metric.shared_key(labels, component)] = (name, labels, component)
+    totals = defaultdict(dict)
+    for key, value in cache.get_many(list(keys)).items():
+        name, labels, component = keys[key]
+        totals[name, labels][component] = value
+    series = defaultdict(dict)
+    for (name, labels), values in totals.items():
+        series[name][labels] = by_name[name].from_shared(values)
+    return series
+
+
+def render_metrics():
+    """Every process's metrics in the Prometheus text exposition format"""
+    flush_metrics()
+    series = shared_series()
+    lines = []
+    for metric in METRICS:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for suffix, names, labels, value in metric.samples(series[metric.name]):
+            lines.append(
+                f'{metric.name}{suffix}{_format_labels(names, labels)} '
+                f'{_format_number(value)}'
+            )
+    return '\n'.join(lines) + '\n'
+
+
+def reset_metrics():
+    """Forget every metric, in this process and in the shared totals"""
+    by_name = {metric.name: metric for metric in METRICS}
+    cache.delete_many([SERIES_KEY] + [
+        by_name[name].shared_key(labels, component)
+        for name, labels in cache.get(SERIES_KEY) or () if name in by_name
+        for component in by_name[name].components()
+    ])
+    _registered.clear()
+    _flushed['at'] = None
+    for metric in METRICS:
+        metric.reset()
+
+
+class RequestProfile:
+    """What one sampled request did"""
+    attribute_name = '_vetclinic_profile'
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view = 'unresolved'
+        self.action = ''
+        self.queries = []
+        self.serializer_seconds = 0.0
+        self.render_seconds = 0.0
+        self._render_started = None
+
+    @property
+    def labels(self):
+        return (self.view, self.action)
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    def db_seconds(self):
+        return sum(duration for _, duration in self.queries)
+
+    def statement_counts(self):
+        # the SQL still has its placeholders, so the same statement with
+        # different parameters counts as a repeat
+        return TallyCounter(sql for sql, _ in self.queries)
+
+    def duplicates(self):
+        return sum(count - 1 for count in self.statement_counts().values())
+
+    def start_render(self):
+        self._render_started = time.perf_counter()
+
+    def finish_render(self, response):
+        self.render_seconds += time.perf_counter() - self._render_started
+
+    def record(self, response):
+        labels = self.labels
+        REQUEST_SECONDS.observe(labels, time.perf_counter() - self.started)
+        QUERIES.observe(labels, len(self.queries))
+        DB_SECONDS.observe(labels, self.db_seconds())
+        DUPLICATE_QUERIES.observe(labels, self.duplicates())
+        SERIALIZER_SECONDS.observe(labels, self.serializer_seconds)
+        RENDER_SECONDS.observe(labels, self.render_seconds)
+        if not response.streaming:
+            RESPONSE_BYTES.observe(labels, len(response.content))
+        threshold = settings.VETCLINIC_PROFILING_DUPLICATE_THRESHOLD
+        repeated = [
+            (sql, count) for sql, count in self.statement_counts().items()
+            if count >= threshold
+        ]
+        if repeated:
+            N_PLUS_ONE.inc(labels)
+            sql, count = max(repeated, key=lambda item: item[1])
+            logger.warning(
+                'possible N+1 in %s.%s: %d runs of %s',
+                self.view, self.action, count, sql,
+            )
+
+
+def current_profile(request):
+    """The profile for ``request`` (a Django or DRF one), or ``None``"""
+    request = getattr(request, '_request', request)
+    return getattr(request, RequestProfile.attribute_name, None)
+
+
+class ProfilingMiddleware:
+    """Profile a sample of requests into the histograms above"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.VETCLINIC_PROFILING_SAMPLE_RATE
+        if not rate or random.random() >= rate:
+            return self.get_response(request)
+        profile = RequestProfile()
+        setattr(request, RequestProfile.attribute_name, profile)
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(profile.execute_wrapper))
+            response = self.get_response(request)
+        if profile.view is not None:
+            profile.record(response)
+            maybe_flush_metrics()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = current_profile(request)
+        if profile is None:
+            return None
+        view_class = getattr(view_func, 'cls', None)
+        if getattr(view_class, 'profiling_exempt', False):
+            profile.view = None
+        elif view_class is not None:
+            profile.view = view_class.__name__
+            # viewsets map methods to actions; plain APIViews use the method
+            actions = getattr(view_func, 'actions', None) or {}
+            method = request.method.lower()
+            profile.action = actions.get(method, method)
+        else:
+            profile.view = request.resolver_match.view_name
+            profile.action = request.method.lower()
+        return None
+
+    def process_template_response(self, request, response):
+        # DRF's Response is a template response, rendered right after this
+        profile = current_profile(request)
+        if profile is not None:
+            profile.start_render()
+            response.add_post_render_callback(profile.finish_render)
+        return response
+
+
+def _timed_data(self):
+    started = time.perf_counter()
+    try:
+        return super(type(self), self).data
+    finally:
+        self._profile.serializer_seconds += time.perf_counter() - started
+
+
+_timed_classes = {}
+
+
+def timed_serializer_class(serializer_class):
+    """A subclass of ``serializer_class`` that times its ``data``"""
+    timed = _timed_classes.get(serializer_class)
+    if timed is None:
+        timed = _timed_classes[serializer_class] = type(
+            serializer_class.__name__, (serializer_class, ),
+            {'data': property(_timed_data), '__module__': __name__},
+        )
+    return timed
+
+
+class ProfiledSerializerMixin:
+    """Time ``serializer.data`` for the serializers a view creates"""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        profile = current_profile(self.request)
+        if profile is not None:
+            serializer.__class__ = timed_serializer_class(type(serializer))
+            serializer._profile = profile
+        return serializer
+
+
+class PrometheusRenderer(BaseRenderer):
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode(self.charset)
+        # errors (403 and so on) come through as dicts
+        return '\n'.join(f'# {key}: {value}' for key, value in data.items())
+
+
+class MetricsView(APIView):
+    """Profiling histograms for every process, for Prometheus to scrape"""
+    permission_classes = (IsAdminUser, )
+    renderer_classes = (PrometheusRenderer, )
+    profiling_exempt = True
+
+    def get(self, request):
+        return Response(
+            render_metrics(),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
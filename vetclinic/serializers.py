@@ -1,12 +1,19 @@
 """Serializers for the vet clinic app"""
 
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.timezone import now
 from rest_framework import serializers
 
 from drfdemo.users.serializers import UserSerializer
 from drfdemo.users.models import User
 
+from . import bulk
 from . import models
 from . import fields
+from . import summaries
 
 
 class ClientSerializer(serializers.ModelSerializer):
@@ -171,7 +178,7 @@ class BreedSerializerWithWritablePK(serializers.ModelSerializer):
     """Breed with option 3: write a PK, read a nested object"""
     species = fields.SpeciesField(
         queryset=models.Species.objects.all(),
-        write_only=True, required=True, allow_null=False,
+        required=True, allow_null=False,
     )
 
     class Meta:
@@ -179,17 +186,102 @@ class BreedSerializerWithWritablePK(serializers.ModelSerializer):
         model = models.Breed
 
 
-class AnimalListSerializer(serializers.ListSerializer):
+class BulkListSerializer(serializers.ListSerializer):
+    """List serializer that validates relations for every item at once
+
+    Give the child BulkPrimaryKeyRelatedFields and the IDs in the whole
+    payload get resolved up front, one query per relation, so validating
+    each item doesn't have to go to the database at all.
+    """
+
+    def preload(self, data):
+        if not isinstance(data, list):
+            return
+        items = [item for item in data if isinstance(item, dict)]
+        for name, field in self.child.fields.items():
+            if isinstance(field, fields.BulkPrimaryKeyRelatedField):
+                field.preload(item[name] for item in items if name in item)
+
+    def to_internal_value(self, data):
+        self.preload(data)
+        return super().to_internal_value(data)
+
+
+class AnimalListSerializer(BulkListSerializer):
     client = serializers.StringRelatedField()
     species = serializers.StringRelatedField()
 
-    # NOTE: To make this writable (so you can POST multiple animals at once,
-    # define .create() here)
+    # Writes only work with a child whose relations are
+    # BulkPrimaryKeyRelatedFields (see AnimalWriteSerializer).
 
     class Meta:
         model = models.Animal
         exclude = ['breed']
 
+    def to_internal_value(self, data):
+        validated_data = super().to_internal_value(data)
+        if self.instance is not None:
+            self.check_existing(validated_data)
+        return validated_data
+
+    def check_existing(self, validated_data):
+        """For bulk updates, make sure each item names an existing animal"""
+        ids = [item.get('id') for item in validated_data]
+        self._existing = self.instance.in_bulk(
+            [pk for pk in ids if pk is not None])
+        errors = []
+        for pk in ids:
+            if pk is None:
+                errors.append({'id': ['This field is required.']})
+            elif pk not in self._existing:
+                errors.append({'id': [f'Animal {pk} does not exist.']})
+            else:
+                errors.append({})
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+    @property
+    def batch_size(self):
+        return settings.VETCLINIC_BULK_BATCH_SIZE
+
+    def create(self, validated_data):
+        animals = [
+            models.Animal(**{
+                key: value for key, value in item.items() if key != 'id'
+            })
+            for item in validated_data
+        ]
+        with transaction.atomic():
+            bulk.bulk_create(
+                models.Animal.objects.all(), animals,
+                batch_size=self.batch_size,
+            )
+            # bulk_create sends no signals; only Postgres hands back the
+            # keys, and elsewhere the list view fills the gaps
+            summaries.refresh(animal.pk for animal in animals if animal.pk)
+        return animals
+
+    def update(self, instance, validated_data):
+        animals = []
+        # bulk updates skip save(), so auto_now needs doing by hand
+        field_names = {'updated_at'}
+        updated_at = now()
+        for item in validated_data:
+            animal = self._existing[item['id']]
+            for key, value in item.items():
+                if key != 'id':
+                    setattr(animal, key, value)
+                    field_names.add(key)
+            animal.updated_at = updated_at
+            animals.append(animal)
+        with transaction.atomic():
+            bulk.bulk_update(
+                models.Animal.objects.all(), animals, sorted(field_names),
+                batch_size=self.batch_size,
+            )
+            summaries.refresh(animal.pk for animal in animals)
+        return animals
+
 
 class AnimalDetailSerializer(serializers.ModelSerializer):
     # NOTE: I'm just dealing with this to be read-only for brevity
@@ -203,6 +295,26 @@ class AnimalDetailSerializer(serializers.ModelSerializer):
         list_serializer_class = AnimalListSerializer
 
 
+class AnimalWriteSerializer(serializers.ModelSerializer):
+    """Animal with plain PKs for its relations, for bulk writes"""
+    # writable so bulk updates can say which animal each item is
+    id = serializers.IntegerField(required=False)
+    client = fields.BulkPrimaryKeyRelatedField(
+        queryset=models.Client.objects.all(),
+    )
+    species = fields.BulkPrimaryKeyRelatedField(
+        queryset=models.Species.objects.all(),
+    )
+    breed = fields.BulkPrimaryKeyRelatedField(
+        queryset=models.Breed.objects.all(),
+    )
+
+    class Meta:
+        model = models.Animal
+        fields = '__all__'
+        list_serializer_class = AnimalListSerializer
+
+
 class LimitedAppointmentSerializer(serializers.ModelSerializer):
     """Appointment without animal for embedding within animal"""
     veterinarian = serializers.StringRelatedField()
@@ -221,8 +333,85 @@ class AppointmentBookingSerializer(LimitedAppointmentSerializer):
     )
 
 
+class AppointmentBatchBookingSerializer(serializers.ModelSerializer):
+    """One (animal, veterinarian, time) slot in a batch booking"""
+    animal = fields.BulkPrimaryKeyRelatedField(
+        queryset=models.Animal.objects.all(),
+    )
+    veterinarian = fields.BulkPrimaryKeyRelatedField(
+        queryset=models.Veterinarian.objects.filter(user__is_active=True),
+    )
+
+    class Meta:
+        model = models.Appointment
+        fields = '__all__'
+        # The unique_together validators would query once per item; the
+        # booking checks the whole batch for conflicts in one go instead.
+        validators = []
+        list_serializer_class = BulkListSerializer
+
+
 class AnimalWithAppointmentsSerializer(AnimalDetailSerializer):
     """Animal detail serializer with appointments built in"""
     # NOTE: Normally this would be something users might like to have
     # built in to the main detail view, but I'm stretching the example here.
-    appointments = LimitedAppointmentSerializer(read_only=True)
+    appointments = LimitedAppointmentSerializer(many=True, read_only=True)
+
+
+class AnimalSummarySerializer(serializers.ModelSerializer):
+    """Animal list item read from its AnimalSummary (select it)"""
+    client = serializers.CharField(source='summary.client_name', read_only=True)
+    species = serializers.CharField(source='summary.species_name', read_only=True)
+    breed = serializers.CharField(source='summary.breed_name', read_only=True)
+
+    class Meta:
+        model = models.Animal
+        fields = (
+            'id', 'name', 'client', 'species', 'breed',
+            'approx_year_of_birth', 'first_visit_date', 'updated_at',
+        )
+
+
+class AnimalSummaryWithAppointmentsSerializer(AnimalSummarySerializer):
+    """Animal list item with its next appointment and how many it has"""
+    next_appointment = serializers.DateTimeField(
+        source='summary.next_appointment', read_only=True,
+    )
+    appointment_count = serializers.IntegerField(
+        source='summary.appointment_count', read_only=True,
+    )
+
+    class Meta(AnimalSummarySerializer.Meta):
+        fields = AnimalSummarySerializer.Meta.fields + (
+            'next_appointment', 'appointment_count',
+        )
+
+
+class FreeSlotQuerySerializer(serializers.Serializer):
+    """Query parameters for the free-slot search"""
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+    veterinarian = serializers.ListField(
+        child=serializers.IntegerField(), required=False,
+    )
+
+    # Keeps the number of appointments we have to look at bounded
+    max_window = datetime.timedelta(days=31)
+
+    def validate(self, data):
+        if data['end'] <= data['start']:
+            raise serializers.ValidationError({
+                'end': ['Must be after start.'],
+            })
+        if data['end'] - data['start'] > self.max_window:
+            raise serializers.ValidationError({
+                'end': [f'Can search at most {self.max_window.days} days.'],
+            })
+        return data
+
+
+class FreeSlotSerializer(serializers.Serializer):
+    veterinarian = serializers.IntegerField()
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
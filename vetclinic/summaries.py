@@ -0,0 +1,185 @@
+"""Keep :class:`~vetclinic.models.AnimalSummary` in step with its sources
+
+Each animal's summary is rebuilt (:func:`refresh`) when the animal is
+saved, and patched in place when something it copies from changes: client,
+species and breed names with one UPDATE per rename, appointment figures
+with one UPDATE per booking or cancellation. Appointment changes only ever
+update existing rows, so deleting an animal (which deletes its appointments
+first) can't resurrect its summary.
+
+Writes that skip signals -- ``QuerySet.update()``, ``bulk_create()`` on
+backends that don't hand back primary keys, raw SQL -- can leave summaries
+behind. The list view rebuilds any it finds missing or out of date on the
+page it's serving, and ``check_animal_summaries`` finds (and with
+``--fix``, repairs) the rest.
+"""
+
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import Count, IntegerField, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.timezone import now
+
+from . import bulk, models
+
+# two refreshes of the same animal can race to insert its row
+MAX_ATTEMPTS = 3
+# what a summary copies, and so what can go out of date
+FIELDS = (
+    'client_name', 'species_name', 'breed_name', 'next_appointment',
+    'appointment_count',
+)
+
+
+def summarize(animals):
+    """Unsaved, up to date summaries for the ``animals`` queryset"""
+    # always the primary: a lagging replica would overwrite correct
+    # summaries with old names, and they'd look fresh afterwards
+    rows = animals.using(DEFAULT_DB_ALIAS).order_by().values(
+        'id', 'client__name', 'species__name', 'breed__name',
+    ).annotate(
+        appointment_count=Count('appointments'),
+        next_appointment=Min(
+            'appointments__time', filter=Q(appointments__time__gt=now()),
+        ),
+    )
+    return [
+        models.AnimalSummary(
+            animal_id=row['id'],
+            client_name=row['client__name'],
+            species_name=row['species__name'],
+            breed_name=row['breed__name'],
+            next_appointment=row['next_appointment'],
+            appointment_count=row['appointment_count'],
+        )
+        for row in rows
+    ]
+
+
+def inconsistencies(chunk_size=1000):
+    """Yield ``(animal_id, fields)`` for every summary that's wrong
+
+    ``fields`` lists the columns that differ from what :func:`summarize`
+    makes of the animal now, or is ``None`` when there's no summary at all.
+    Animals are checked ``chunk_size`` at a time.
+    """
+    last_pk = 0
+    while True:
+        animal_ids = list(models.Animal.objects.filter(
+            pk__gt=last_pk,
+        ).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not animal_ids:
+            return
+        last_pk = animal_ids[-1]
+        stored = models.AnimalSummary.objects.in_bulk(animal_ids)
+        expected = summarize(models.Animal.objects.filter(pk__in=animal_ids))
+        for summary in sorted(expected, key=lambda summary: summary.animal_id):
+            actual = stored.get(summary.animal_id)
+            if actual is None:
+                yield summary.animal_id, None
+                continue
+            fields = [
+                field for field in FIELDS
+                if getattr(actual, field) != getattr(summary, field)
+            ]
+            if fields:
+                yield summary.animal_id, fields
+
+
+def refresh(animal_ids):
+    """Rebuild the summaries of the animals in ``animal_ids``"""
+    animal_ids = set(animal_ids)
+    if not animal_ids:
+        return
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        summaries = summarize(models.Animal.objects.filter(pk__in=animal_ids))
+        try:
+            with transaction.atomic():
+                models.AnimalSummary.objects.filter(
+                    animal_id__in=animal_ids).delete()
+                bulk.bulk_create(models.AnimalSummary.objects.all(), summaries)
+        except IntegrityError:
+            if attempt == MAX_ATTEMPTS:
+                raise
+            continue
+        return
+
+
+def refresh_appointments(animal_ids):
+    """Recount the appointments of the animals in ``animal_ids``"""
+    appointments = models.Appointment.objects.filter(
+        animal=OuterRef('animal_id'),
+    ).order_by()
+    next_appointment = appointments.filter(
+        time__gt=now(),
+    ).order_by('time').values('time')[:1]
+    appointment_count = appointments.values('animal').annotate(
+        count=Count('*'),
+    ).values('count')
+    models.AnimalSummary.objects.filter(animal_id__in=set(animal_ids)).update(
+        next_appointment=Subquery(next_appointment),
+        appointment_count=Coalesce(
+            Subquery(appointment_count, output_field=IntegerField()), 0,
+        ),
+    )
+
+
+def is_stale(animal, timestamp):
+    """Whether ``animal``'s (selected) summary needs a :func:`refresh`"""
+    try:
+        summary = animal.summary
+    except models.AnimalSummary.DoesNotExist:
+        return True
+    upcoming = summary.next_appointment
+    return upcoming is not None and upcoming <= timestamp
+
+
+def refresh_stale(animals):
+    """Rebuild any missing or stale summaries among ``animals``
+
+    ``animals`` should have been fetched with ``select_related('summary')``;
+    they get their fresh summaries attached.
+    """
+    timestamp = now()
+    stale = {animal.pk: animal for animal in animals if is_stale(animal, timestamp)}
+    if not stale:
+        return
+    refresh(stale)
+    for summary in models.AnimalSummary.objects.filter(animal_id__in=stale):
+        stale[summary.animal_id].summary = summary
+
+
+@receiver(post_save, sender=models.Animal)
+def refresh_animal(sender, instance=None, **kwargs):
+    refresh([instance.pk])
+
+
+@receiver(post_save, sender=models.Client)
+def rename_client(sender, instance=None, created=False, **kwargs):
+    if not created:
+        models.AnimalSummary.objects.filter(
+            animal__client=instance,
+        ).exclude(client_name=instance.name).update(client_name=instance.name)
+
+
+@receiver(post_save, sender=models.Species)
+def rename_species(sender, instance=None, created=False, **kwargs):
+    if not created:
+        models.AnimalSummary.objects.filter(
+            animal__species=instance,
+        ).exclude(species_name=instance.name).update(species_name=instance.name)
+
+
+@receiver(post_save, sender=models.Breed)
+def rename_breed(sender, instance=None, created=False, **kwargs):
+    if not created:
+        models.AnimalSummary.objects.filter(
+            animal__breed=instance,
+        ).exclude(breed_name=instance.name).update(breed_name=instance.name)
+
+
+@receiver(post_save, sender=models.Appointment)
+@receiver(post_delete, sender=models.Appointment)
+def recount_appointments(sender, instance=None, **kwargs):
+    refresh_appointments([instance.animal_id])
@@ -0,0 +1,85 @@
+import datetime
+
+import factory
+from django.contrib.auth.models import Permission
+from django.utils.timezone import now
+
+from drfdemo.users.test.factories import UserFactory
+
+
+def top_of_the_hour(hours_from_now=0):
+    start = now().replace(minute=0, second=0, microsecond=0)
+    return start + datetime.timedelta(hours=hours_from_now)
+
+
+class ClientFactory(factory.django.DjangoModelFactory):
+
+    class Meta:
+        model = 'vetclinic.Client'
+
+    name = factory.Faker('name')
+    address_line_1 = factory.Faker('street_address')
+    city = factory.Faker('city')
+    state = factory.Faker('state_abbr')
+    zip = factory.Faker('zipcode')
+    phone = factory.Faker('numerify', text='###-###-####')
+    email = factory.Faker('email')
+
+
+class SpeciesFactory(factory.django.DjangoModelFactory):
+
+    class Meta:
+        model = 'vetclinic.Species'
+        django_get_or_create = ('name',)
+
+    name = factory.Sequence(lambda n: f'species{n}')
+
+
+class BreedFactory(factory.django.DjangoModelFactory):
+
+    class Meta:
+        model = 'vetclinic.Breed'
+        django_get_or_create = ('name', 'species')
+
+    name = factory.Sequence(lambda n: f'breed{n}')
+    species = factory.SubFactory(SpeciesFactory)
+
+
+class AnimalFactory(factory.django.DjangoModelFactory):
+
+    class Meta:
+        model = 'vetclinic.Animal'
+
+    name = factory.Faker('first_name')
+    client = factory.SubFactory(ClientFactory)
+    breed = factory.SubFactory(BreedFactory)
+    species = factory.SelfAttribute('breed.species')
+    approx_year_of_birth = factory.Faker('random_int', min=2000, max=2018)
+
+
+class VeterinarianFactory(factory.django.DjangoModelFactory):
+
+    class Meta:
+        model = 'vetclinic.Veterinarian'
+
+    user = factory.SubFactory(UserFactory)
+
+
+class AppointmentFactory(factory.django.DjangoModelFactory):
+
+    class Meta:
+        model = 'vetclinic.Appointment'
+
+    time = factory.Sequence(lambda n: top_of_the_hour(hours_from_now=n))
+    animal = factory.SubFactory(AnimalFactory)
+    veterinarian = factory.SubFactory(VeterinarianFactory)
+
+
+class AppointmentViewerFactory(UserFactory):
+    """A user who can see animals' upcoming appointments"""
+
+    @factory.post_generation
+    def permissions(self, create, extracted, **kwargs):
+        if create:
+            self.user_permissions.add(Permission.objects.get(
+                codename='see_animal_appointments_with_animal'))
@@ -0,0 +1,76 @@
+"""Attribute the queries a view runs to the serializer fields behind them
+
+Wrap a test in :func:`track_queries` and every serializer a view builds
+through ``get_serializer()`` has each of its fields instrumented, nested
+ones included. Queries run while a field is fetching or rendering its value
+are charged to its path, e.g. ``AnimalDetailSerializer.breed.species``;
+anything else is charged to :data:`VIEW`.
+"""
+
+import contextlib
+from collections import Counter
+from unittest import mock
+
+from django.db import connections
+from rest_framework import serializers
+from rest_framework.generics import GenericAPIView
+
+VIEW = '<view>'
+
+
+class QueryTracker:
+
+    def __init__(self):
+        self.stack = []
+        self.paths = Counter()
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        self.paths[self.stack[-1] if self.stack else VIEW] += 1
+        return execute(sql, params, many, context)
+
+    def reset(self):
+        self.paths.clear()
+
+    def _wrap(self, method, path):
+        def wrapped(*args, **kwargs):
+            self.stack.append(path)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.stack.pop()
+        return wrapped
+
+    def instrument(self, serializer, path=None):
+        """Charge queries under ``serializer``'s fields to their paths"""
+        if isinstance(serializer, serializers.ListSerializer):
+            self.instrument(serializer.child, path)
+            return
+        if path is None:
+            path = type(serializer).__name__
+        for name, field in serializer.fields.items():
+            field_path = f'{path}.{name}'
+            field.get_attribute = self._wrap(field.get_attribute, field_path)
+            field.to_representation = self._wrap(
+                field.to_representation, field_path)
+            if isinstance(field, serializers.BaseSerializer):
+                self.instrument(field, field_path)
+
+
+@contextlib.contextmanager
+def track_queries():
+    """Yield a :class:`QueryTracker` watching every connection and view"""
+    tracker = QueryTracker()
+    get_serializer = GenericAPIView.get_serializer
+
+    def instrumented_get_serializer(view, *args, **kwargs):
+        serializer = get_serializer(view, *args, **kwargs)
+        tracker.instrument(serializer)
+        return serializer
+
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(mock.patch.object(
+            GenericAPIView, 'get_serializer', instrumented_get_serializer))
+        for connection in connections.all():
+            stack.enter_context(
+                connection.execute_wrapper(tracker.execute_wrapper))
+        yield tracker
@@ -0,0 +1,135 @@
+import asyncio
+import json
+
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import TestCase, TransactionTestCase, override_settings
+from nose.tools import eq_, ok_
+
+from drfdemo.asgi_handler import ASGIHandler, build_environ
+from drfdemo.users.test.factories import UserFactory
+from .factories import AnimalFactory
+from .. import models
+
+ANIMALS = '/api/v1/vetclinic/animals/'
+
+
+def scope(method='GET', path=ANIMALS, query_string=b'', headers=()):
+    return {
+        'type': 'http', 'method': method, 'path': path,
+        'query_string': query_string, 'headers': list(headers),
+        'http_version': '1.1', 'scheme': 'http',
+        'server': ('testserver', 80), 'client': ('10.0.0.1', 5000),
+    }
+
+
+def call(handler, scope, messages):
+    """Run ``handler`` on ``scope``, feeding it ``messages``; return what it sent"""
+    incoming = list(messages)
+    sent = []
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(handler(scope, receive, send))
+    finally:
+        loop.close()
+    return sent
+
+
+class TestEnviron(TestCase):
+    """
+    ASGI scopes map onto the WSGI environ Django expects.
+    """
+
+    def test_environ(self):
+        environ = build_environ(scope(
+            method='POST', path='/api/v1/vetclinic/clients/', query_string=b'a=1',
+            headers=[(b'content-type', b'application/json'),
+                     (b'content-length', b'99'),
+                     (b'accept', b'text/html'), (b'accept', b'*/*')],
+        ), b'{}')
+        eq_(environ['REQUEST_METHOD'], 'POST')
+        eq_(environ['PATH_INFO'], '/api/v1/vetclinic/clients/')
+        eq_(environ['QUERY_STRING'], 'a=1')
+        eq_(environ['CONTENT_TYPE'], 'application/json')
+        # the body we actually read wins over the header
+        eq_(environ['CONTENT_LENGTH'], '2')
+        eq_(environ['HTTP_ACCEPT'], 'text/html,*/*')
+        eq_(environ['REMOTE_ADDR'], '10.0.0.1')
+        eq_(environ['wsgi.input'].read(), b'{}')
+
+    def test_executor_for(self):
+        handler = ASGIHandler(None, read_paths=[ANIMALS], read_threads=1, write_threads=1)
+        eq_(handler.executor_for(scope()), handler.read_executor)
+        eq_(handler.executor_for(scope(path=f'{ANIMALS}1/')), handler.read_executor)
+        eq_(handler.executor_for(scope(method='POST')), handler.write_executor)
+        eq_(handler.executor_for(scope(path='/api/v1/core/users/')), handler.write_executor)
+
+
+@override_settings(VETCLINIC_RESPONSE_CACHE_TIMEOUT=0)
+class TestHandler(TransactionTestCase):
+    """
+    Requests through the handler get the same answers as through WSGI.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.authorization = (b'authorization', f'Token {self.user.auth_token}'.encode())
+        self.handler = ASGIHandler(WSGIHandler(), buffered_chunks=1)
+
+    def tearDown(self):
+        self.handler.read_executor.shutdown()
+        self.handler.write_executor.shutdown()
+
+    def body(self, sent):
+        ok_(not sent[-1].get('more_body'))
+        return b''.join(message.get('body', b'') for message in sent[1:])
+
+    def test_read(self):
+        AnimalFactory.create_batch(3)
+        sent = call(self.handler, scope(headers=[self.authorization]),
+                    [{'type': 'http.request', 'body': b''}])
+        eq_(sent[0]['type'], 'http.response.start')
+        eq_(sent[0]['status'], 200)
+        ok_((b'content-type', b'application/json') in sent[0]['headers'])
+        expected = self.client.get(
+            ANIMALS, HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+        eq_(json.loads(self.body(sent)), expected.json())
+
+    def test_unauthenticated(self):
+        sent = call(self.handler, scope(), [{'type': 'http.request', 'body': b''}])
+        eq_(sent[0]['status'], 403)
+
+    def test_write(self):
+        payload = json.dumps({
+            'name': 'Jane Doe', 'address_line_1': '1 Main St',
+            'city': 'Philadelphia', 'state': 'PA', 'zip': '19107',
+            'phone': '215-555-0100',
+        }).encode()
+        sent = call(
+            self.handler,
+            scope(method='POST', path='/api/v1/vetclinic/clients/', headers=[
+                self.authorization, (b'content-type', b'application/json')]),
+            # a body split over two messages
+            [{'type': 'http.request', 'body': payload[:10], 'more_body': True},
+             {'type': 'http.request', 'body': payload[10:]}],
+        )
+        eq_(sent[0]['status'], 201, self.body(sent))
+        ok_(models.Client.objects.filter(name='Jane Doe').exists())
+
+    def test_disconnect(self):
+        eq_(call(self.handler, scope(), [{'type': 'http.disconnect'}]), [])
+
+    def test_lifespan(self):
+        sent = call(self.handler, {'type': 'lifespan'}, [
+            {'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'},
+        ])
+        eq_([message['type'] for message in sent],
+            ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
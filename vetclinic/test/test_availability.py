@@ -0,0 +1,86 @@
+import datetime
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from nose.tools import eq_
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from drfdemo.users.test.factories import UserFactory
+from .factories import AppointmentFactory, VeterinarianFactory, top_of_the_hour
+from .. import availability
+
+HOUR = datetime.timedelta(hours=1)
+
+
+@override_settings(VETCLINIC_APPOINTMENT_MINUTES=60)
+class TestFirstFreeSlots(TestCase):
+
+    def setUp(self):
+        self.start = top_of_the_hour(hours_from_now=24)
+        self.vet = VeterinarianFactory()
+
+    def test_skips_booked_slots(self):
+        AppointmentFactory(veterinarian=self.vet, time=self.start)
+        AppointmentFactory(veterinarian=self.vet, time=self.start + HOUR)
+        slots = availability.first_free_slots(self.start, self.start + 4 * HOUR, 10)
+        eq_(slots, [
+            (self.start + 2 * HOUR, self.vet.id),
+            (self.start + 3 * HOUR, self.vet.id),
+        ])
+
+    def test_off_grid_appointment_blocks_both_slots_it_overlaps(self):
+        AppointmentFactory(veterinarian=self.vet, time=self.start + HOUR / 2)
+        slots = availability.first_free_slots(self.start, self.start + 3 * HOUR, 10)
+        eq_(slots, [(self.start + 2 * HOUR, self.vet.id)])
+
+    def test_merges_vets_in_time_order(self):
+        other = VeterinarianFactory()
+        AppointmentFactory(veterinarian=self.vet, time=self.start)
+        slots = availability.first_free_slots(self.start, self.start + 2 * HOUR, 3)
+        eq_(slots, [
+            (self.start, other.id),
+            (self.start + HOUR, self.vet.id),
+            (self.start + HOUR, other.id),
+        ])
+
+    def test_inactive_vets_are_skipped(self):
+        self.vet.user.is_active = False
+        self.vet.user.save()
+        eq_(availability.first_free_slots(self.start, self.start + HOUR, 10), [])
+
+    def test_window_start_is_rounded_up_to_the_grid(self):
+        slots = availability.first_free_slots(
+            self.start + datetime.timedelta(minutes=10), self.start + 3 * HOUR, 10,
+        )
+        eq_([start for start, _ in slots], [self.start + HOUR, self.start + 2 * HOUR])
+
+
+class TestFreeSlotViewSet(APITestCase):
+    """
+    Tests /free_slots.
+    """
+
+    def setUp(self):
+        self.url = reverse('free-slot-list')
+        self.user = UserFactory()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+        self.vets = VeterinarianFactory.create_batch(2)
+        self.start = top_of_the_hour(hours_from_now=24)
+
+    def test_limit_and_vet_filter(self):
+        response = self.client.get(self.url, {
+            'start': self.start.isoformat(),
+            'end': (self.start + 5 * HOUR).isoformat(),
+            'limit': 3,
+            'veterinarian': [self.vets[1].id],
+        })
+        eq_(response.status_code, status.HTTP_200_OK)
+        eq_(len(response.data), 3)
+        eq_({slot['veterinarian'] for slot in response.data}, {self.vets[1].id})
+
+    def test_end_must_follow_start(self):
+        response = self.client.get(self.url, {
+            'start': self.start.isoformat(), 'end': self.start.isoformat(),
+        })
+        eq_(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,85 @@
+from django.test import TestCase
+from nose.tools import eq_, ok_
+
+from .. import benchmarking, benchsuite, models
+
+
+class TestSummaries(TestCase):
+    """
+    Percentiles use the nearest rank; comparisons are ratios.
+    """
+
+    def test_percentile(self):
+        ordered = list(range(1, 101))
+        eq_(benchsuite.percentile(ordered, 0.5), 50)
+        eq_(benchsuite.percentile(ordered, 0.99), 99)
+        eq_(benchsuite.percentile([7], 0.95), 7)
+
+    def test_compare(self):
+        def run(p50, queries):
+            return {'scenarios': {'animals.list': {
+                'p50_ms': p50, 'p95_ms': p50, 'p99_ms': p50,
+                'queries_per_request': queries,
+            }}}
+        rows = benchsuite.compare(run(10, 0), run(15, 3))
+        ok_(('animals.list', 'p50_ms', 10, 15, 1.5) in rows)
+        ok_(('animals.list', 'queries_per_request', 0, 3, None) in rows)
+
+
+class TestSeeding(TestCase):
+    """
+    Seeded data is rolled back unless kept, and seeding again doesn't clash.
+    """
+
+    def test_rolled_back(self):
+        with benchmarking.rolled_back():
+            benchmarking.seed_animals(4)
+            eq_(models.Animal.objects.count(), 4)
+        eq_(models.Animal.objects.count(), 0)
+        with benchmarking.rolled_back(keep=True):
+            benchmarking.seed_animals(4)
+        eq_(models.Animal.objects.count(), 4)
+
+    def test_seeding_again(self):
+        first = benchsuite.seed(scale=0.01)
+        benchsuite.seed(scale=0.01)
+        eq_(models.Animal.objects.count(), first['animals'] * 2)
+        eq_(models.Veterinarian.objects.count(), first['veterinarians'] * 2)
+        benchmarking.seed_appointments(6, vets=3)
+        eq_(models.Appointment.objects.filter(
+            veterinarian__user__username__startswith='benchmark-vet-',
+        ).count(), 6)
+
+
+class TestSuite(TestCase):
+    """
+    Every scenario runs cleanly against freshly seeded data.
+    """
+
+    def setUp(self):
+        self.counts = benchsuite.seed(scale=0.02)
+
+    def test_seeded(self):
+        eq_(models.Animal.objects.count(), self.counts['animals'])
+        eq_(models.Appointment.objects.count(), self.counts['appointments'])
+
+    def test_in_process(self):
+        summaries = benchsuite.run_suite(
+            benchsuite.InProcessHarness(), requests=2, warmup=0)
+        eq_(set(summaries), {scenario.name for scenario in benchsuite.SCENARIOS})
+        for name, summary in summaries.items():
+            with self.subTest(scenario=name):
+                eq_(summary['statuses'], [200])
+                eq_(summary['requests'], 2)
+                ok_(summary['queries_per_request'] > 0)
+
+    def test_http(self):
+        summaries = benchsuite.run_suite(
+            benchsuite.HTTPHarness(), requests=2, warmup=0,
+            only=['animals.retrieve', 'animals.book_appointments'])
+        eq_(sorted(summaries), [
+            'animals.book_appointments', 'animals.retrieve',
+            'animals.retrieve.appointments',
+        ])
+        for summary in summaries.values():
+            eq_(summary['statuses'], [200])
@@ -0,0 +1,86 @@
+import datetime
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from nose.tools import eq_
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from drfdemo.users.test.factories import UserFactory
+from .factories import (
+    AnimalFactory, AppointmentFactory, VeterinarianFactory, top_of_the_hour,
+)
+from .. import models
+
+
+class TestBookAppointments(APITestCase):
+    """
+    Tests /animals/book_appointments.
+    """
+
+    def setUp(self):
+        self.url = reverse('animal-book-appointments')
+        self.user = UserFactory()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+        self.vet = VeterinarianFactory()
+        self.animals = AnimalFactory.create_batch(3)
+        self.start = top_of_the_hour(hours_from_now=24)
+
+    def slot(self, animal, hours=0, vet=None):
+        return {
+            'animal': animal.id,
+            'veterinarian': (vet or self.vet).id,
+            'time': (self.start + datetime.timedelta(hours=hours)).isoformat(),
+        }
+
+    def book(self, slots):
+        response = self.client.post(self.url, slots, format='json')
+        eq_(response.status_code, status.HTTP_200_OK)
+        return [result['status'] for result in response.data], response.data
+
+    def test_recurring_series_books_in_one_insert(self):
+        slots = [self.slot(self.animals[0], hours=24 * 7 * week) for week in range(10)]
+        statuses, _ = self.book(slots)
+        eq_(statuses, ['booked'] * 10)
+        eq_(models.Appointment.objects.count(), 10)
+
+    def test_conflicts_with_existing_appointments(self):
+        AppointmentFactory(animal=self.animals[1], veterinarian=self.vet, time=self.start)
+        other_vet = VeterinarianFactory()
+        statuses, data = self.book([
+            self.slot(self.animals[0]),  # vet is busy
+            self.slot(self.animals[1], vet=other_vet),  # animal is busy
+            self.slot(self.animals[2], hours=1),
+        ])
+        eq_(statuses, ['conflict', 'conflict', 'booked'])
+        eq_(list(data[0]['errors']), ['veterinarian'])
+        eq_(list(data[1]['errors']), ['animal'])
+
+    def test_conflicts_within_the_batch(self):
+        statuses, _ = self.book([
+            self.slot(self.animals[0]),
+            self.slot(self.animals[1]),  # same vet, same time
+            self.slot(self.animals[0], vet=VeterinarianFactory()),  # same animal
+        ])
+        eq_(statuses, ['booked', 'conflict', 'conflict'])
+
+    def test_invalid_items_do_not_block_the_rest(self):
+        statuses, data = self.book([
+            self.slot(self.animals[0]),
+            {'animal': 0, 'veterinarian': self.vet.id, 'time': 'never'},
+        ])
+        eq_(statuses, ['booked', 'invalid'])
+        eq_(sorted(data[1]['errors']), ['animal', 'time'])
+
+    def test_conflict_check_is_one_query(self):
+        def queries_for(count):
+            AppointmentFactory.create_batch(count, veterinarian=self.vet)
+            slots = [self.slot(self.animals[i % 3], hours=i * 3 + 1000) for i in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(self.url, slots, format='json')
+            return len(queries)
+
+        # from the second request on, the token lookup is cached
+        queries_for(1)
+        eq_(queries_for(3), queries_for(30))
@@ -0,0 +1,93 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from nose.tools import eq_
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from drfdemo.users.test.factories import UserFactory
+from .factories import AnimalFactory, BreedFactory, ClientFactory
+from .. import models
+
+
+class TestAnimalBulkWrites(APITestCase):
+    """
+    Tests bulk POST to /animals and PUT/PATCH to /animals/bulk.
+    """
+
+    def setUp(self):
+        self.list_url = reverse('animal-list')
+        self.bulk_url = reverse('animal-bulk-update')
+        self.user = UserFactory()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+        self.clients = ClientFactory.create_batch(3)
+        self.breeds = BreedFactory.create_batch(3)
+
+    def payload(self, count):
+        return [
+            {
+                'name': f'Animal {i}',
+                'client': self.clients[i % 3].id,
+                'species': self.breeds[i % 3].species_id,
+                'breed': self.breeds[i % 3].id,
+                'approx_year_of_birth': 2010,
+            }
+            for i in range(count)
+        ]
+
+    def test_bulk_create(self):
+        response = self.client.post(self.list_url, self.payload(25), format='json')
+        eq_(response.status_code, status.HTTP_201_CREATED)
+        eq_(len(response.data), 25)
+        eq_(models.Animal.objects.count(), 25)
+
+    def test_bulk_create_query_count_does_not_grow(self):
+        def queries_for(count):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(self.list_url, self.payload(count), format='json')
+            return len(queries)
+
+        # one lookup per relation plus the INSERT, however big the batch
+        # (from the second request on, the token lookup is cached)
+        queries_for(1)
+        eq_(queries_for(5), queries_for(50))
+
+    def test_errors_are_reported_per_item(self):
+        payload = self.payload(3)
+        payload[1]['client'] = 0
+        del payload[2]['name']
+        response = self.client.post(self.list_url, payload, format='json')
+        eq_(response.status_code, status.HTTP_400_BAD_REQUEST)
+        eq_(response.data[0], {})
+        eq_(list(response.data[1]), ['client'])
+        eq_(list(response.data[2]), ['name'])
+        eq_(models.Animal.objects.count(), 0)
+
+    def test_bulk_patch(self):
+        animals = AnimalFactory.create_batch(3)
+        payload = [
+            {'id': animal.id, 'name': f'Renamed {animal.id}'}
+            for animal in animals
+        ]
+        response = self.client.patch(self.bulk_url, payload, format='json')
+        eq_(response.status_code, status.HTTP_200_OK)
+        for animal in animals:
+            animal.refresh_from_db()
+            eq_(animal.name, f'Renamed {animal.id}')
+
+    def test_bulk_put_requires_every_field(self):
+        animal = AnimalFactory()
+        response = self.client.put(
+            self.bulk_url, [{'id': animal.id, 'name': 'Rex'}], format='json',
+        )
+        eq_(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_update_unknown_animal(self):
+        animal = AnimalFactory(name='Spot')
+        payload = [{'id': animal.id, 'name': 'Rex'}, {'id': 0, 'name': 'Fido'}]
+        response = self.client.patch(self.bulk_url, payload, format='json')
+        eq_(response.status_code, status.HTTP_400_BAD_REQUEST)
+        eq_(response.data[0], {})
+        eq_(list(response.data[1]), ['id'])
+        animal.refresh_from_db()
+        eq_(animal.name, 'Spot')
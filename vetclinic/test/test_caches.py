@@ -0,0 +1,157 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import override_settings
+from nose.tools import eq_, ok_
+from rest_framework.test import APITestCase
+
+from drfdemo.config import Production
+from drfdemo.users.test.factories import UserFactory
+from .factories import BreedFactory, SpeciesFactory
+from .. import caches
+
+SPECIES_URL = '/api/v1/vetclinic/species/'
+BREED_URLS = [
+    '/api/v1/vetclinic/breeds/writable_pk/',
+    '/api/v1/vetclinic/breeds/separate_pk/',
+    '/api/v1/vetclinic/breeds/nested_field/',
+]
+
+
+class TestResponseCache(APITestCase):
+    """
+    Species and breed responses are cached until that data changes.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+        self.technician = UserFactory()
+        self.species = SpeciesFactory()
+        self.species.technicians.add(self.technician)
+        self.breed = BreedFactory(species=self.species)
+
+    def get(self, url, **extra):
+        response = self.client.get(url, **extra)
+        eq_(response.status_code, 200, response.content)
+        return response
+
+    def assert_invalidated_by(self, change, url=SPECIES_URL):
+        first = self.get(url)
+        eq_(self.get(url)['X-Cache'], 'HIT')
+        change()
+        second = self.get(url)
+        eq_(second['X-Cache'], 'MISS')
+        return first, second
+
+    def test_second_request_is_a_hit(self):
+        for url in [SPECIES_URL, f'{SPECIES_URL}{self.species.id}/'] + BREED_URLS:
+            with self.subTest(url=url):
+                first = self.get(url)
+                eq_(first['X-Cache'], 'MISS')
+                # just the version columns on detail routes (see
+                # test_conditional); the token lookup is cached by now
+                detail = url.rstrip('/').split('/')[-1].isdigit()
+                with self.assertNumQueries(1 if detail else 0):
+                    second = self.get(url)
+                eq_(second['X-Cache'], 'HIT')
+                eq_(second.content, first.content)
+                eq_(second['ETag'], first['ETag'])
+
+    def test_query_string_varies_the_key(self):
+        self.get(f'{SPECIES_URL}?page=1')
+        eq_(self.get(SPECIES_URL)['X-Cache'], 'MISS')
+        # but not the order parameters come in
+        self.get(f'{SPECIES_URL}?page=1&page_size=5')
+        eq_(self.get(f'{SPECIES_URL}?page_size=5&page=1')['X-Cache'], 'HIT')
+
+    def test_staff_get_their_own_entries(self):
+        self.get(SPECIES_URL)
+        staff = UserFactory(is_staff=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {staff.auth_token}')
+        eq_(self.get(SPECIES_URL)['X-Cache'], 'MISS')
+
+    def test_unauthenticated_requests_are_not_served_from_cache(self):
+        self.get(SPECIES_URL)
+        self.client.credentials()
+        eq_(self.client.get(SPECIES_URL).status_code, 403)
+
+    def test_species_change_invalidates(self):
+        def rename():
+            self.species.name = 'Renamed'
+            self.species.save()
+        _, response = self.assert_invalidated_by(rename)
+        eq_(response.data['results'][0]['name'], 'Renamed')
+
+    def test_breed_change_invalidates_breeds(self):
+        for url in BREED_URLS:
+            with self.subTest(url=url):
+                self.assert_invalidated_by(BreedFactory, url=url)
+
+    def test_breed_delete_invalidates(self):
+        self.assert_invalidated_by(self.breed.delete, url=BREED_URLS[0])
+
+    def test_technician_change_invalidates(self):
+        def rename():
+            self.technician.first_name = 'Renamed'
+            self.technician.save()
+        _, response = self.assert_invalidated_by(rename)
+        technicians = response.data['results'][0]['technicians']
+        eq_(technicians[0]['first_name'], 'Renamed')
+
+    def test_technician_set_change_invalidates(self):
+        _, response = self.assert_invalidated_by(
+            lambda: self.species.technicians.add(UserFactory()))
+        eq_(len(response.data['results'][0]['technicians']), 2)
+
+    def test_logging_in_does_not_invalidate(self):
+        self.get(SPECIES_URL)
+        self.technician.save(update_fields=['last_login'])
+        eq_(self.get(SPECIES_URL)['X-Cache'], 'HIT')
+
+    def test_if_none_match(self):
+        etag = self.get(SPECIES_URL)['ETag']
+        response = self.client.get(SPECIES_URL, HTTP_IF_NONE_MATCH=etag)
+        eq_(response.status_code, 304)
+        eq_(response['ETag'], etag)
+        eq_(response.content, b'')
+        SpeciesFactory()
+        eq_(self.get(SPECIES_URL, HTTP_IF_NONE_MATCH=etag)['X-Cache'], 'MISS')
+
+    def test_if_modified_since(self):
+        last_modified = self.get(SPECIES_URL)['Last-Modified']
+        response = self.client.get(
+            SPECIES_URL, HTTP_IF_MODIFIED_SINCE=last_modified)
+        eq_(response.status_code, 304)
+
+    def test_counters(self):
+        caches.reset_response_cache_stats()
+        for _ in range(3):
+            self.get(SPECIES_URL)
+        eq_(caches.response_cache_stats(), {'hits': 2, 'misses': 1})
+        stdout, stderr = StringIO(), StringIO()
+        with self.settings(SHARED_CACHE=False):
+            call_command('response_cache_stats', stdout=stdout, stderr=stderr)
+        ok_('hits 2  misses 1' in stdout.getvalue())
+        ok_('private to each process' in stderr.getvalue())
+
+    def test_production_needs_a_shared_cache(self):
+        # otherwise an edit only invalidates one worker's entries
+        settings = {name: 0 for name in Production.SHARED_CACHE_SETTINGS}
+        configuration = type('Configured', (Production, ), dict(
+            settings, SHARED_CACHE=False, VETCLINIC_RESPONSE_CACHE_TIMEOUT=3600,
+        ))
+        with self.assertRaises(ImproperlyConfigured):
+            configuration.check_shared_cache()
+        configuration.SHARED_CACHE = True
+        configuration.check_shared_cache()
+
+    @override_settings(VETCLINIC_RESPONSE_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        self.get(SPECIES_URL)
+        response = self.get(SPECIES_URL)
+        ok_('X-Cache' not in response)
+        eq_(caches.response_cache_stats(), {'hits': 0, 'misses': 0})
@@ -0,0 +1,99 @@
+import datetime
+from unittest import mock
+
+from django.core import signing
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from nose.tools import eq_, ok_
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from drfdemo.users.test.factories import UserFactory
+from .factories import AnimalFactory, BreedFactory, ClientFactory, SpeciesFactory
+from .. import compact
+from .. import models
+from .. import serializers
+from .. import views
+
+
+def make_animals():
+    technicians = UserFactory.create_batch(3)
+    cat, dog = SpeciesFactory(), SpeciesFactory()
+    cat.technicians.set(technicians[:2])
+    dog.technicians.set(technicians[1:])
+    breeds = [BreedFactory(species=cat), BreedFactory(species=dog)]
+    for i in range(6):
+        AnimalFactory(
+            breed=breeds[i % 2],
+            first_visit_date=datetime.date(2018, 9, i + 1) if i % 3 else None,
+            client=ClientFactory(address_line_2='' if i % 2 else 'Apt 2'),
+        )
+    # a species nobody looks after
+    AnimalFactory(breed=BreedFactory(species=SpeciesFactory()))
+
+
+class TestValuesPlanConformance(TestCase):
+    """
+    The compact path has to render exactly what the serializers do.
+    """
+
+    def setUp(self):
+        make_animals()
+
+    def assert_identical(self, serializer_class, queryset):
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        plan = compact.plan_for(serializer_class)
+        ok_(plan is not None)
+        actual = JSONRenderer().render(plan.serialize(list(plan.values(queryset))))
+        eq_(actual, expected)
+
+    def test_animals(self):
+        self.assert_identical(
+            serializers.AnimalDetailSerializer,
+            # technicians have to be prefetched in pk order, as the view does
+            views.AnimalViewSet.queryset.order_by('id'),
+        )
+
+    def test_clients(self):
+        self.assert_identical(
+            serializers.ClientSerializer, models.Client.objects.order_by('id'),
+        )
+
+    def test_many_to_many_is_one_extra_query(self):
+        plan = compact.plan_for(serializers.AnimalDetailSerializer)
+        with self.assertNumQueries(2):
+            plan.serialize(list(plan.values(models.Animal.objects.all())))
+
+    def test_unsupported_serializers_have_no_plan(self):
+        eq_(compact.plan_for(serializers.AnimalWithAppointmentsSerializer), None)
+
+
+class TestCompactListEndpoints(APITestCase):
+    """
+    /animals and /clients render the same bytes either way.
+    """
+
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+        make_animals()
+
+    def assert_same_response(self, url):
+        # the next link's cursor carries the second it was signed in
+        with mock.patch.object(signing.TimestampSigner, 'timestamp', return_value='1'):
+            with override_settings(VETCLINIC_COMPACT_LISTS=False):
+                expected = self.client.get(url)
+            with override_settings(VETCLINIC_COMPACT_LISTS=True):
+                actual = self.client.get(url)
+        eq_(actual.status_code, 200)
+        eq_(actual.content, expected.content)
+
+    def test_animals(self):
+        self.assert_same_response(reverse('animal-list') + '?page_size=4')
+
+    def test_animals_second_page(self):
+        first = self.client.get(reverse('animal-list') + '?page_size=4')
+        self.assert_same_response(first.data['next'])
+
+    def test_clients(self):
+        self.assert_same_response(reverse('client-list'))
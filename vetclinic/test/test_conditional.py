@@ -0,0 +1,142 @@
+import datetime
+
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.utils.http import http_date
+from nose.tools import eq_, ok_
+from rest_framework.test import APITestCase
+
+from drfdemo.users.test.factories import UserFactory
+from .factories import AnimalFactory, SpeciesFactory
+from .. import models
+
+API = '/api/v1/vetclinic'
+
+
+class TestConditionalRetrieve(APITestCase):
+    """
+    Detail routes send ETag/Last-Modified and answer 304 without
+    serializing anything.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+        self.technician = UserFactory()
+        self.animal = AnimalFactory()
+        self.animal.species.technicians.add(self.technician)
+
+    def urls(self):
+        animal = self.animal
+        return [
+            f'{API}/animals/{animal.id}/',
+            f'{API}/clients/{animal.client_id}/',
+            f'{API}/species/{animal.species_id}/',
+            f'{API}/breeds/writable_pk/{animal.breed_id}/',
+            f'{API}/breeds/separate_pk/{animal.breed_id}/',
+            f'{API}/breeds/nested_field/{animal.breed_id}/',
+        ]
+
+    def etag(self, url):
+        response = self.client.get(url)
+        eq_(response.status_code, 200, response.content)
+        ok_(response.has_header('Last-Modified'))
+        return response['ETag']
+
+    def touch(self, instance, days):
+        # updated_at only has to move; pushing it forward keeps the tests
+        # clear of clock resolution
+        type(instance).objects.filter(pk=instance.pk).update(
+            updated_at=instance.updated_at + datetime.timedelta(days=days))
+
+    def test_not_modified(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                etag = self.etag(url)
+                # the version columns; the token lookup is cached by now
+                with self.assertNumQueries(1):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                eq_(response.status_code, 304)
+                eq_(response['ETag'], etag)
+                eq_(response.content, b'')
+
+    def test_if_modified_since(self):
+        url = self.urls()[0]
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        eq_(response.status_code, 304)
+        earlier = http_date(
+            (self.animal.updated_at - datetime.timedelta(days=1)).timestamp())
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=earlier)
+        eq_(response.status_code, 200)
+
+    def test_saving_changes_the_etag(self):
+        url = self.urls()[0]
+        etag = self.etag(url)
+        self.touch(self.animal, 1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        eq_(response.status_code, 200)
+        ok_(response['ETag'] != etag)
+
+    def test_related_changes_change_the_animal_etag(self):
+        url = self.urls()[0]
+        for days, instance in enumerate([
+                self.animal.client, self.animal.species, self.animal.breed,
+        ], start=1):
+            with self.subTest(model=type(instance).__name__):
+                etag = self.etag(url)
+                self.touch(instance, days)
+                ok_(self.etag(url) != etag)
+
+    def test_breed_species_changes_change_the_animal_etag(self):
+        animal = AnimalFactory(species=SpeciesFactory())
+        ok_(animal.breed.species_id != animal.species_id)
+        url = f'{API}/animals/{animal.id}/'
+        etag = self.etag(url)
+        self.touch(animal.breed.species, 1)
+        ok_(self.etag(url) != etag)
+
+    def test_technician_changes_touch_species(self):
+        species = self.animal.species
+
+        def changes():
+            yield lambda: species.technicians.add(UserFactory())
+            yield lambda: species.technicians.remove(self.technician)
+            yield lambda: self.technician.species_set.add(species)
+            yield lambda: self.technician.species_set.clear()
+            yield lambda: species.technicians.add(self.technician)
+            yield lambda: self.technician.save()
+            yield lambda: self.technician.delete()
+
+        for i, change in enumerate(changes()):
+            with self.subTest(change=i):
+                backdated = species.updated_at - datetime.timedelta(days=1)
+                models.Species.objects.filter(pk=species.pk).update(
+                    updated_at=backdated)
+                change()
+                species.refresh_from_db()
+                ok_(species.updated_at > backdated)
+
+    def test_bulk_update_changes_the_etag(self):
+        url = self.urls()[0]
+        self.touch(self.animal, -1)
+        etag = self.etag(url)
+        response = self.client.patch(f'{API}/animals/bulk/', [
+            {'id': self.animal.id, 'name': 'Renamed'},
+        ], format='json')
+        eq_(response.status_code, 200, response.content)
+        ok_(self.etag(url) != etag)
+
+    def test_missing_objects_are_still_404(self):
+        for url in [f'{API}/animals/0/', f'{API}/animals/nope/']:
+            with self.subTest(url=url):
+                eq_(self.client.get(url).status_code, 404)
+
+    def test_not_for_appointments_view(self):
+        self.user.user_permissions.add(Permission.objects.get(
+            codename='see_animal_appointments_with_animal'))
+        response = self.client.get(f'{API}/animals/{self.animal.id}/')
+        eq_(response.status_code, 200, response.content)
+        ok_('appointments' in response.data)
+        ok_(not response.has_header('ETag'))
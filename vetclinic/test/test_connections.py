@@ -0,0 +1,92 @@
+from unittest import mock, skipIf
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import request_finished, request_started
+from django.db import InterfaceError, connection
+from django.test import TestCase, TransactionTestCase
+from nose.tools import eq_
+
+from drfdemo.config.common import Common
+from drfdemo.postgresql.base import connection_stats, reset_connection_stats
+
+POSTGRES = {
+    'ENGINE': 'django.db.backends.postgresql_psycopg2', 'NAME': 'x', 'CONN_MAX_AGE': 600,
+}
+
+
+class TestPoolModeSetting(TestCase):
+    """
+    Postgres databases get the health-checking backend, and pgbouncer mode
+    turns off server-side cursors.
+    """
+
+    def databases(self, **settings):
+        configuration = type('Configuration', (Common, ), dict(
+            {'DATABASES': {'default': dict(POSTGRES)}}, **settings))
+        configuration.setup()
+        return configuration.DATABASES
+
+    def test_direct(self):
+        default = self.databases()['default']
+        eq_(default['ENGINE'], 'drfdemo.postgresql')
+        eq_(default['CONN_HEALTH_CHECKS'], True)
+        eq_(default.get('DISABLE_SERVER_SIDE_CURSORS'), None)
+
+    def test_pgbouncer(self):
+        default = self.databases(POSTGRES_POOL_MODE='pgbouncer', POSTGRES_HEALTH_CHECKS=False)['default']
+        eq_(default['DISABLE_SERVER_SIDE_CURSORS'], True)
+        eq_(default['CONN_HEALTH_CHECKS'], False)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.databases(POSTGRES_POOL_MODE='pgpool')
+
+    def test_other_databases(self):
+        configuration = type('Configuration', (Common, ), {
+            'DATABASES': {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'x'}},
+        })
+        configuration.setup()
+        eq_(configuration.DATABASES['default']['ENGINE'], 'django.db.backends.sqlite3')
+
+
+@skipIf(connection.vendor != 'postgresql', 'the health-checking backend is for Postgres')
+class TestHealthChecks(TransactionTestCase):
+    """
+    A persistent connection that died between requests is replaced on
+    checkout instead of failing the request.
+    """
+
+    def setUp(self):
+        self.addCleanup(connection.close)
+        connection.ensure_connection()
+        reset_connection_stats()
+
+    def request(self):
+        request_started.send(sender=self.__class__)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        finally:
+            request_finished.send(sender=self.__class__)
+
+    def test_reused(self):
+        self.request()
+        self.request()
+        eq_(connection_stats(), {
+            'opened': 0, 'reused': 2, 'health_check_failures': 0, 'closed': 0, 'reuse_rate': 1,
+        })
+
+    def test_broken_connection_replaced(self):
+        self.request()
+        # the server went away under us
+        connection.connection.close()
+        self.request()
+        stats = connection_stats()
+        eq_((stats['health_check_failures'], stats['opened']), (1, 1))
+
+    def test_off(self):
+        self.request()
+        connection.connection.close()
+        with mock.patch.dict(connection.settings_dict, CONN_HEALTH_CHECKS=False):
+            with self.assertRaises(InterfaceError):
+                self.request()
@@ -0,0 +1,93 @@
+import csv
+import io
+import json
+from unittest import mock
+
+from django.contrib.auth.models import Permission
+from django.db import connection
+from django.urls import reverse
+from nose.tools import eq_, ok_
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from drfdemo.users.test.factories import UserFactory
+from .factories import AnimalFactory, AppointmentFactory
+
+
+class TestAnimalExport(APITestCase):
+    """
+    Tests /animals/export.
+    """
+
+    def setUp(self):
+        self.url = reverse('animal-export')
+        self.user = UserFactory()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+        self.animals = AnimalFactory.create_batch(5)
+        self.appointment = AppointmentFactory(animal=self.animals[0])
+
+    def get(self, **params):
+        response = self.client.get(self.url, params)
+        eq_(response.status_code, status.HTTP_200_OK)
+        ok_(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def grant_appointments(self):
+        self.user.user_permissions.add(Permission.objects.get(
+            codename='see_animal_appointments_with_animal',
+        ))
+
+    def test_ndjson_has_one_line_per_animal(self):
+        response, body = self.get()
+        eq_(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        eq_(sorted(row['id'] for row in rows), sorted(a.id for a in self.animals))
+        row = next(row for row in rows if row['id'] == self.animals[0].id)
+        eq_(row['breed']['name'], self.animals[0].breed.name)
+        ok_('appointments' not in row)
+
+    def test_appointments_need_permission(self):
+        self.grant_appointments()
+        _, body = self.get()
+        rows = {row['id']: row for row in map(json.loads, body.splitlines())}
+        eq_(
+            [a['id'] for a in rows[self.animals[0].id]['appointments']],
+            [self.appointment.id],
+        )
+        eq_(rows[self.animals[1].id]['appointments'], [])
+
+    def test_csv(self):
+        self.grant_appointments()
+        response, body = self.get(export_format='csv')
+        eq_(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        eq_(len(rows), len(self.animals))
+        ok_('appointments' in rows[0])
+
+    def test_filters_apply(self):
+        name = self.animals[2].name
+        _, body = self.get(name=name)
+        ids = [json.loads(line)['id'] for line in body.splitlines()]
+        eq_(sorted(ids), sorted(a.id for a in self.animals if a.name == name))
+
+    def test_queries_are_per_chunk_not_per_row(self):
+        self.grant_appointments()
+        AnimalFactory.create_batch(20)
+        response = self.client.get(self.url)
+        # rows are fetched lazily: the animals, then one appointments chunk
+        with self.assertNumQueries(2):
+            b''.join(response.streaming_content)
+
+    def test_without_server_side_cursors(self):
+        # as behind pgbouncer: the keys, then each chunk of rows
+        self.grant_appointments()
+        expected = self.get()[1]
+        with mock.patch.dict(connection.settings_dict, DISABLE_SERVER_SIDE_CURSORS=True):
+            response = self.client.get(self.url)
+            with self.assertNumQueries(3):
+                body = b''.join(response.streaming_content).decode()
+        eq_(body, expected)
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get(self.url, {'export_format': 'xml'})
+        eq_(response.status_code, status.HTTP_400_BAD_REQUEST)
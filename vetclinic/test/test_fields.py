@@ -0,0 +1,79 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from nose.tools import eq_
+from rest_framework.test import APITestCase
+
+from drfdemo.users.test.factories import UserFactory
+from .factories import BreedFactory, SpeciesFactory
+from .. import models
+from ..serializers import BreedSerializerWithWritablePK
+
+
+class TestSpeciesFieldQueries(TestCase):
+    """
+    SpeciesField must not issue a query per serialized breed.
+    """
+
+    def assert_queries_for(self, count, queryset, expected_queries):
+        species = SpeciesFactory.create_batch(3)
+        models.Breed.objects.bulk_create(
+            models.Breed(name=f'breed{i}', species=species[i % 3])
+            for i in range(count)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            data = BreedSerializerWithWritablePK(queryset, many=True).data
+        eq_(len(data), count)
+        eq_(len(queries), expected_queries)
+        for row in data:
+            eq_(set(row['species']), {'id', 'name'})
+
+    def test_select_related_breeds_take_one_query(self):
+        queryset = models.Breed.objects.select_related('species')
+        for count in (1, 100, 1000):
+            with self.subTest(count=count):
+                models.Breed.objects.all().delete()
+                self.assert_queries_for(count, queryset.all(), 1)
+
+    def test_plain_breeds_take_one_extra_query(self):
+        for count in (1, 100, 1000):
+            with self.subTest(count=count):
+                models.Breed.objects.all().delete()
+                self.assert_queries_for(count, models.Breed.objects.all(), 2)
+
+    def test_single_breed_reads_nested_species(self):
+        breed = BreedFactory()
+        data = BreedSerializerWithWritablePK(breed).data
+        eq_(data['species'], {'id': breed.species.id, 'name': breed.species.name})
+
+
+class TestBreedWritablePKViewSet(APITestCase):
+    """
+    Tests /breeds/writable_pk reads and writes.
+    """
+
+    # all three breed viewsets share the 'breed' route name, so use the path
+    url = '/api/v1/vetclinic/breeds/writable_pk/'
+
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+        self.species = SpeciesFactory()
+
+    def test_post_species_pk_reads_back_nested(self):
+        response = self.client.post(
+            self.url, {'name': 'Beagle', 'species': self.species.id},
+        )
+        eq_(response.status_code, 201)
+        eq_(response.data['species'], {'id': self.species.id, 'name': self.species.name})
+
+    def test_list_queries_do_not_grow_with_rows(self):
+        # from the second request on, the token lookup is cached
+        self.client.get(self.url)
+        BreedFactory.create_batch(5, species=self.species)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+        BreedFactory.create_batch(5, species=SpeciesFactory())
+        with CaptureQueriesContext(connection) as more:
+            self.client.get(self.url)
+        eq_(len(few), len(more))
@@ -0,0 +1,237 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock, skipIf
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from nose.tools import eq_, ok_
+
+from drfdemo.users.test.factories import UserFactory
+from .factories import AnimalFactory, VeterinarianFactory
+from .. import importing, models, summaries
+
+CLIENTS = '''id,name,address_line_1,city,state,zip,phone,email
+c1,Alice Adams,1 Main St,Philadelphia,PA,19107,215-555-0100,alice@example.com
+c2,Bob Brown,2 Main St,Philadelphia,PA,19107,215-555-0101,
+c3,,3 Main St,Philadelphia,PA,19107,215-555-0102,not an email
+'''
+
+
+class ImportTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.vet = VeterinarianFactory()
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as stream:
+            if isinstance(content, list):
+                content = ''.join(json.dumps(row) + '\n' for row in content)
+            stream.write(content)
+        return path
+
+    def animals(self, count=2, species='Dog'):
+        return [
+            {'id': f'a{i}', 'name': f'Animal {i}', 'client_id': 'c1', 'species': species,
+             'breed': 'Beagle', 'approx_year_of_birth': 2015}
+            for i in range(1, count + 1)
+        ]
+
+    def run_import(self, *args, **files):
+        out = io.StringIO()
+        options = [f'--{kind}={self.write(name, content)}' for kind, (name, content) in files.items()]
+        call_command('import_clinic_data', '--source=old-clinic', *options, *args, stdout=out)
+        return out.getvalue()
+
+    def imported(self, kind, external_id):
+        return models.ImportedRecord.objects.get(
+            source='old-clinic', kind=kind, external_id=external_id).object_id
+
+
+class TestImport(ImportTestCase):
+    """
+    Files load in bulk, bad rows are reported and repeats update.
+    """
+
+    def test_clients(self):
+        rejects = os.path.join(self.directory, 'rejects.ndjson')
+        output = self.run_import(f'--rejects={rejects}', clients=('clients.csv', CLIENTS))
+        ok_('clients: 3 rows  2 imported  1 rejected' in output, output)
+        client = models.Client.objects.get(pk=self.imported('clients', 'c1'))
+        eq_((client.name, client.email), ('Alice Adams', 'alice@example.com'))
+        eq_(models.Client.objects.get(pk=self.imported('clients', 'c2')).email, '')
+        with open(rejects) as stream:
+            rejected = [json.loads(line) for line in stream]
+        eq_([(row['kind'], row['row'], sorted(row['errors'])) for row in rejected],
+            [('clients', 3, ['email', 'name'])])
+
+    def test_animals(self):
+        self.run_import(
+            clients=('clients.csv', CLIENTS),
+            animals=('animals.ndjson', self.animals(3) + [
+                {'id': 'a4', 'name': 'Nobody', 'client_id': 'c9', 'species': 'Dog',
+                 'breed': 'Beagle', 'approx_year_of_birth': 2015},
+                {'id': 'a5', 'name': 'Old', 'client_id': 'c1', 'species': 'Dog',
+                 'breed': 'Beagle', 'approx_year_of_birth': 'ancient'},
+                ['not', 'an', 'object'],
+            ]),
+        )
+        eq_(models.Animal.objects.count(), 3)
+        # created once, and only for the rows that made it
+        eq_(list(models.Species.objects.values_list('name', flat=True)), ['Dog'])
+        eq_(list(models.Breed.objects.values_list('name', flat=True)), ['Beagle'])
+        animal = models.Animal.objects.get(pk=self.imported('animals', 'a1'))
+        eq_((animal.name, animal.client_id), ('Animal 1', self.imported('clients', 'c1')))
+        eq_(list(summaries.inconsistencies()), [])
+
+    def test_existing_reference_data(self):
+        existing = AnimalFactory()
+        self.run_import(
+            clients=('clients.csv', CLIENTS),
+            animals=('animals.ndjson', self.animals(1, species=existing.species.name)),
+        )
+        eq_(models.Species.objects.count(), 1)
+        eq_(models.Animal.objects.get(pk=self.imported('animals', 'a1')).species, existing.species)
+
+    def test_reimport_updates(self):
+        self.run_import(clients=('clients.csv', CLIENTS), animals=('animals.ndjson', self.animals()))
+        renamed = CLIENTS.replace('Alice Adams', 'Alice Jones')
+        output = self.run_import(
+            clients=('clients.csv', renamed), animals=('animals.ndjson', self.animals()))
+        ok_('animals.ndjson already imported' in output, output)
+        eq_(models.Client.objects.count(), 2)
+        eq_(models.Animal.objects.count(), 2)
+        eq_(models.Client.objects.get(pk=self.imported('clients', 'c1')).name, 'Alice Jones')
+        eq_(list(summaries.inconsistencies()), [])
+
+    def test_appointments(self):
+        username = self.vet.user.username
+        other = VeterinarianFactory()
+        taken = AnimalFactory()
+        models.Appointment.objects.create(
+            time='2030-01-01T09:00:00Z', animal=taken, veterinarian=other)
+        self.run_import(
+            clients=('clients.csv', CLIENTS),
+            animals=('animals.ndjson', self.animals(3)),
+            appointments=('appointments.ndjson', [
+                {'id': 'p1', 'animal_id': 'a1', 'veterinarian': username,
+                 'time': '2030-01-01T09:00:00Z'},
+                {'id': 'p2', 'animal_id': 'a2', 'veterinarian': username,
+                 'time': '2030-01-01T10:00:00Z'},
+                # the vet is busy with p2, in the file
+                {'id': 'p3', 'animal_id': 'a3', 'veterinarian': username,
+                 'time': '2030-01-01T10:00:00Z'},
+                # the other vet is busy in the database
+                {'id': 'p4', 'animal_id': 'a3', 'veterinarian': other.user.username,
+                 'time': '2030-01-01T09:00:00Z'},
+                {'id': 'p5', 'animal_id': 'a3', 'veterinarian': 'nobody',
+                 'time': '2030-01-01T11:00:00Z'},
+                {'id': 'p6', 'animal_id': 'a9', 'veterinarian': username,
+                 'time': '2030-01-01T11:00:00Z'},
+            ]),
+        )
+        eq_(models.Appointment.objects.filter(veterinarian=self.vet).count(), 2)
+        first = models.Appointment.objects.get(pk=self.imported('appointments', 'p1'))
+        eq_(first.animal_id, self.imported('animals', 'a1'))
+        eq_(list(summaries.inconsistencies()), [])
+
+    def test_moving_appointments(self):
+        username = self.vet.user.username
+        appointments = [
+            {'id': 'p1', 'animal_id': 'a1', 'veterinarian': username, 'time': '2030-01-01T09:00:00Z'},
+        ]
+        self.run_import(
+            clients=('clients.csv', CLIENTS), animals=('animals.ndjson', self.animals()),
+            appointments=('appointments.ndjson', appointments))
+        # moving it isn't a conflict with itself, and both animals are recounted
+        appointments[0].update(animal_id='a2')
+        self.run_import(appointments=('appointments.ndjson', appointments))
+        eq_(models.Appointment.objects.get().animal_id, self.imported('animals', 'a2'))
+        eq_(list(summaries.inconsistencies()), [])
+
+    def test_orm_path(self):
+        self.run_import('--no-copy', clients=('clients.csv', CLIENTS))
+        self.run_import('--no-copy', clients=('clients.csv', CLIENTS.replace('Bob', 'Rob')))
+        eq_(models.Client.objects.get(pk=self.imported('clients', 'c2')).name, 'Rob Brown')
+
+    @skipIf(connection.vendor != 'postgresql', 'COPY needs Postgres')
+    def test_copy_path(self):
+        with mock.patch.object(importing, 'orm_upsert') as orm_upsert:
+            self.run_import(clients=('clients.csv', CLIENTS), animals=('animals.ndjson', self.animals()))
+        ok_(not orm_upsert.called)
+        eq_(models.Animal.objects.count(), 2)
+
+    def test_bad_arguments(self):
+        with self.assertRaises(CommandError):
+            call_command('import_clinic_data', '--source=old-clinic')
+        with self.assertRaises(CommandError):
+            self.run_import(clients=('clients.txt', CLIENTS))
+
+
+@override_settings(VETCLINIC_RESPONSE_CACHE_TIMEOUT=3600)
+class TestResponseCache(ImportTestCase):
+    """
+    Species and breeds created by an import show up in cached responses.
+    """
+
+    def test_imported_species_are_listed(self):
+        cache.clear()
+        user = UserFactory()
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {user.auth_token}'
+
+        def species():
+            response = self.client.get('/api/v1/vetclinic/species/', {'page_size': 100})
+            eq_(response.status_code, 200)
+            return {row['name'] for row in response.data['results']}
+
+        ok_('Axolotl' not in species())
+        # the test's transaction never commits, so run the callbacks now
+        with mock.patch('django.db.transaction.on_commit', side_effect=lambda func: func()):
+            self.run_import(
+                clients=('clients.csv', CLIENTS),
+                animals=('animals.ndjson', self.animals(species='Axolotl')),
+            )
+        ok_('Axolotl' in species())
+
+
+class TestResume(ImportTestCase):
+    """
+    A failed import picks up after its last committed batch.
+    """
+
+    def test_resume(self):
+        self.run_import(clients=('clients.csv', CLIENTS))
+        after_write = importing.AnimalImporter.after_write
+        batches = []
+
+        def fail_second_batch(importer, rows):
+            batches.append(rows)
+            if len(batches) == 2:
+                raise RuntimeError
+            after_write(importer, rows)
+
+        failing = mock.patch.object(importing.AnimalImporter, 'after_write', fail_second_batch)
+        with failing, self.assertRaises(RuntimeError):
+            self.run_import('--batch-size=2', animals=('animals.ndjson', self.animals(5)))
+        eq_(models.Animal.objects.count(), 2)
+        output = self.run_import('--batch-size=2', animals=('animals.ndjson', self.animals(5)))
+        ok_('animals: 4 rows  2 imported' in output, output)
+        ok_('animals: 5 rows  3 imported' in output, output)
+        eq_(models.Animal.objects.count(), 5)
+        eq_(list(summaries.inconsistencies()), [])
+
+    def test_changed_file_starts_over(self):
+        self.run_import(clients=('clients.csv', CLIENTS))
+        self.run_import(animals=('animals.ndjson', self.animals(2)))
+        output = self.run_import(animals=('animals.ndjson', self.animals(3)))
+        ok_('animals: 3 rows  3 imported' in output, output)
+        output = self.run_import('--restart', animals=('animals.ndjson', self.animals(3)))
+        ok_('animals: 3 rows  3 imported' in output, output)
+        eq_(models.Animal.objects.count(), 3)
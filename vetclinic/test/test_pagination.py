@@ -0,0 +1,95 @@
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from django.core import signing
+from django.urls import reverse
+from nose.tools import eq_, ok_
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from drfdemo.users.test.factories import UserFactory
+from .factories import AnimalFactory, BreedFactory, ClientFactory
+
+
+class TestAnimalKeysetPagination(APITestCase):
+    """
+    Tests keyset pagination on /animals.
+    """
+
+    def setUp(self):
+        self.url = reverse('animal-list')
+        self.user = UserFactory()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+        self.breed = BreedFactory()
+        # duplicate names make sure we're seeking on id as well as name
+        self.animals = [
+            AnimalFactory(name=name, breed=self.breed)
+            for name in ['Rex', 'Fido', 'Rex', 'Spot', 'Rex', 'Ace', 'Fido']
+        ]
+        self.expected = [
+            animal.id for animal in sorted(
+                self.animals, key=lambda animal: (animal.name, animal.id))
+        ]
+
+    def walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            eq_(response.status_code, status.HTTP_200_OK)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        return seen
+
+    def test_pages_cover_every_row_once_in_order(self):
+        eq_(self.walk(f'{self.url}?page_size=2'), self.expected)
+
+    def test_response_has_no_count(self):
+        response = self.client.get(self.url)
+        ok_('count' not in response.data)
+        eq_(response.data['previous'], None)
+
+    def test_previous_link_returns_the_prior_page(self):
+        # cursors carry the second they were signed in
+        with mock.patch.object(signing.TimestampSigner, 'timestamp', return_value='1'):
+            first = self.client.get(f'{self.url}?page_size=3').data
+            second = self.client.get(first['next']).data
+            back = self.client.get(second['previous']).data
+        eq_(
+            [row['id'] for row in back['results']],
+            [row['id'] for row in first['results']],
+        )
+        eq_(back['next'], first['next'])
+
+    def test_tampered_cursor_is_rejected(self):
+        first = self.client.get(f'{self.url}?page_size=2').data
+        cursor = parse_qs(urlparse(first['next']).query)['cursor'][0]
+        forged = cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B')
+        response = self.client.get(f'{self.url}?cursor={forged}')
+        eq_(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_pagination_respects_filters(self):
+        url = f'{self.url}?page_size=1&name=Rex'
+        rexes = [a.id for a in self.animals if a.name == 'Rex']
+        eq_(self.walk(url), sorted(rexes))
+
+
+class TestClientKeysetPagination(APITestCase):
+    """
+    Tests keyset pagination on /clients.
+    """
+
+    def setUp(self):
+        self.url = reverse('client-list')
+        self.user = UserFactory()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+        self.clients = ClientFactory.create_batch(5)
+
+    def test_pages_cover_every_row_once_in_order(self):
+        url = f'{self.url}?page_size=2'
+        seen = []
+        while url:
+            response = self.client.get(url)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        expected = sorted(self.clients, key=lambda c: (c.name, c.id))
+        eq_(seen, [c.id for c in expected])
@@ -0,0 +1,131 @@
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Field
+from django.db.utils import ConnectionHandler
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from nose.tools import eq_, ok_
+from rest_framework.test import APITestCase
+
+from drfdemo.users.test.factories import UserFactory
+from .factories import AnimalFactory
+from .. import filters, models, planning
+
+
+class TestPlanFilters(TestCase):
+    """
+    The static rules score parameters by operator and join depth.
+    """
+
+    def test_resolve_depth(self):
+        for param, depth in [('name', 0), ('breed__in', 0), ('breed__name__icontains', 1),
+                             ('breed__species__name', 2), ('breed__species__id__in', 2)]:
+            with self.subTest(param=param):
+                eq_(planning.resolve_param(filters.AnimalFilter, param)[0], depth)
+
+    def test_ignores_other_params(self):
+        plan = planning.plan_filters(filters.AnimalFilter, {'page_size': '10', 'search': 'x'})
+        eq_(plan.filters, 0)
+        eq_(plan.cost, 0)
+
+    def test_joins_cost_more(self):
+        shallow = planning.plan_filters(filters.AnimalFilter, {'name__icontains': 'a'})
+        deep = planning.plan_filters(filters.AnimalFilter, {'breed__species__name__icontains': 'a'})
+        eq_(deep.cost, shallow.cost * 4)
+        eq_(deep.depth, 2)
+
+    def test_in_rewrites_only_on_postgres(self):
+        params = {'id__in': ','.join(str(i) for i in range(150))}
+        eq_(planning.plan_filters(filters.AnimalFilter, params, 'sqlite').rewrites, 0)
+        plan = planning.plan_filters(filters.AnimalFilter, params, 'postgresql')
+        eq_(plan.rewrites, 1)
+        eq_(plan.largest_in, 150)
+
+
+class TestArrayAny(TestCase):
+    """
+    Long ``in`` lists compile to a single bound array on Postgres.
+    """
+
+    def test_sql(self):
+        if 'any' not in Field.get_lookups():
+            Field.register_lookup(filters.ArrayAny)
+            self.addCleanup(Field._unregister_lookup, filters.ArrayAny)
+        pg = ConnectionHandler({
+            'default': {'ENGINE': 'django.db.backends.postgresql', 'NAME': 'x'},
+        })['default']
+        queryset = models.Animal.objects.filter(id__any=[1, '2'], breed__pk__any=[3])
+        sql, params = queryset.query.get_compiler(connection=pg).as_sql()
+        ok_('"vetclinic_animal"."id" = ANY(%s)' in sql, sql)
+        ok_('"vetclinic_animal"."breed_id" = ANY(%s)' in sql, sql)
+        ok_('JOIN' not in sql, sql)
+        eq_(sorted(params), [[1, 2], [3]])
+
+    def test_only_registered_for_postgres(self):
+        eq_('any' in Field.get_lookups(), connection.vendor == 'postgresql')
+
+    def test_relation_filters_go_through_pk(self):
+        eq_(filters.AnimalFilter.base_filters['breed__in'].any_lookup, 'pk__any')
+        eq_(filters.AnimalFilter.base_filters['id__in'].any_lookup, 'any')
+
+
+class TestGuardrails(APITestCase):
+    """
+    Requests are refused, throttled or let through depending on the plan.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+        self.animals = AnimalFactory.create_batch(3)
+
+    def get(self, **params):
+        return self.client.get(reverse('animal-list'), params)
+
+    @override_settings(VETCLINIC_FILTER_MAX_DEPTH=1)
+    def test_too_deep(self):
+        eq_(self.get(breed__name=self.animals[0].breed.name).status_code, 200)
+        response = self.get(breed__species__name='x')
+        eq_(response.status_code, 400, response.content)
+        ok_('breed__species__name' in response.data)
+
+    @override_settings(VETCLINIC_FILTER_MAX_IN_SIZE=5)
+    def test_in_too_long(self):
+        response = self.get(id__in='1,2,3,4,5,6')
+        eq_(response.status_code, 400, response.content)
+        ok_('id__in' in response.data)
+
+    @override_settings(VETCLINIC_FILTER_MAX_COST=10)
+    def test_too_expensive(self):
+        response = self.get(name__icontains='a', breed__name__icontains='a')
+        eq_(response.status_code, 400, response.content)
+        ok_('non_field_errors' in response.data)
+
+    @override_settings(VETCLINIC_FILTER_THROTTLE_COST=0, VETCLINIC_EXPENSIVE_FILTER_RATE='2/min')
+    def test_throttled(self):
+        for _ in range(2):
+            eq_(self.get(name__icontains='a').status_code, 200)
+        eq_(self.get(name__icontains='a').status_code, 429)
+        # unfiltered requests don't count
+        eq_(self.get().status_code, 200)
+
+    @override_settings(VETCLINIC_FILTER_IN_REWRITE_SIZE=2)
+    def test_long_in_still_filters(self):
+        wanted = self.animals[:2]
+        response = self.get(id__in=','.join(str(animal.pk) for animal in wanted))
+        eq_(response.status_code, 200, response.content)
+        eq_({row['id'] for row in response.data['results']}, {animal.pk for animal in wanted})
+
+    def test_logged(self):
+        with self.assertLogs('vetclinic.planning', 'INFO') as logs:
+            self.get(breed__species__name='x')
+        eq_(len(logs.output), 1)
+        ok_('view=AnimalViewSet decision=accepted filters=1 depth=2' in logs.output[0],
+            logs.output)
+
+    @override_settings(VETCLINIC_FILTER_MAX_DEPTH=0)
+    def test_rejections_logged(self):
+        with self.assertLogs('vetclinic.planning', 'INFO') as logs:
+            self.get(breed__name='x')
+        ok_('decision=rejected' in logs.output[0], logs.output)
@@ -0,0 +1,146 @@
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from nose.tools import eq_, ok_
+from rest_framework.test import APITestCase
+
+from drfdemo.users.test.factories import UserFactory
+from .factories import AnimalFactory
+from .. import profiling
+
+
+class TestMetrics(TestCase):
+    """
+    Histograms and counters render in the Prometheus text format.
+    """
+
+    def setUp(self):
+        profiling.reset_metrics()
+
+    def test_histogram(self):
+        histogram = profiling.Histogram('test', 'A test', (1, 5))
+        for value in [0, 2, 3, 10]:
+            histogram.observe(('AView', 'list'), value)
+        eq_(histogram.get(('AView', 'list')), {'buckets': [1, 3, 4], 'sum': 15, 'count': 4})
+        eq_(histogram.get(('AView', 'retrieve')), None)
+
+    def test_render(self):
+        profiling.QUERIES.observe(('AView', 'list'), 3)
+        profiling.N_PLUS_ONE.inc(('Odd"View', 'list'))
+        text = profiling.render_metrics()
+        ok_('# TYPE vetclinic_request_queries histogram\n' in text)
+        ok_('vetclinic_request_queries_bucket{view="AView",action="list",le="2"} 0\n' in text)
+        ok_('vetclinic_request_queries_bucket{view="AView",action="list",le="5"} 1\n' in text)
+        ok_('vetclinic_request_queries_bucket{view="AView",action="list",le="+Inf"} 1\n' in text)
+        ok_('vetclinic_request_queries_count{view="AView",action="list"} 1\n' in text)
+        ok_('vetclinic_n_plus_one_total{view="Odd\\"View",action="list"} 1\n' in text)
+
+    def test_added_up_across_processes(self):
+        labels = ('AView', 'list')
+        profiling.DB_SECONDS.observe(labels, 0.004)
+        profiling.N_PLUS_ONE.inc(labels)
+        profiling.flush_metrics()
+        # what's left in this process is what another worker would have
+        for metric in profiling.METRICS:
+            metric.reset()
+        profiling.DB_SECONDS.observe(labels, 0.5)
+        profiling.N_PLUS_ONE.inc(labels)
+        text = profiling.render_metrics()
+        for line in [
+                'vetclinic_request_db_seconds_bucket{view="AView",action="list",le="0.005"} 1',
+                'vetclinic_request_db_seconds_bucket{view="AView",action="list",le="0.5"} 2',
+                'vetclinic_request_db_seconds_sum{view="AView",action="list"} 0.504',
+                'vetclinic_request_db_seconds_count{view="AView",action="list"} 2',
+                'vetclinic_n_plus_one_total{view="AView",action="list"} 2',
+        ]:
+            ok_(line + '\n' in text, text)
+        eq_(profiling.DB_SECONDS.get(labels)['count'], 1)
+
+    def test_connections(self):
+        stats = {'opened': 2, 'reused': 5, 'health_check_failures': 0, 'closed': 1}
+        with mock.patch.object(profiling, 'connection_stats', return_value=stats):
+            profiling.flush_metrics()
+            stats['reused'] = 8
+            text = profiling.render_metrics()
+        ok_('vetclinic_db_connections_total{event="opened"} 2\n' in text, text)
+        ok_('vetclinic_db_connections_total{event="reused"} 8\n' in text, text)
+        ok_('health_check_failures' not in text)
+
+    def test_token_lookups(self):
+        stats = {'local_hits': 6, 'shared_hits': 1, 'misses': 3, 'hit_rate': 0.7}
+        with mock.patch.object(profiling, 'token_cache_stats', return_value=stats):
+            text = profiling.render_metrics()
+        for result, count in [('local_hit', 6), ('shared_hit', 1), ('miss', 3)]:
+            ok_(f'vetclinic_token_cache_lookups_total{{result="{result}"}} {count}\n' in text, text)
+
+    @override_settings(VETCLINIC_PROFILING_DUPLICATE_THRESHOLD=3)
+    def test_repeated_statements(self):
+        profile = profiling.RequestProfile()
+        profile.view, profile.action = 'AView', 'list'
+        for sql in ['a', 'b', 'b', 'b', 'c', 'c']:
+            profile.queries.append((sql, 0.001))
+        eq_(profile.duplicates(), 3)
+        with self.assertLogs('vetclinic.profiling', 'WARNING') as logs:
+            profile.record(HttpResponse(b'12345'))
+        ok_('possible N+1 in AView.list: 3 runs of b' in logs.output[0], logs.output)
+        eq_(profiling.N_PLUS_ONE.get(profile.labels), 1)
+        eq_(profiling.DUPLICATE_QUERIES.get(profile.labels)['sum'], 3)
+        eq_(profiling.RESPONSE_BYTES.get(profile.labels)['sum'], 5)
+
+
+@override_settings(VETCLINIC_PROFILING_SAMPLE_RATE=1)
+class TestProfilingMiddleware(APITestCase):
+    """
+    Sampled requests are recorded against their view and action.
+    """
+
+    def setUp(self):
+        profiling.reset_metrics()
+        self.user = UserFactory()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+        AnimalFactory.create_batch(3)
+
+    def test_recorded(self):
+        response = self.client.get(reverse('animal-list'))
+        eq_(response.status_code, 200)
+        labels = ('AnimalViewSet', 'list')
+        eq_(profiling.REQUEST_SECONDS.get(labels)['count'], 1)
+        ok_(profiling.QUERIES.get(labels)['sum'] > 0)
+        ok_(profiling.DB_SECONDS.get(labels)['sum'] > 0)
+        ok_(profiling.SERIALIZER_SECONDS.get(labels)['sum'] > 0)
+        ok_(profiling.RENDER_SECONDS.get(labels)['sum'] > 0)
+        eq_(profiling.RESPONSE_BYTES.get(labels)['sum'], len(response.content))
+
+    def test_serializer_output_unchanged(self):
+        url = reverse('animal-list')
+        profiled = self.client.get(url).content
+        with override_settings(VETCLINIC_PROFILING_SAMPLE_RATE=0):
+            eq_(self.client.get(url).content, profiled)
+
+    @override_settings(VETCLINIC_METRICS_FLUSH_INTERVAL=60)
+    def test_flushed_at_most_every_interval(self):
+        labels = ('AnimalViewSet', 'list')
+        for _ in range(2):
+            self.client.get(reverse('animal-list'))
+        eq_(profiling.QUERIES.get(labels)['count'], 2)
+        eq_(profiling.shared_series()['vetclinic_request_queries'][labels]['count'], 1)
+
+    @override_settings(VETCLINIC_PROFILING_SAMPLE_RATE=0)
+    def test_unsampled(self):
+        self.client.get(reverse('animal-list'))
+        eq_(profiling.REQUEST_SECONDS.get(('AnimalViewSet', 'list')), None)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('animal-list'))
+        eq_(self.client.get(reverse('metrics')).status_code, 403)
+        admin = UserFactory(is_staff=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {admin.auth_token}')
+        response = self.client.get(reverse('metrics'))
+        eq_(response.status_code, 200)
+        eq_(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        text = response.content.decode()
+        ok_('vetclinic_request_queries_count{view="AnimalViewSet",action="list"} 1\n' in text, text)
+        # scrapes aren't profiled themselves
+        ok_('MetricsView' not in text)
@@ -0,0 +1,173 @@
+"""Query counts must not grow with the data behind any list or detail route"""
+
+import contextlib
+from unittest import mock
+
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db import transaction
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from drfdemo import api_urls as core_urls
+from drfdemo.users.models import User
+from drfdemo.users.test.factories import UserFactory
+from .factories import (
+    AnimalFactory, AppointmentFactory, BreedFactory, ClientFactory,
+    SpeciesFactory, VeterinarianFactory, top_of_the_hour,
+)
+from .querycount import track_queries
+from .. import models, urls, views
+
+SIZES = (1, 10, 100)
+ROUTERS = (
+    ('/api/v1/core/', core_urls.router),
+    ('/api/v1/vetclinic/', urls.router),
+)
+
+
+def seed_clients(count):
+    return ClientFactory.create_batch(count)[0].pk
+
+
+def seed_species(count):
+    technicians = UserFactory.create_batch(count)
+    species = SpeciesFactory.create_batch(count)
+    for instance in species:
+        instance.technicians.set(technicians[:2])
+    # the detail route gets the big collection
+    species[0].technicians.set(technicians)
+    return species[0].pk
+
+
+def seed_breeds(count):
+    breeds = BreedFactory.create_batch(count)
+    technician = UserFactory()
+    for breed in breeds:
+        breed.species.technicians.add(technician)
+    return breeds[0].pk
+
+
+def seed_animals(count):
+    animals = AnimalFactory.create_batch(count)
+    technician = UserFactory()
+    for animal in animals:
+        animal.species.technicians.add(technician)
+    veterinarian = VeterinarianFactory()
+    for hour in range(count):
+        AppointmentFactory(
+            animal=animals[0], veterinarian=veterinarian,
+            time=top_of_the_hour(hours_from_now=hour + 1),
+        )
+    return animals[0].pk
+
+
+def seed_users(count):
+    return UserFactory.create_batch(count)[0].pk
+
+
+def seed_veterinarians(count):
+    VeterinarianFactory.create_batch(count)
+
+
+SEEDERS = {
+    models.Client: seed_clients,
+    models.Species: seed_species,
+    models.Breed: seed_breeds,
+    models.Animal: seed_animals,
+    User: seed_users,
+}
+# viewsets without a queryset to tell us what to seed
+VIEWSET_SEEDERS = {
+    views.FreeSlotViewSet: seed_veterinarians,
+}
+LIST_PARAMS = {
+    views.FreeSlotViewSet: lambda: {
+        'start': top_of_the_hour(1).isoformat(),
+        'end': top_of_the_hour(48).isoformat(),
+        'limit': 100,
+    },
+}
+
+
+def routes():
+    """``(url, viewset, action)`` for every list and retrieve route"""
+    for mount, router in ROUTERS:
+        for prefix, viewset, _ in router.registry:
+            for action in ('list', 'retrieve'):
+                if hasattr(viewset, action):
+                    yield f'{mount}{prefix}/', viewset, action
+
+
+@override_settings(VETCLINIC_RESPONSE_CACHE_TIMEOUT=0, VETCLINIC_PROFILING_SAMPLE_RATE=0)
+class TestQueryCounts(APITestCase):
+    """
+    Every route runs the same queries for one row as for a hundred.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+
+    def seeder(self, viewset):
+        if viewset in VIEWSET_SEEDERS:
+            return VIEWSET_SEEDERS[viewset]
+        return SEEDERS[viewset.queryset.model]
+
+    def count_queries(self, url, params):
+        with track_queries() as tracker:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return tracker.paths
+
+    def check_route(self, url, viewset, action):
+        seed = self.seeder(viewset)
+        params = LIST_PARAMS.get(viewset, dict)() if action == 'list' else {}
+        pagination_class = getattr(viewset, 'pagination_class', None)
+        counts = []
+        with contextlib.ExitStack() as stack:
+            if pagination_class is not None:
+                # every row on one page, or the page size hides the growth
+                stack.enter_context(mock.patch.object(
+                    pagination_class, 'page_size', sum(SIZES) * 2))
+            for size in SIZES:
+                pk = seed(size)
+                detail_url = url if action == 'list' else f'{url}{pk}/'
+                counts.append(self.count_queries(detail_url, params))
+        paths = sorted(set().union(*counts))
+        growing = [
+            '{}: {} queries'.format(
+                path, ' -> '.join(str(count[path]) for count in counts))
+            for path in paths
+            # the first request also warms up per-process caches
+            if any(count[path] > counts[0][path] for count in counts[1:])
+        ]
+        if growing:
+            self.fail(
+                f'{viewset.__name__}.{action} ({url}) queries grow with '
+                f'{" -> ".join(map(str, SIZES))} rows:\n  ' + '\n  '.join(growing)
+            )
+
+    def check_all_routes(self):
+        for url, viewset, action in routes():
+            with self.subTest(viewset=viewset.__name__, action=action):
+                # each route starts from an empty table
+                with transaction.atomic():
+                    self.check_route(url, viewset, action)
+                    transaction.set_rollback(True)
+
+    def test_without_appointments_permission(self):
+        self.check_all_routes()
+
+    def test_with_appointments_permission(self):
+        self.user.user_permissions.add(Permission.objects.get(
+            codename='see_animal_appointments_with_animal'))
+        self.check_all_routes()
+
+    def test_covers_every_router(self):
+        covered = {(viewset, action) for _, viewset, action in routes()}
+        for viewset, action in [(views.AnimalViewSet, 'retrieve'),
+                                (views.FreeSlotViewSet, 'list'),
+                                (core_urls.UserViewSet, 'retrieve')]:
+            self.assertIn((viewset, action), covered)
@@ -0,0 +1,157 @@
+import random
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from nose.tools import eq_, ok_
+
+from drfdemo import readiness
+from drfdemo.config import ApiWorker, Production
+from drfdemo.users.test.factories import UserFactory
+from ..management.commands.profile_imports import parse_importtime
+
+
+def not_ready():
+    readiness._state.update(ready=False, problems=['not checked yet'], checked=None, cold_start={})
+
+
+@override_settings(STARTUP_BACKOFF_INITIAL=0.1, STARTUP_BACKOFF_MAX=5)
+class TestWaitingForTheDatabase(TestCase):
+
+    def test_backoff(self):
+        random.seed(2018)
+        delays = readiness.backoff(0.1, 5)
+        ceilings = [0.1, 0.2, 0.4, 0.8, 1.6, 3.2, 5, 5, 5]
+        taken = [next(delays) for _ in ceilings]
+        ok_(all(0 <= delay <= ceiling for delay, ceiling in zip(taken, ceilings)), taken)
+        # jittered, not in lockstep
+        eq_(len(set(taken)), len(taken))
+
+    def test_retries_until_it_connects(self):
+        slept = []
+        failures = [OperationalError('starting up')] * 3 + [None]
+        with mock.patch.object(connection, 'ensure_connection', side_effect=failures):
+            ok_(readiness.wait_for_database(30, sleep=slept.append))
+        eq_(len(slept), 3)
+
+    def test_gives_up(self):
+        slept = []
+        with mock.patch.object(connection, 'ensure_connection', side_effect=OperationalError):
+            with mock.patch('time.monotonic', side_effect=[0, 1, 2, 11]):
+                ok_(not readiness.wait_for_database(10, sleep=slept.append))
+        eq_(len(slept), 2)
+
+
+class TestPrepare(TestCase):
+
+    def setUp(self):
+        not_ready()
+        self.addCleanup(not_ready)
+
+    def test_ready(self):
+        timings = {}
+        eq_(readiness.prepare(warm_up=True, timings=timings), [])
+        eq_(set(timings), {'database', 'migrations', 'urls', 'serializers', 'connections'})
+        ok_(readiness.is_ready())
+
+    def test_unapplied_migrations(self):
+        eq_(readiness.unapplied_migrations(), [])
+        with mock.patch.object(readiness, 'unapplied_migrations', return_value=['vetclinic.9999_new']):
+            eq_(readiness.prepare(), ['unapplied migrations: vetclinic.9999_new'])
+        ok_(not readiness._state['ready'])
+
+    def test_database_unreachable(self):
+        with mock.patch.object(readiness, 'wait_for_database', return_value=False):
+            eq_(readiness.prepare(), ['database unreachable'])
+
+    def test_startup(self):
+        with self.settings(STARTUP_TIMEOUT=0, STARTUP_WARM_UP=False):
+            readiness.startup(readiness.time.perf_counter())
+        eq_(set(readiness.cold_start()), {'database', 'migrations', 'total'})
+
+    def test_every_routed_serializer_warms_up(self):
+        ok_(any(view.__name__ == 'AnimalViewSet' for view in readiness.routed_views()))
+        readiness.warm_up_serializers()
+
+
+@override_settings(STARTUP_BACKOFF_MAX=5)
+class TestProbes(TestCase):
+
+    def setUp(self):
+        not_ready()
+        self.addCleanup(not_ready)
+
+    def test_healthz(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('healthz'))
+        eq_(response.status_code, 200)
+
+    def test_readyz(self):
+        with mock.patch.object(readiness, 'wait_for_database', return_value=False):
+            eq_(self.client.get(reverse('readyz')).status_code, 503)
+            # not checked again straight away
+            with mock.patch.object(readiness, 'prepare') as prepare:
+                response = self.client.get(reverse('readyz'))
+        prepare.assert_not_called()
+        eq_(response.status_code, 503)
+        eq_(response.json()['problems'], ['database unreachable'])
+        # it's ready once the checks pass
+        with mock.patch('time.monotonic', return_value=readiness.time.monotonic() + 6):
+            eq_(self.client.get(reverse('readyz')).status_code, 200)
+        # and then answers from memory
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('readyz'))
+        eq_(response.json()['status'], 'ready')
+
+
+class TestCommand(TestCase):
+
+    def setUp(self):
+        self.addCleanup(not_ready)
+
+    def test_ready(self):
+        call_command('wait_until_ready', stdout=mock.Mock())
+
+    def test_not_ready(self):
+        with mock.patch.object(readiness, 'wait_for_database', return_value=False):
+            with self.assertRaises(CommandError):
+                call_command('wait_until_ready', '--database-only', stdout=mock.Mock())
+            with self.assertRaises(CommandError):
+                call_command('wait_until_ready', stdout=mock.Mock())
+
+
+class TestApiWorker(TestCase):
+    """
+    The API-only configuration leaves out what only the admin, the docs and
+    the browsable API use, and the API works without it.
+    """
+
+    def test_configuration(self):
+        for app in ('django.contrib.admin', 'rest_framework_swagger', 'storages'):
+            ok_(app in Production.INSTALLED_APPS)
+            ok_(app not in ApiWorker.INSTALLED_APPS)
+        ok_('drfdemo.users' in ApiWorker.INSTALLED_APPS)
+        eq_(ApiWorker.VETCLINIC_BROWSABLE_API, False)
+
+    @override_settings(ROOT_URLCONF='drfdemo.api_urls')
+    def test_urls(self):
+        user = UserFactory()
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {user.auth_token}'
+        eq_(self.client.get(reverse('animal-list')).status_code, 200)
+        eq_(self.client.get(reverse('healthz')).status_code, 200)
+        eq_(self.client.get('/admin/').status_code, 404)
+        eq_(self.client.get('/docs').status_code, 404)
+
+    def test_parse_importtime(self):
+        stderr = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |   django.utils\n'
+            'Some log line\n'
+            'import time:      1500 |       1620 | django\n'
+        )
+        eq_(list(parse_importtime(stderr)), [
+            ('django.utils', 0.00012, 0.00012), ('django', 0.0015, 0.00162),
+        ])
@@ -0,0 +1,156 @@
+import datetime
+import decimal
+import io
+import json
+import uuid
+from collections import OrderedDict
+from unittest import mock, skipIf
+
+from django.test import TestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from nose.tools import eq_, ok_
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from drfdemo.config.common import Common
+from drfdemo.users.test.factories import UserFactory
+from .factories import AnimalFactory, AppointmentFactory
+from .. import parsers, renderers
+from ..models import Animal
+
+EASTERN = timezone.get_fixed_timezone(-300)
+DATA = OrderedDict([
+    ('id', uuid.UUID('0b2a3e0c-7c1e-4d3b-9a0b-1f2e3d4c5b6a')),
+    ('date', datetime.date(2018, 10, 17)),
+    ('utc', datetime.datetime(2018, 10, 17, 9, 30, 15, 123456, tzinfo=timezone.utc)),
+    ('eastern', datetime.datetime(2018, 10, 17, 9, 30, tzinfo=EASTERN)),
+    ('naive', datetime.datetime(2018, 10, 17, 9, 30)),
+    ('time', datetime.time(9, 30, 15, 250000)),
+    ('duration', datetime.timedelta(minutes=30)),
+    ('price', decimal.Decimal('12.50')),
+    ('lazy', gettext_lazy('Animal')),
+    ('text', 'Zoë says  hi  "there"'),
+    ('numbers', [0, -1, 2 ** 63 - 1, 1.5, 0.1, True, None]),
+    # wider than orjson's 64 bits
+    ('huge', 2 ** 70),
+    ('nested', [{2: 'int key', 'b': []}, {}]),
+])
+
+
+class TestRenderer(TestCase):
+    """
+    FastJSONRenderer writes exactly the bytes JSONRenderer does.
+    """
+
+    def check_same(self, data, accepted_media_type=None, renderer_context=None):
+        eq_(
+            renderers.FastJSONRenderer().render(data, accepted_media_type, renderer_context),
+            JSONRenderer().render(data, accepted_media_type, renderer_context),
+        )
+
+    def test_types(self):
+        for key, value in DATA.items():
+            with self.subTest(key=key):
+                self.check_same({key: value})
+        self.check_same(DATA)
+
+    def test_exponents(self):
+        # spelled differently, but the same numbers
+        data = [1e-07, 1e+16, decimal.Decimal('1E-7')]
+        eq_(json.loads(renderers.FastJSONRenderer().render(data)),
+            json.loads(JSONRenderer().render(data)))
+
+    def test_queryset(self):
+        AnimalFactory.create_batch(2)
+        self.check_same(Animal.objects.values_list('id', 'name'))
+
+    def test_indent(self):
+        self.check_same(DATA, 'application/json; indent=4')
+        self.check_same(DATA, renderer_context={'indent': 2})
+
+    def test_none(self):
+        eq_(renderers.FastJSONRenderer().render(None), b'')
+
+    def test_stdlib_fallback(self):
+        with mock.patch.object(renderers, 'orjson', None):
+            self.check_same(DATA)
+
+    @skipIf(renderers.orjson is None, 'orjson is not installed')
+    def test_uses_orjson(self):
+        with mock.patch.object(renderers.orjson, 'dumps', wraps=renderers.orjson.dumps) as dumps:
+            renderers.FastJSONRenderer().render({'a': 1})
+        ok_(dumps.called)
+
+
+class TestParser(TestCase):
+    """
+    FastJSONParser reads what JSONParser does and fails the same way.
+    """
+
+    def parse(self, parser, body, encoding='utf-8'):
+        return parser.parse(io.BytesIO(body), parser_context={'encoding': encoding})
+
+    def test_same(self):
+        body = JSONRenderer().render(DATA)
+        eq_(self.parse(parsers.FastJSONParser(), body), self.parse(JSONParser(), body))
+        body = '["é"]'.encode('utf-16')
+        eq_(self.parse(parsers.FastJSONParser(), body, 'utf-16'), ['é'])
+
+    def test_errors(self):
+        for body in [b'{"a": ', b'[NaN]', b'[Infinity]']:
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError) as expected:
+                    self.parse(JSONParser(), body)
+                with self.assertRaises(ParseError) as raised:
+                    self.parse(parsers.FastJSONParser(), body)
+                eq_(str(raised.exception), str(expected.exception))
+
+
+class TestAPI(APITestCase):
+    """
+    Real responses match what the stock renderer makes of their data.
+    """
+
+    def setUp(self):
+        self.user = UserFactory(is_staff=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+
+    def check(self, url):
+        response = self.client.get(url, HTTP_ACCEPT='application/json')
+        eq_(response.status_code, 200)
+        ok_(isinstance(response.accepted_renderer, renderers.FastJSONRenderer))
+        eq_(response.content, JSONRenderer().render(response.data))
+
+    def test_pages(self):
+        AppointmentFactory.create_batch(3)
+        self.check(f'/api/v1/core/users/{self.user.pk}/')
+        self.check('/api/v1/vetclinic/clients/')
+        self.check('/api/v1/vetclinic/animals/')
+
+    def test_post(self):
+        response = self.client.post('/api/v1/vetclinic/clients/', {
+            'name': 'Zoë', 'address_line_1': '1 Main St', 'city': 'Philadelphia',
+            'state': 'PA', 'zip': '19107', 'phone': '215-555-0100',
+        }, format='json')
+        eq_(response.status_code, 201, response.content)
+        eq_(response.json()['name'], 'Zoë')
+
+
+class TestBrowsableAPISetting(TestCase):
+    """
+    VETCLINIC_BROWSABLE_API=no leaves only JSON to negotiate.
+    """
+
+    def renderers(self, browsable):
+        configuration = type('Configuration', (Common, ), {'VETCLINIC_BROWSABLE_API': browsable})
+        configuration.setup()
+        return configuration.REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES']
+
+    def test_setting(self):
+        eq_(self.renderers(True), Common.REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'])
+        eq_(self.renderers(False), ('vetclinic.renderers.FastJSONRenderer', ))
+        ok_('rest_framework.renderers.BrowsableAPIRenderer'
+            in Common.REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'])
@@ -0,0 +1,171 @@
+import random
+from collections import Counter
+from unittest import mock, skipIf
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from nose.tools import eq_, ok_
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from drfdemo import replicas
+from drfdemo.config import Production
+from drfdemo.users.test.factories import UserFactory
+from .factories import AnimalFactory
+from .. import models
+
+SPECIES = '/api/v1/vetclinic/species/'
+
+
+@override_settings(VETCLINIC_READ_REPLICAS={'replica': 1}, VETCLINIC_RESPONSE_CACHE_TIMEOUT=0)
+class TestReplicaRouting(TransactionTestCase):
+    """
+    With the Local configuration's second database as the replica, reads
+    land there and everything that has to see the latest writes doesn't.
+    """
+    multi_db = True
+
+    def setUp(self):
+        cache.clear()
+        replicas._lag.clear()
+        self.user = UserFactory(is_staff=True, is_superuser=True)
+        self.client = self.client_for(self.user)
+        models.Species.objects.create(name='On the primary')
+        models.Species.objects.using('replica').create(name='On the replica')
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {user.auth_token}')
+        return client
+
+    def species(self, client=None, **extra):
+        response = (client or self.client).get(SPECIES, **extra)
+        eq_(response.status_code, 200, response.content)
+        return sorted(result['name'] for result in response.data['results'])
+
+    def test_reads_go_to_the_replica(self):
+        # the token (only on the primary) was still found
+        eq_(self.species(), ['On the replica'])
+
+    def test_users_too(self):
+        user_url = f'/api/v1/core/users/{self.user.pk}/'
+        eq_(self.client.get(user_url).status_code, 404)
+        eq_(self.client.get(user_url, HTTP_X_READ_PRIMARY='1').status_code, 200)
+
+    def test_writes_go_to_the_primary_and_stick(self):
+        response = self.client.post('/api/v1/vetclinic/clients/', {
+            'name': 'New', 'address_line_1': '1 Main St', 'city': 'Philadelphia',
+            'state': 'PA', 'zip': '19107', 'phone': '215-555-0100',
+        }, format='json')
+        eq_(response.status_code, 201, response.content)
+        ok_(models.Client.objects.using('default').filter(name='New').exists())
+        ok_(not models.Client.objects.using('replica').exists())
+        # the writer reads from the primary for a while; everybody else doesn't
+        eq_(self.species(), ['On the primary'])
+        eq_(self.species(self.client_for(UserFactory())), ['On the replica'])
+        cache.clear()
+        eq_(self.species(), ['On the replica'])
+
+    def test_asking_for_the_primary(self):
+        eq_(self.species(HTTP_X_READ_PRIMARY='1'), ['On the primary'])
+        eq_(self.species(HTTP_X_READ_PRIMARY='0'), ['On the replica'])
+
+    def test_lagging_or_unreachable_replica(self):
+        for lag in (60, None):
+            with self.subTest(lag=lag):
+                with mock.patch.object(replicas, 'replica_lag', return_value=lag):
+                    eq_(self.species(), ['On the primary'])
+
+    def test_other_paths(self):
+        with override_settings(VETCLINIC_REPLICA_PATHS=('/api/v1/core/', )):
+            eq_(self.species(), ['On the primary'])
+
+    @override_settings(VETCLINIC_RESPONSE_CACHE_TIMEOUT=60)
+    def test_response_cache_is_filled_from_the_primary(self):
+        # otherwise a lagging replica's rows would be cached as current
+        for expected in ('MISS', 'HIT'):
+            response = self.client.get(SPECIES)
+            eq_(response['X-Cache'], expected)
+            eq_([result['name'] for result in response.data['results']], ['On the primary'])
+        # still read from the replica once it's out of the cache
+        with override_settings(VETCLINIC_RESPONSE_CACHE_TIMEOUT=0):
+            eq_(self.species(), ['On the replica'])
+
+    @override_settings(VETCLINIC_ANIMAL_SUMMARY_LISTS=True)
+    def test_summaries_are_rebuilt_from_the_primary(self):
+        animal = AnimalFactory(client__name='Old owner')
+        # the replica has the animal but hasn't seen the rename yet
+        for instance in (animal.species, animal.breed, animal.client, animal):
+            instance.save(using='replica')
+        animal.client.name = 'New owner'
+        animal.client.save()
+        response = self.client.get('/api/v1/vetclinic/animals/')
+        eq_(response.status_code, 200, response.content)
+        summary = models.AnimalSummary.objects.using('default').get(animal=animal)
+        eq_(summary.client_name, 'New owner')
+
+
+class TestReplicaRouter(TransactionTestCase):
+
+    def setUp(self):
+        replicas._state.read_db = 'replica'
+        self.addCleanup(setattr, replicas._state, 'read_db', None)
+        self.router = replicas.ReplicaRouter()
+
+    def test_apps(self):
+        eq_(self.router.db_for_read(models.Species), 'replica')
+        eq_(self.router.db_for_read(Token), 'default')
+
+    def test_writing_sends_reads_to_the_primary(self):
+        eq_(self.router.db_for_write(models.Species), 'default')
+        eq_(self.router.db_for_read(models.Species), 'default')
+
+    def test_transactions_stay_on_the_primary(self):
+        with transaction.atomic():
+            eq_(self.router.db_for_read(models.Species), 'default')
+
+    def test_no_request(self):
+        replicas._state.read_db = None
+        eq_(self.router.db_for_read(models.Species), 'default')
+
+
+class TestChoosingReplicas(TransactionTestCase):
+
+    @override_settings(VETCLINIC_READ_REPLICAS={'a': 3, 'b': 1, 'off': 0, 'behind': 5, 'down': 5})
+    def test_weights_and_lag(self):
+        lags = {'a': 0, 'b': 1, 'behind': 60, 'down': None}
+        random.seed(2018)
+        with mock.patch.object(replicas, 'replica_lag', side_effect=lags.get):
+            chosen = Counter(replicas.choose_replica() for _ in range(4000))
+        eq_(set(chosen), {'a', 'b'})
+        ok_(2.5 < chosen['a'] / chosen['b'] < 3.5, chosen)
+
+    @override_settings(VETCLINIC_READ_REPLICAS={'a': 1})
+    def test_none_usable(self):
+        with mock.patch.object(replicas, 'replica_lag', return_value=None):
+            eq_(replicas.choose_replica(), None)
+
+    @skipIf(connection.vendor != 'postgresql', 'replication lag is a Postgres query')
+    def test_lag_query(self):
+        replicas._lag.clear()
+        # not in recovery, so not behind
+        eq_(replicas.replica_lag('replica'), 0.0)
+        with self.assertNumQueries(0, using='replica'):
+            replicas.replica_lag('replica')
+
+
+class TestProductionSettings(SimpleTestCase):
+
+    def test_replicas_need_a_shared_cache(self):
+        # otherwise a client's next request may land on a worker that never
+        # heard about its write, and read from a replica that hasn't either
+        settings = {name: 0 for name in Production.SHARED_CACHE_SETTINGS}
+        configuration = type('Configured', (Production, ), dict(
+            settings, SHARED_CACHE=False, VETCLINIC_READ_REPLICAS={'replica1': 1},
+        ))
+        with self.assertRaises(ImproperlyConfigured):
+            configuration.check_shared_cache()
+        configuration.SHARED_CACHE = True
+        configuration.check_shared_cache()
@@ -0,0 +1,126 @@
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.signals import request_finished
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from nose.tools import eq_, ok_
+
+from drfdemo import schema
+from drfdemo.users.test.factories import UserFactory
+
+MISSING = os.path.join(tempfile.gettempdir(), 'no-such-schema.json')
+
+
+class TestStoredSchema(TestCase):
+
+    def setUp(self):
+        schema.forget_stored_schema()
+        self.addCleanup(schema.forget_stored_schema)
+        self.user = UserFactory()
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {self.user.auth_token}'
+
+    def test_up_to_date(self):
+        with open(settings.VETCLINIC_OPENAPI_SCHEMA, 'rb') as schema_file:
+            stored = schema_file.read()
+        ok_(stored == schema.generate_schema(), 'Run manage.py generate_schema')
+
+    def test_every_endpoint(self):
+        paths = json.loads(schema.generate_schema())['paths']
+        # including the ones only staff can use
+        ok_('/api/v1/vetclinic/animals/bulk/' in paths)
+        ok_('/docs' not in paths)
+
+    def test_docs(self):
+        with mock.patch.object(schema, 'generate_schema') as generate:
+            response = self.client.get(reverse('docs'), HTTP_ACCEPT='text/html')
+            eq_(response.status_code, 200)
+            ok_(b'window.drsSpec = {' in response.content)
+            eq_(self.client.get(reverse('docs'), HTTP_ACCEPT='text/html').status_code, 200)
+        generate.assert_not_called()
+
+    def test_docs_finish_once(self):
+        # rendering the UI mustn't end the request (and close the database
+        # connection) before the response goes out
+        finished = []
+
+        def receiver(**kwargs):
+            finished.append(kwargs)
+
+        request_finished.connect(receiver)
+        self.addCleanup(request_finished.disconnect, receiver)
+        eq_(self.client.get(reverse('docs'), HTTP_ACCEPT='text/html').status_code, 200)
+        eq_(len(finished), 1)
+
+    def test_openapi(self):
+        stored = schema.stored_schema()
+        response = self.client.get(reverse('docs'), {'format': 'openapi'})
+        eq_(response.status_code, 200)
+        eq_(response.content, stored.content)
+        eq_(response['ETag'], f'"{stored.hash}"')
+        eq_(set(response['Cache-Control'].split(', ')), {'private', 'max-age=300'})
+        eq_(response['Link'], f'</docs/openapi.{stored.hash}.json>; rel="describedby"')
+        response = self.client.get(
+            reverse('docs'), {'format': 'openapi'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        eq_(response.status_code, 304)
+
+    def test_versioned(self):
+        stored = schema.stored_schema()
+        url = reverse('openapi-schema', kwargs={'version': stored.hash})
+        response = self.client.get(url)
+        eq_(response.status_code, 200)
+        eq_(response.content, stored.content)
+        eq_(set(response['Cache-Control'].split(', ')), {'private', 'max-age=31536000', 'immutable'})
+        # whatever the client says it accepts
+        eq_(self.client.get(url, HTTP_ACCEPT='application/json').content, stored.content)
+        # an old version sends you to the current one
+        response = self.client.get(reverse('openapi-schema', kwargs={'version': 'abc123'}))
+        eq_((response.status_code, response['Location']), (302, url))
+
+    def test_anonymous(self):
+        del self.client.defaults['HTTP_AUTHORIZATION']
+        stored = schema.stored_schema()
+        response = self.client.get(reverse('docs'), HTTP_ACCEPT='text/html')
+        eq_(response.status_code, 403)
+        # the UI, with the login link and no endpoints
+        ok_(b'/api/v1/' not in response.content)
+        ok_(reverse('rest_framework:login').encode() in response.content)
+        for url, params in [
+                (reverse('docs'), {'format': 'openapi'}),
+                (reverse('openapi-schema', kwargs={'version': stored.hash}), {}),
+        ]:
+            with self.subTest(url=url):
+                response = self.client.get(url, params)
+                eq_(response.status_code, 403)
+                ok_(b'/api/v1/' not in response.content)
+
+    @override_settings(VETCLINIC_OPENAPI_SCHEMA=MISSING)
+    def test_generated_once_without_the_file(self):
+        with mock.patch.object(schema, 'generate_schema', return_value=b'{}') as generate:
+            for _ in range(2):
+                eq_(self.client.get(reverse('docs'), {'format': 'openapi'}).content, b'{}')
+        eq_(generate.call_count, 1)
+
+
+class TestCommand(TestCase):
+
+    def test_check(self):
+        call_command('generate_schema', '--check', stdout=mock.Mock())
+        with tempfile.NamedTemporaryFile(suffix='.json') as stale:
+            stale.write(b'{}')
+            stale.flush()
+            with self.settings(VETCLINIC_OPENAPI_SCHEMA=stale.name):
+                with self.assertRaises(CommandError):
+                    call_command('generate_schema', '--check', stdout=mock.Mock())
+                call_command('generate_schema', stdout=mock.Mock())
+                call_command('generate_schema', '--check', stdout=mock.Mock())
+
+    @override_settings(VETCLINIC_OPENAPI_SCHEMA=MISSING)
+    def test_check_missing(self):
+        with self.assertRaises(CommandError):
+            call_command('generate_schema', '--check', stdout=mock.Mock())
@@ -0,0 +1,152 @@
+from unittest import mock, skipIf
+from urllib.parse import urlsplit
+
+from django.db import connection
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from nose.tools import eq_, ok_
+from rest_framework.test import APITestCase
+
+from drfdemo.users.test.factories import UserFactory
+from .factories import AnimalFactory, SpeciesFactory
+from .. import models, search
+
+
+class TestHasRequiredTrigram(TestCase):
+    """
+    Only patterns that pin down three characters can use the index.
+    """
+
+    def test_indexable(self):
+        for pattern in ['luna', '^Lun.*a', '(fido|rex1)', '(rex)+', 'Sp[o]t{1}',
+                        'ab(c)', 'bella|luna']:
+            with self.subTest(pattern=pattern):
+                ok_(search.has_required_trigram(pattern))
+
+    def test_unindexable(self):
+        for pattern in ['^a', 'lu.a', '[a-z]+x', 'luna|x', 'a|b|(fido)',
+                        '(fido)?', 'a*', '...', '(', '']:
+            with self.subTest(pattern=pattern):
+                ok_(not search.has_required_trigram(pattern))
+
+
+class TestRegexGuard(APITestCase):
+    """
+    Unindexable regexes are refused once a table is big enough.
+    """
+
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+        AnimalFactory.create_batch(3)
+
+    def get(self, **params):
+        return self.client.get(reverse('animal-list'), params)
+
+    @override_settings(VETCLINIC_REGEX_SCAN_LIMIT=2)
+    def test_refused_above_the_limit(self):
+        for param in ['name__regex', 'name__iregex', 'breed__species__name__iregex']:
+            with self.subTest(param=param):
+                response = self.get(**{param: '^a'})
+                eq_(response.status_code, 400, response.content)
+                ok_(response.data)
+
+    @override_settings(VETCLINIC_REGEX_SCAN_LIMIT=2)
+    def test_indexable_patterns_allowed_above_the_limit(self):
+        eq_(self.get(name__regex='^Lun.*a').status_code, 200)
+
+    @override_settings(VETCLINIC_REGEX_SCAN_LIMIT=3)
+    def test_allowed_on_small_tables(self):
+        eq_(self.get(name__regex='^a').status_code, 200)
+
+    def test_counted_without_an_estimate(self):
+        with mock.patch.object(search, 'estimated_rows', return_value=None):
+            with self.settings(VETCLINIC_REGEX_SCAN_LIMIT=3):
+                eq_(self.get(name__regex='^a').status_code, 200)
+            with self.settings(VETCLINIC_REGEX_SCAN_LIMIT=2):
+                eq_(self.get(name__regex='^a').status_code, 400)
+
+    @skipIf(connection.vendor != 'postgresql', 'planner estimates are Postgres only')
+    def test_estimate_used_once_analyzed(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE vetclinic_animal')
+        with mock.patch.object(search, 'estimated_rows', wraps=search.estimated_rows) as estimated:
+            with self.settings(VETCLINIC_REGEX_SCAN_LIMIT=2):
+                eq_(self.get(name__regex='^a').status_code, 400)
+        eq_(estimated.call_count, 1)
+        eq_(search.estimated_rows(models.Animal.objects.all()), 3)
+
+    @skipIf(connection.vendor != 'postgresql', 'planner estimates are Postgres only')
+    def test_never_analyzed(self):
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TEMPORARY TABLE never_analyzed (id int)')
+            cursor.execute('INSERT INTO never_analyzed VALUES (1), (2)')
+        never_analyzed = mock.Mock(db='default')
+        never_analyzed.model._meta.db_table = 'never_analyzed'
+        eq_(search.estimated_rows(never_analyzed), None)
+
+
+class TestRankedSearch(APITestCase):
+    """
+    ?search= returns the best matches first, and pages through them.
+    """
+
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+        for name in ['Aluna', 'Rex', 'Lunar', 'Luna', 'Bella']:
+            AnimalFactory(name=name)
+
+    def names(self, url, **params):
+        response = self.client.get(url, params)
+        eq_(response.status_code, 200, response.content)
+        return [row['name'] for row in response.data['results']], response
+
+    def page_through(self, url, **params):
+        seen = []
+        names, response = self.names(url, **params)
+        # a cursor that doesn't move would go round forever
+        for _ in range(20):
+            seen.extend(names)
+            if not response.data['next']:
+                return seen
+            url = urlsplit(response.data['next'])
+            response = self.client.get(f'{url.path}?{url.query}')
+            names = [row['name'] for row in response.data['results']]
+        self.fail(f'still paging after {seen}')
+
+    def test_ranked(self):
+        names, _ = self.names(reverse('animal-list'), search='luna')
+        eq_(names, ['Luna', 'Lunar', 'Aluna'])
+
+    def test_pages_follow_the_ranking(self):
+        for compact in (False, True):
+            with self.subTest(compact=compact), \
+                    override_settings(VETCLINIC_COMPACT_LISTS=compact):
+                seen = self.page_through(reverse('animal-list'), search='luna', page_size=1)
+                eq_(seen, ['Luna', 'Lunar', 'Aluna'])
+
+    @skipIf(connection.vendor != 'postgresql', 'trigram similarity needs Postgres')
+    def test_pages_through_fractional_and_tied_ranks(self):
+        # similarity() ranks are reals like 0.5714286; the cursor has to
+        # seek past them exactly, ties included
+        for name in ['Lunas', 'Lunaria', 'Lunas', 'Alunas']:
+            AnimalFactory(name=name)
+        everything, _ = self.names(reverse('animal-list'), search='luna')
+        eq_(len(everything), 7)
+        for page_size in (1, 2, 3):
+            with self.subTest(page_size=page_size):
+                eq_(self.page_through(
+                    reverse('animal-list'), search='luna', page_size=page_size,
+                ), everything)
+
+    def test_without_search_order_is_unchanged(self):
+        names, _ = self.names(reverse('animal-list'))
+        eq_(names, sorted(names))
+
+    def test_species(self):
+        SpeciesFactory(name='Cat')
+        SpeciesFactory(name='Catfish')
+        names, _ = self.names('/api/v1/vetclinic/species/', search='cat')
+        eq_(names, ['Cat', 'Catfish'])
@@ -0,0 +1,176 @@
+import datetime
+import io
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from nose.tools import eq_, ok_
+from rest_framework.test import APITestCase
+
+from drfdemo.users.test.factories import UserFactory
+from .factories import (
+    AnimalFactory, AppointmentFactory, AppointmentViewerFactory,
+    VeterinarianFactory, top_of_the_hour,
+)
+from .. import models, summaries
+
+ANIMALS = '/api/v1/vetclinic/animals/'
+
+
+class TestMaintenance(APITestCase):
+    """
+    Summaries follow every write to the data they copy.
+    """
+
+    def setUp(self):
+        self.animal = AnimalFactory()
+
+    def summary(self):
+        return models.AnimalSummary.objects.get(animal=self.animal)
+
+    def test_created(self):
+        summary = self.summary()
+        eq_(summary.client_name, self.animal.client.name)
+        eq_(summary.species_name, self.animal.species.name)
+        eq_(summary.breed_name, self.animal.breed.name)
+        eq_(summary.next_appointment, None)
+        eq_(summary.appointment_count, 0)
+
+    def test_renames(self):
+        for instance in (self.animal.client, self.animal.species, self.animal.breed):
+            instance.name = 'Renamed'
+            instance.save()
+        summary = self.summary()
+        eq_((summary.client_name, summary.species_name, summary.breed_name),
+            ('Renamed', 'Renamed', 'Renamed'))
+
+    def test_appointments(self):
+        AppointmentFactory(animal=self.animal, time=top_of_the_hour(hours_from_now=-24))
+        later = AppointmentFactory(animal=self.animal, time=top_of_the_hour(hours_from_now=5))
+        sooner = AppointmentFactory(animal=self.animal, time=top_of_the_hour(hours_from_now=2))
+        eq_(self.summary().appointment_count, 3)
+        eq_(self.summary().next_appointment, sooner.time)
+        sooner.delete()
+        eq_(self.summary().appointment_count, 2)
+        eq_(self.summary().next_appointment, later.time)
+
+    def test_deleting_an_animal(self):
+        AppointmentFactory.create_batch(2, animal=self.animal)
+        self.animal.delete()
+        ok_(not models.AnimalSummary.objects.exists())
+
+    def test_batch_booking(self):
+        user = UserFactory(is_staff=True, is_superuser=True)
+        self.client.force_login(user)
+        vet = VeterinarianFactory()
+        response = self.client.post(f'{ANIMALS}book_appointments/', [
+            {'animal': self.animal.pk, 'veterinarian': vet.pk,
+             'time': top_of_the_hour(hours_from_now=hour).isoformat()}
+            for hour in (3, 4)
+        ], format='json')
+        eq_(response.status_code, 200, response.content)
+        eq_(self.summary().appointment_count, 2)
+
+    def test_bulk_update(self):
+        user = UserFactory(is_staff=True, is_superuser=True)
+        self.client.force_login(user)
+        other = AnimalFactory()
+        response = self.client.patch(f'{ANIMALS}bulk/', [
+            {'id': self.animal.pk, 'client': other.client_id},
+        ], format='json')
+        eq_(response.status_code, 200, response.content)
+        eq_(self.summary().client_name, other.client.name)
+
+
+class TestConsistency(TestCase):
+    """
+    The checker finds summaries that writes skipping signals left behind.
+    """
+
+    def setUp(self):
+        self.animals = AnimalFactory.create_batch(3)
+
+    def check(self, *args):
+        out = io.StringIO()
+        call_command('check_animal_summaries', *args, stdout=out)
+        return out.getvalue()
+
+    def test_consistent(self):
+        eq_(list(summaries.inconsistencies()), [])
+        ok_('0 summaries wrong' in self.check())
+
+    def test_inconsistent(self):
+        models.Client.objects.filter(pk=self.animals[0].client_id).update(name='Renamed')
+        models.AnimalSummary.objects.filter(animal=self.animals[1]).delete()
+        # the next appointment has come and gone
+        models.AnimalSummary.objects.filter(animal=self.animals[2]).update(
+            next_appointment=now() - datetime.timedelta(hours=1))
+        eq_(list(summaries.inconsistencies(chunk_size=2)), [
+            (self.animals[0].pk, ['client_name']),
+            (self.animals[1].pk, None),
+            (self.animals[2].pk, ['next_appointment']),
+        ])
+        with self.assertRaises(CommandError):
+            self.check()
+        ok_('3 summaries wrong: 1 missing, 2 out of date' in self.check('--fix'))
+        eq_(list(summaries.inconsistencies()), [])
+
+
+@override_settings(VETCLINIC_ANIMAL_SUMMARY_LISTS=True)
+class TestSummaryList(APITestCase):
+    """
+    With VETCLINIC_ANIMAL_SUMMARY_LISTS, the list reads the summary table.
+    """
+
+    def setUp(self):
+        self.animal = AnimalFactory(name='Aardvark')
+
+    def login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {user.auth_token}')
+
+    def test_list(self):
+        self.login(UserFactory())
+        response = self.client.get(ANIMALS)
+        eq_(response.status_code, 200)
+        eq_(response.data['results'][0], {
+            'id': self.animal.pk,
+            'name': 'Aardvark',
+            'client': self.animal.client.name,
+            'species': self.animal.species.name,
+            'breed': self.animal.breed.name,
+            'approx_year_of_birth': self.animal.approx_year_of_birth,
+            'first_visit_date': None,
+            'updated_at': response.data['results'][0]['updated_at'],
+        })
+
+    def test_appointments(self):
+        appointment = AppointmentFactory(animal=self.animal, time=top_of_the_hour(hours_from_now=3))
+        self.login(AppointmentViewerFactory())
+        result = self.client.get(ANIMALS).data['results'][0]
+        eq_(result['appointment_count'], 1)
+        eq_(result['next_appointment'], appointment.time.strftime('%Y-%m-%dT%H:%M:%S%z'))
+
+    def test_filters(self):
+        AnimalFactory(name='Zebra')
+        self.login(UserFactory())
+        response = self.client.get(ANIMALS, {'name': 'Zebra'})
+        eq_([result['name'] for result in response.data['results']], ['Zebra'])
+
+    def test_self_healing(self):
+        models.AnimalSummary.objects.all().delete()
+        self.login(UserFactory())
+        eq_(self.client.get(ANIMALS).data['results'][0]['client'], self.animal.client.name)
+        ok_(models.AnimalSummary.objects.filter(animal=self.animal).exists())
+
+    def test_queries_dont_grow(self):
+        self.login(UserFactory())
+        self.client.get(ANIMALS)
+        counts = []
+        for _ in range(2):
+            AnimalFactory.create_batch(3)
+            with CaptureQueriesContext(connection) as queries:
+                eq_(self.client.get(ANIMALS).status_code, 200)
+            counts.append(len(queries))
+        eq_(counts[0], counts[1])
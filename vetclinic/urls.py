@@ -13,5 +13,8 @@ router.register(
 router.register('species', views.SpeciesViewSet)
 router.register('clients', views.ClientViewSet)
 router.register('animals', views.AnimalViewSet)
+router.register(
+    'free_slots', views.FreeSlotViewSet, basename='free-slot',
+)
 
 urlpatterns = router.urls
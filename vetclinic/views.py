@@ -1,44 +1,139 @@
 import datetime
 
+from django.conf import settings
 from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
 from django.utils.timezone import now
-from rest_framework_filters.backends import DjangoFilterBackend
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.viewsets import ModelViewSet, ViewSet
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
+from rest_framework import status
 from rest_framework.response import Response
 
+from drfdemo.users.models import User
+from drfdemo.users.permissions import RequestPermissionCacheMixin
+
+from . import availability
+from .caches import CachedResponseMixin
+from .conditional import ConditionalRetrieveMixin
+from . import booking
+from . import compact
+from . import export
 from . import models
 from . import serializers
 from . import filters
+from . import pagination
+from . import planning
+from .profiling import ProfiledSerializerMixin
+from . import search
+from . import summaries
+
+
+class CompactListMixin:
+    """Render list() through a precompiled ValuesPlan
+
+    Opt in with VETCLINIC_COMPACT_LISTS. The output is the same as the
+    serializer's; serializers the plan can't reproduce are used as normal.
+    """
+
+    def list(self, request, *args, **kwargs):
+        plan = None
+        if settings.VETCLINIC_COMPACT_LISTS:
+            plan = compact.plan_for(self.get_serializer_class())
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        queryset = plan.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(plan.serialize(list(queryset)))
+        return self.get_paginated_response(plan.serialize(page))
+
+
+class SummaryListMixin:
+    """Render the animal list from AnimalSummary
+
+    Opt in with VETCLINIC_ANIMAL_SUMMARY_LISTS. Items carry the names of the
+    animal's client, species and breed rather than the nested objects, and
+    for users who can see appointments, the next one and a count instead of
+    the list. Filters, search and pagination work as usual.
+    """
 
+    def list(self, request, *args, **kwargs):
+        if not settings.VETCLINIC_ANIMAL_SUMMARY_LISTS:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(
+            models.Animal.objects.select_related('summary'))
+        page = self.paginate_queryset(queryset)
+        animals = list(queryset) if page is None else page
+        summaries.refresh_stale(animals)
+        if self.has_perm('vetclinic.see_animal_appointments_with_animal'):
+            serializer_class = serializers.AnimalSummaryWithAppointmentsSerializer
+        else:
+            serializer_class = serializers.AnimalSummarySerializer
+        data = serializer_class(
+            animals, many=True, context=self.get_serializer_context()).data
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
 
-class ClientViewSet(ModelViewSet):
+
+class ClientViewSet(ProfiledSerializerMixin, RequestPermissionCacheMixin,
+                    ConditionalRetrieveMixin, CompactListMixin, ModelViewSet):
     serializer_class = serializers.ClientSerializer
     queryset = models.Client.objects.all()
+    pagination_class = pagination.ClientPagination
 
 
-class SpeciesViewSet(ModelViewSet):
+class SpeciesViewSet(ProfiledSerializerMixin, RequestPermissionCacheMixin,
+                     ConditionalRetrieveMixin, CachedResponseMixin, ModelViewSet):
     serializer_class = serializers.SpeciesSerializer
     queryset = models.Species.objects.prefetch_related('technicians')
+    filter_backends = (search.TrigramSearchFilter, )
+    search_fields = ('name', )
 
 
-class BreedViewSetWithWritablePK(ModelViewSet):
+class BreedViewSetWithWritablePK(ProfiledSerializerMixin, RequestPermissionCacheMixin,
+                                 ConditionalRetrieveMixin, CachedResponseMixin,
+                                 ModelViewSet):
     serializer_class = serializers.BreedSerializerWithWritablePK
     queryset = models.Breed.objects.select_related('species')
+    version_fields = ('updated_at', 'species__updated_at')
+    filter_backends = (search.TrigramSearchFilter, )
+    search_fields = ('name', )
 
 
-class BreedViewSetWithWritableNestedField(ModelViewSet):
+class BreedViewSetWithWritableNestedField(ProfiledSerializerMixin,
+                                          RequestPermissionCacheMixin,
+                                          ConditionalRetrieveMixin, CachedResponseMixin,
+                                          ModelViewSet):
     serializer_class = serializers.BreedSerializerWithWritableSerializer
-    queryset = models.Breed.objects.select_related('species')
+    # the nested SpeciesSerializer lists technicians
+    queryset = models.Breed.objects.select_related(
+        'species',
+    ).prefetch_related('species__technicians')
+    version_fields = ('updated_at', 'species__updated_at')
+    filter_backends = (search.TrigramSearchFilter, )
+    search_fields = ('name', )
 
 
-class BreedViewSetWithSeparateIDField(ModelViewSet):
+class BreedViewSetWithSeparateIDField(ProfiledSerializerMixin,
+                                      RequestPermissionCacheMixin,
+                                      ConditionalRetrieveMixin, CachedResponseMixin,
+                                      ModelViewSet):
     serializer_class = serializers.BreedSerializerWithSeparateWritablePK
-    queryset = models.Breed.objects.select_related('species')
+    # the nested SpeciesSerializer lists technicians
+    queryset = models.Breed.objects.select_related(
+        'species',
+    ).prefetch_related('species__technicians')
+    version_fields = ('updated_at', 'species__updated_at')
+    filter_backends = (search.TrigramSearchFilter, )
+    search_fields = ('name', )
 
 
-class AnimalViewSet(ModelViewSet):
+class AnimalViewSet(ProfiledSerializerMixin, RequestPermissionCacheMixin,
+                    ConditionalRetrieveMixin, SummaryListMixin, CompactListMixin,
+                    ModelViewSet):
     """This is a docstring to _show_ that you can use **Markdown** in swagger
     """
 
@@ -59,11 +154,101 @@ class AnimalViewSet(ModelViewSet):
             instance=instance)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'])
+    def book_appointments(self, request):
+        """Book many appointments at once
+
+        Send a list of `{"animal", "veterinarian", "time"}` slots. Every
+        slot that's valid and free is booked in a single transaction; the
+        response has one result per slot, in request order, with a `status`
+        of `booked`, `conflict` or `invalid`.
+        """
+        if not isinstance(request.data, list):
+            raise ValidationError({'non_field_errors': [
+                'Expected a list of appointments.',
+            ]})
+        serializer = serializers.AppointmentBatchBookingSerializer(
+            data=request.data, many=True,
+            context=self.get_serializer_context(),
+        )
+        results = []
+        for result, value in booking.book_appointments(serializer):
+            if result == booking.BOOKED:
+                appointment = serializers.AppointmentBatchBookingSerializer(
+                    value).data
+                results.append({'status': result, 'appointment': appointment})
+            else:
+                results.append({'status': result, 'errors': value})
+        return Response(results)
+
+    def create(self, request, *args, **kwargs):
+        """Create an animal, or many at once by POSTing a list"""
+        if not isinstance(request.data, list):
+            return super().create(request, *args, **kwargs)
+        serializer = serializers.AnimalWriteSerializer(
+            data=request.data, many=True,
+            context=self.get_serializer_context(),
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['put', 'patch'], url_path='bulk')
+    def bulk_update(self, request):
+        """Update many animals at once
+
+        Send a list of animals, each with its `id`. Nothing is saved unless
+        every item is valid; errors come back as a list in request order.
+        """
+        if not isinstance(request.data, list):
+            raise ValidationError({'non_field_errors': [
+                'Expected a list of animals.',
+            ]})
+        serializer = serializers.AnimalWriteSerializer(
+            models.Animal.objects.all(), data=request.data, many=True,
+            partial=request.method == 'PATCH',
+            context=self.get_serializer_context(),
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
+    @action(detail=False)
+    def export(self, request):
+        """Stream every (filtered) animal as NDJSON or CSV
+
+        Pass `export_format=csv` for CSV; the default is newline-delimited
+        JSON. Takes the same filters as the list view. Appointments are
+        included for users who can see them.
+        """
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in self.export_content_types:
+            raise ValidationError({'export_format': [
+                f'Must be one of: {", ".join(self.export_content_types)}',
+            ]})
+        include_appointments = self.has_perm(
+            'vetclinic.see_animal_appointments_with_animal',
+        )
+        rows = export.animal_rows(
+            self.filter_queryset(self.get_queryset()),
+            include_appointments=include_appointments,
+            chunk_size=self.export_chunk_size,
+        )
+        if export_format == 'csv':
+            lines = export.csv_lines(rows, include_appointments)
+        else:
+            lines = export.ndjson_lines(rows)
+        response = StreamingHttpResponse(
+            lines, content_type=self.export_content_types[export_format],
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="animals.{export_format}"'
+        )
+        return response
+
     def get_queryset(self):
         queryset = super().get_queryset()
-        if self.request.user.has_perm(
-                'vetclinic.see_animal_appointments_with_animal',
-        ):
+        if self.has_perm('vetclinic.see_animal_appointments_with_animal'):
             timestamp = now()
             start_time = timestamp - datetime.timedelta(days=30)
             end_time = timestamp + datetime.timedelta(days=30)
@@ -76,23 +261,73 @@ class AnimalViewSet(ModelViewSet):
                     ).select_related('veterinarian'),
                 ),
             )
-        if self.action in ['retrieve', 'update', 'partial']:
-            # we're dealing with a single instance. Select the extra fields
-            # present in the detail serializer
-            return queryset.select_related('breed')
         return queryset
 
     def get_serializer_class(self):
-        if self.request.user.has_perm(
-                'vetclinic.see_animal_appointments_with_animal',
-        ):
+        if self.has_perm('vetclinic.see_animal_appointments_with_animal'):
             return serializers.AnimalWithAppointmentsSerializer
         return super().get_serializer_class()
 
+    def get_version_fields(self):
+        if self.has_perm('vetclinic.see_animal_appointments_with_animal'):
+            # the appointment window moves with the clock, so no column can
+            # say when that representation last changed
+            return None
+        return super().get_version_fields()
+
     # This is slightly counterintuitive, but you want to give the viewset the
     # *DETAIL* serializer. The serializer will take care of subbing in the
     # list serializer.
     serializer_class = serializers.AnimalDetailSerializer
-    queryset = models.Animal.objects.select_related('species', 'client')
-    filter_backends = (DjangoFilterBackend, )
+    # the list renders the same nested breed as the detail view, so select
+    # it (and its species, for SpeciesField) for every action
+    queryset = models.Animal.objects.select_related(
+        'species', 'client', 'breed__species',
+    ).prefetch_related(
+        Prefetch(
+            'species__technicians',
+            queryset=User.objects.order_by('pk'),
+        ),
+    )
+    filter_backends = (
+        planning.PlannedFilterBackend, search.TrigramSearchFilter,
+    )
     filter_class = filters.AnimalFilter
+    search_fields = ('name', )
+    pagination_class = pagination.AnimalPagination
+    # breed renders its own species, which needn't be the animal's
+    version_fields = (
+        'updated_at', 'client__updated_at', 'species__updated_at',
+        'breed__updated_at', 'breed__species__updated_at',
+    )
+    export_chunk_size = 2000
+    export_content_types = {
+        'ndjson': 'application/x-ndjson',
+        'csv': 'text/csv',
+    }
+
+
+class FreeSlotViewSet(RequestPermissionCacheMixin, ViewSet):
+    """Find free appointment slots with any active veterinarian
+
+    Pass `start` and `end` (ISO 8601) and optionally `limit` (default 10)
+    and one or more `veterinarian` IDs. Slots come back in time order.
+    """
+
+    def list(self, request):
+        query = serializers.FreeSlotQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        length = availability.appointment_length()
+        slots = availability.first_free_slots(
+            params['start'], params['end'], params['limit'],
+            vet_ids=params.get('veterinarian'),
+        )
+        serializer = serializers.FreeSlotSerializer(
+            [
+                {'veterinarian': vet_id, 'start': start, 'end': start + length}
+                for start, vet_id in slots
+            ],
+            many=True,
+        )
+        return Response(serializer.data)